@@ -3,6 +3,10 @@ ASGI config for ArtStoreProject project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The admin dashboard's live counters (Server-Sent Events, store/tiempo_real.py)
+are only streamed when served through this entry point, e.g.
+``uvicorn ArtStoreProject.asgi:application``; under WSGI the page polls.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -57,6 +57,59 @@ DATABASES = {
     }
 }
 
+# 'default' es memoria de cada proceso: fragmentos de plantillas y muestreo,
+# que cada proceso puede calcular por su cuenta.
+# 'compartida' la ven todos los procesos: carritos en caché, versiones que
+# invalidan los datos derivados y contadores del panel (store/cache_compartida.py).
+# Con DatabaseCache hace falta `manage.py createcachetable`; en producción
+# puede apuntar a Redis o Memcached. Nunca a LocMemCache.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'artstore',
+    },
+    'compartida': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'artstore_cache',
+        # Guarda carritos de invitados: que no se purguen entradas vigentes por número
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+}
+CACHE_COMPARTIDA = 'compartida'
+
+# Dónde se guarda el carrito (store/carritos.py): CarritoBD, CarritoSesion o CarritoCache.
+# Los invitados usan CARRITO_INVITADOS si el backend principal necesita un usuario.
+CARRITO_BACKEND = 'store.carritos.CarritoBD'
+CARRITO_INVITADOS = 'store.carritos.CarritoSesion'
+# Alias de caché para CarritoCache; tiene que ser compartida entre procesos
+CARRITO_CACHE = 'compartida'
+
+# Cada proceso reconstruye su índice de facetas (store/facetas.py) al cambiar
+# la versión compartida y, como mucho, tras estos segundos
+FACETAS_RECONSTRUIR_SEGUNDOS = 300
+
+# Cuánto dura la reserva de stock de una línea del carrito (store/reservas.py).
+# Las vencidas se liberan con `manage.py liberar_reservas` (p. ej. cada minuto desde cron).
+RESERVA_STOCK_SEGUNDOS = 15 * 60
+
+# Números de pedido que cada proceso reserva de una vez (store/numeros_pedido.py)
+NUMERO_PEDIDO_BLOQUE = 100
+
+# Los pedidos entregados o cancelados sin cambios en estos días pasan al
+# archivo con `manage.py archivar_pedidos` (store/archivo.py)
+ARCHIVO_PEDIDOS_DIAS = 365
+
+# Segundos que el panel de administración sirve sus contadores desde la caché
+# antes de recalcularlos (store/estadisticas.py); entre tanto los ajustan las señales
+ESTADISTICAS_SEGUNDOS = 30
+
+# Cada cuánto revisa esos contadores el difusor SSE del panel (store/tiempo_real.py)
+ESTADISTICAS_DIFUSION_SEGUNDOS = 2
+
+# Correos que envía el worker (`manage.py procesar_tareas`); en desarrollo se muestran en consola
+EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+DEFAULT_FROM_EMAIL = 'ArtStore <no-responder@artstore.local>'
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -0,0 +1,91 @@
+# almacenamiento.py - Almacenamiento direccionado por contenido para las imágenes subidas
+import hashlib
+import os
+import re
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import FileSystemStorage
+
+# Un blob nunca cambia de contenido, así que el navegador puede guardarlo un año
+CABECERA_CACHE_INMUTABLE = 'public, max-age=31536000, immutable'
+
+# productos/67/674587...png y sus derivados miniaturas/productos/67/674587...-320.webp
+PATRON_DIGEST = re.compile(r'(?:^|/)([0-9a-f]{2})/\1[0-9a-f]{62}[.-]')
+
+
+class _ContenidoYaGuardado(Exception):
+    """Otro proceso escribió el mismo blob entre la comprobación y el guardado"""
+
+
+def calcular_digest(contenido):
+    """SHA-256 del archivo leyéndolo por bloques, sin cargarlo entero en memoria"""
+    digest = hashlib.sha256()
+    for bloque in contenido.chunks():
+        digest.update(bloque if isinstance(bloque, bytes) else bloque.encode())
+    contenido.seek(0)
+    return digest.hexdigest()
+
+
+def nombre_por_digest(nombre, digest):
+    """<carpeta de upload_to>/<2 primeros>/<digest><extensión>"""
+    carpeta, archivo = os.path.split(nombre)
+    extension = os.path.splitext(archivo)[1].lower()
+    return f'{carpeta}/{digest[:2]}/{digest}{extension}' if carpeta else f'{digest[:2]}/{digest}{extension}'
+
+
+def es_inmutable(nombre):
+    return PATRON_DIGEST.search(nombre) is not None
+
+
+class AlmacenamientoPorContenido(FileSystemStorage):
+    """
+    Guarda cada archivo con el nombre de su digest. Dos subidas idénticas
+    apuntan al mismo blob en lugar de crear copias con sufijos aleatorios.
+    Storage.save sigue validando el nombre y su longitud; solo _save cambia
+    el nombre recibido por el del digest.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        if es_inmutable(name):
+            # Solo se llega aquí si el blob apareció mientras se escribía:
+            # mismo nombre significa mismo contenido, no hace falta otro
+            if self.exists(name):
+                raise _ContenidoYaGuardado(name)
+            return name
+        # El nombre recibido solo aporta la carpeta y la extensión; lo que
+        # tiene que caber en el campo es el nombre por digest
+        if max_length is not None and len(nombre_por_digest(name, '0' * 64)) > max_length:
+            raise SuspiciousFileOperation(
+                f'El nombre por contenido de "{name}" no cabe en {max_length} caracteres'
+            )
+        return name
+
+    def _save(self, name, content):
+        nombre = nombre_por_digest(name, calcular_digest(content))
+        if self.exists(nombre):
+            return nombre
+        try:
+            return super()._save(nombre, content)
+        except _ContenidoYaGuardado:
+            return nombre
+
+    def delete(self, name):
+        # Un blob puede estar referenciado por varias filas; lo borra
+        # `manage.py purgar_media`, que sabe qué nombres siguen en uso
+        if not es_inmutable(name):
+            super().delete(name)
+
+    def borrar_blob(self, name):
+        """Borrado real de un blob sin referencias (solo desde purgar_media)"""
+        super().delete(name)
+
+
+_almacenamiento = None
+
+
+def almacenamiento_por_contenido():
+    """Callable para storage= en los ImageField (así la migración no serializa la instancia)"""
+    global _almacenamiento
+    if _almacenamiento is None:
+        _almacenamiento = AlmacenamientoPorContenido()
+    return _almacenamiento
@@ -0,0 +1,89 @@
+# api_catalogo.py - Proyección de campos y serialización para la API JSON del catálogo
+import json
+
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+
+# Nombre público del campo -> ruta en el ORM para .values()
+CAMPOS_PRODUCTO = {
+    'id': 'id',
+    'nombre': 'nombre',
+    'descripcion': 'descripcion',
+    'precio': 'precio',
+    'stock': 'stock',
+    # Unidades que se pueden comprar: el stock menos lo reservado en carritos
+    'disponible': 'disponible',
+    'tipo': 'tipo',
+    'destacado': 'destacado',
+    'imagen': 'imagen',
+    'artista_id': 'artista_id',
+    'artista': 'artista__nombre',
+    'categoria_id': 'categoria_id',
+    'categoria': 'categoria__nombre',
+    'fecha_creacion': 'fecha_creacion',
+    'fecha_actualizacion': 'fecha_actualizacion',
+}
+
+# Campos que no son columnas: se anotan solo si se piden
+CAMPOS_CALCULADOS = {
+    'disponible': lambda: Greatest(F('stock') - F('stock_reservado'), Value(0)),
+}
+
+CAMPOS_POR_DEFECTO = ['id', 'nombre', 'precio', 'stock', 'disponible', 'tipo', 'artista', 'categoria', 'imagen']
+
+# Necesarios para calcular el cursor aunque el cliente no los pida
+CAMPOS_CURSOR = ['id', 'fecha_creacion']
+
+MAXIMO_POR_PAGINA = 200
+
+
+class CampoInvalido(ValueError):
+    pass
+
+
+def leer_campos(parametro):
+    """Valida el parámetro fields= y devuelve la lista de campos públicos"""
+    if not parametro:
+        return list(CAMPOS_POR_DEFECTO)
+    campos = [campo.strip() for campo in parametro.split(',') if campo.strip()]
+    desconocidos = [campo for campo in campos if campo not in CAMPOS_PRODUCTO]
+    if desconocidos:
+        raise CampoInvalido(f"Campos no válidos: {', '.join(desconocidos)}")
+    return campos
+
+
+def proyectar(queryset, campos):
+    """values() con los campos pedidos más los que necesita el cursor"""
+    anotaciones = {campo: CAMPOS_CALCULADOS[campo]() for campo in campos if campo in CAMPOS_CALCULADOS}
+    rutas = {CAMPOS_PRODUCTO[campo] for campo in campos} | set(CAMPOS_CURSOR)
+    return queryset.annotate(**anotaciones).values(*rutas)
+
+
+def serializar(fila, campos):
+    """Convierte una fila de values() al diccionario público"""
+    resultado = {}
+    for campo in campos:
+        valor = fila[CAMPOS_PRODUCTO[campo]]
+        if campo == 'imagen':
+            valor = default_storage.url(valor) if valor else None
+        resultado[campo] = valor
+    return resultado
+
+
+def a_json(datos):
+    return json.dumps(datos, cls=DjangoJSONEncoder, ensure_ascii=False)
+
+
+def json_en_flujo(filas, campos):
+    """
+    Genera un arreglo JSON fila por fila. Con .iterator() el catálogo completo
+    se exporta sin cargarlo entero en memoria.
+    """
+    yield '['
+    for indice, fila in enumerate(filas):
+        if indice:
+            yield ','
+        yield a_json(serializar(fila, campos))
+    yield ']'
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class StoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'store'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        # Registra las funciones de la cola de tareas
+        from . import notificaciones  # noqa: F401
+        from . import estadisticas  # noqa: F401
@@ -0,0 +1,222 @@
+# archivo.py - Pedidos terminados fuera de las tablas activas
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q, Sum, Value
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from . import estadisticas
+from .models import (
+    ItemPedido, ItemPedidoArchivado, Pedido, PedidoArchivado,
+    TotalesArchivoDia, TotalesArchivoUsuario,
+)
+from .resumen_pedido import resumir
+from .tareas import encolar
+
+ESTADOS_ARCHIVABLES = ('entregado', 'cancelado')
+CERO = Decimal('0')
+
+
+def edad_archivo():
+    return timedelta(days=getattr(settings, 'ARCHIVO_PEDIDOS_DIAS', 365))
+
+
+# ========== MOVER AL ARCHIVO ==========
+
+def archivar_pedidos(antes_de=None, lote=500):
+    """
+    Mueve al archivo los pedidos entregados o cancelados sin cambios desde
+    `antes_de`, de `lote` en `lote` y cada lote en su transacción (las
+    tablas activas no quedan bloqueadas todo el proceso). Devuelve cuántos.
+    """
+    antes_de = antes_de or timezone.now() - edad_archivo()
+    total = 0
+    while True:
+        with transaction.atomic():
+            pedidos = list(
+                Pedido.objects.filter(estado__in=ESTADOS_ARCHIVABLES, fecha_actualizacion__lt=antes_de)
+                .order_by('pk')[:lote]
+            )
+            if not pedidos:
+                return total
+            _archivar(pedidos)
+        total += len(pedidos)
+
+
+def _archivar(pedidos):
+    items = {}
+    for item in ItemPedido.objects.filter(pedido__in=pedidos).select_related('producto').order_by('id'):
+        items.setdefault(item.pedido_id, []).append(item)
+
+    PedidoArchivado.objects.bulk_create([
+        PedidoArchivado(
+            id=pedido.pk,
+            usuario_id=pedido.usuario_id,
+            numero_pedido=pedido.numero_pedido,
+            estado=pedido.estado,
+            metodo_pago=pedido.metodo_pago,
+            subtotal=pedido.subtotal,
+            iva=pedido.iva,
+            total=pedido.total,
+            direccion_envio=pedido.direccion_envio,
+            notas=pedido.notas,
+            resumen_lineas=pedido.resumen_lineas or resumir(items.get(pedido.pk, [])),
+            fecha_pedido=pedido.fecha_pedido,
+            fecha_actualizacion=pedido.fecha_actualizacion,
+        )
+        for pedido in pedidos
+    ])
+    ItemPedidoArchivado.objects.bulk_create([
+        ItemPedidoArchivado(
+            pedido_id=item.pedido_id,
+            producto_id=item.producto_id,
+            cantidad=item.cantidad,
+            precio_unitario=item.precio_unitario,
+            subtotal=item.subtotal,
+        )
+        for lineas in items.values() for item in lineas
+    ])
+    # Borra también sus ItemPedido; los movimientos del libro de inventario
+    # se quedan sin pedido (SET_NULL), igual en ventas y en líneas al conciliar
+    Pedido.objects.filter(pk__in=[pedido.pk for pedido in pedidos]).delete()
+    # El borrado descontó estos pedidos del panel, pero siguen contando como archivados
+    estadisticas.ajustar(total_pedidos=len(pedidos))
+
+    dias = {timezone.localdate(pedido.fecha_pedido) for pedido in pedidos}
+    _recalcular_usuarios({pedido.usuario_id for pedido in pedidos})
+    _recalcular_dias(min(dias), max(dias))
+
+
+# ========== TOTALES PREAGREGADOS ==========
+
+def _agregados():
+    entregado = Q(estado='entregado')
+    return {
+        'pedidos': Count('pk'),
+        'entregados': Count('pk', filter=entregado),
+        'cancelados': Count('pk', filter=Q(estado='cancelado')),
+        'total_entregado': Sum('total', filter=entregado),
+    }
+
+
+def _recalcular_usuarios(usuario_ids=None):
+    """
+    Rehace desde el archivo las filas de esos usuarios (o de todos). Se
+    recalculan en vez de sumar el lote: repetirlo nunca cuenta dos veces.
+    """
+    archivados = PedidoArchivado.objects.order_by()
+    if usuario_ids is not None:
+        archivados = archivados.filter(usuario_id__in=usuario_ids)
+    filas = archivados.values('usuario_id').annotate(**_agregados())
+    TotalesArchivoUsuario.objects.bulk_create(
+        [
+            TotalesArchivoUsuario(
+                usuario_id=fila['usuario_id'],
+                pedidos=fila['pedidos'],
+                entregados=fila['entregados'],
+                total_entregado=fila['total_entregado'] or CERO,
+            )
+            for fila in filas
+        ],
+        update_conflicts=True,
+        unique_fields=['usuario'],
+        update_fields=['pedidos', 'entregados', 'total_entregado'],
+    )
+
+
+def _recalcular_dias(desde=None, hasta=None):
+    archivados = PedidoArchivado.objects.order_by()
+    if desde is not None:
+        archivados = archivados.filter(fecha_pedido__date__range=(desde, hasta))
+    filas = archivados.annotate(dia=TruncDate('fecha_pedido')).values('dia').annotate(**_agregados())
+    TotalesArchivoDia.objects.bulk_create(
+        [
+            TotalesArchivoDia(
+                fecha=fila['dia'],
+                pedidos=fila['pedidos'],
+                entregados=fila['entregados'],
+                cancelados=fila['cancelados'],
+                total_entregado=fila['total_entregado'] or CERO,
+            )
+            for fila in filas
+        ],
+        update_conflicts=True,
+        unique_fields=['fecha'],
+        update_fields=['pedidos', 'entregados', 'cancelados', 'total_entregado'],
+    )
+
+
+def recalcular_totales():
+    """Reconstruye todos los totales del archivo (tras corregirlo a mano, por ejemplo)"""
+    with transaction.atomic():
+        TotalesArchivoUsuario.objects.all().delete()
+        TotalesArchivoDia.objects.all().delete()
+        _recalcular_usuarios()
+        _recalcular_dias()
+        encolar('estadisticas.recalcular')
+
+
+# ========== LECTURA ==========
+
+def totales_archivo():
+    """{pedidos, entregados, cancelados, total_entregado} de todo el archivo, desde los totales por día"""
+    totales = TotalesArchivoDia.objects.aggregate(
+        pedidos=Sum('pedidos'),
+        entregados=Sum('entregados'),
+        cancelados=Sum('cancelados'),
+        total_entregado=Sum('total_entregado'),
+    )
+    return {clave: valor or 0 for clave, valor in totales.items()}
+
+
+def totales_usuario(usuario):
+    """(pedidos, total gastado en entregados) de un usuario, activos más archivados"""
+    activos = Pedido.objects.filter(usuario=usuario).aggregate(
+        pedidos=Count('pk'), total=Sum('total', filter=Q(estado='entregado'))
+    )
+    archivo = TotalesArchivoUsuario.objects.filter(usuario=usuario).first()
+    pedidos = activos['pedidos'] + (archivo.pedidos if archivo else 0)
+    total = (activos['total'] or CERO) + (archivo.total_entregado if archivo else CERO)
+    return pedidos, total
+
+
+def obtener_pedido(**filtros):
+    """El pedido activo que cumple los filtros o, si ya se archivó, su copia; None si no existe"""
+    return Pedido.objects.filter(**filtros).first() or PedidoArchivado.objects.filter(**filtros).first()
+
+
+class HistorialCompleto:
+    """
+    Activos y archivados como una sola lista para Paginator, sin cargar
+    ninguna entera: cuenta cada tabla por separado y, para cada página,
+    ordena solo (id, campo de orden) con un UNION y luego trae esas filas.
+    """
+
+    def __init__(self, activos, archivados, orden='-fecha_pedido'):
+        self.activos = activos
+        self.archivados = archivados
+        self.orden = orden
+
+    def count(self):
+        return self.activos.count() + self.archivados.count()
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, indice):
+        if not isinstance(indice, slice):
+            return self[indice:indice + 1][0]
+
+        campos = list(dict.fromkeys(['id', self.orden.lstrip('-')]))
+        claves = (
+            self.activos.order_by().annotate(archivado=Value(False)).values_list(*campos, 'archivado')
+            .union(self.archivados.order_by().annotate(archivado=Value(True)).values_list(*campos, 'archivado'))
+            .order_by(self.orden, '-id')[indice]
+        )
+        claves = [(fila[0], fila[-1]) for fila in claves]
+        activos = self.activos.in_bulk([pk for pk, archivado in claves if not archivado])
+        archivados = self.archivados.in_bulk([pk for pk, archivado in claves if archivado])
+        return [archivados[pk] if archivado else activos[pk] for pk, archivado in claves]
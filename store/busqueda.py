@@ -0,0 +1,144 @@
+# busqueda.py - Búsqueda de texto completo con un índice FTS5 de SQLite
+import re
+
+from django.db import connection, transaction
+
+from .models import Producto
+
+TABLA_FTS = 'store_producto_fts'
+
+# Pesos de bm25 por columna: nombre, descripcion, categoria, artista
+PESOS_BM25 = (10.0, 1.0, 3.0, 5.0)
+
+SQL_CREAR_INDICE = f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA_FTS} USING fts5(
+        nombre, descripcion, categoria, artista,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+"""
+
+
+def indice_disponible():
+    """El índice FTS5 solo existe cuando la base de datos es SQLite"""
+    return connection.vendor == 'sqlite'
+
+
+def _fila_indice(producto):
+    return (
+        producto.pk,
+        producto.nombre,
+        producto.descripcion,
+        producto.categoria.nombre if producto.categoria else '',
+        producto.artista.nombre if producto.artista else '',
+    )
+
+
+def indexar_producto(producto):
+    """Inserta o reemplaza un producto en el índice; los inactivos se retiran"""
+    if not indice_disponible():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLA_FTS} WHERE rowid = %s", [producto.pk])
+        if producto.activo:
+            cursor.execute(
+                f"INSERT INTO {TABLA_FTS} (rowid, nombre, descripcion, categoria, artista) "
+                f"VALUES (%s, %s, %s, %s, %s)",
+                _fila_indice(producto),
+            )
+
+
+def desindexar_producto(producto_id):
+    if not indice_disponible():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLA_FTS} WHERE rowid = %s", [producto_id])
+
+
+def reindexar_productos(queryset):
+    """Vuelve a indexar un conjunto de productos (p. ej. al renombrar un artista)"""
+    for producto in queryset.select_related('categoria', 'artista'):
+        indexar_producto(producto)
+
+
+def reindexar_ids(producto_ids):
+    """Deja en el índice el estado actual de esos productos; los que ya no existen se retiran"""
+    if not indice_disponible():
+        return
+    indexados = set()
+    for producto in Producto.objects.filter(pk__in=producto_ids).select_related('categoria', 'artista'):
+        indexar_producto(producto)
+        indexados.add(producto.pk)
+    for producto_id in set(producto_ids) - indexados:
+        desindexar_producto(producto_id)
+
+
+def reindexar_al_confirmar(producto_ids):
+    """
+    Reindexa esos productos cuando se confirme la transacción en curso, con
+    lo que haya entonces en la base de datos: un guardado que se deshace no
+    deja rastro en el índice.
+    """
+    producto_ids = list(producto_ids)
+    if producto_ids and indice_disponible():
+        transaction.on_commit(lambda: reindexar_ids(producto_ids))
+
+
+def reconstruir_indice():
+    """Vacía el índice y lo llena de nuevo con todos los productos activos"""
+    if not indice_disponible():
+        return 0
+    productos = Producto.objects.filter(activo=True).select_related('categoria', 'artista')
+    filas = [_fila_indice(producto) for producto in productos.iterator(chunk_size=2000)]
+    with connection.cursor() as cursor:
+        cursor.execute(SQL_CREAR_INDICE)
+        cursor.execute(f"DELETE FROM {TABLA_FTS}")
+        cursor.executemany(
+            f"INSERT INTO {TABLA_FTS} (rowid, nombre, descripcion, categoria, artista) "
+            f"VALUES (%s, %s, %s, %s, %s)",
+            filas,
+        )
+        cursor.execute(f"INSERT INTO {TABLA_FTS} ({TABLA_FTS}) VALUES ('optimize')")
+    return len(filas)
+
+
+def preparar_consulta(texto):
+    """
+    Convierte el texto del usuario en una consulta MATCH segura: cada palabra
+    va entre comillas (sin operadores FTS) y admite coincidencia por prefijo.
+    """
+    palabras = re.findall(r'\w+', texto or '')
+    return ' '.join(f'"{palabra}"*' for palabra in palabras)
+
+
+def buscar_ids(texto, limite=50):
+    """Ids de productos ordenados por relevancia (bm25)"""
+    consulta = preparar_consulta(texto)
+    if not consulta:
+        return []
+
+    if not indice_disponible():
+        # Respaldo para otras bases de datos: búsqueda simple por nombre
+        return list(
+            Producto.objects.filter(activo=True, nombre__icontains=texto)
+            .values_list('id', flat=True)[:limite]
+        )
+
+    pesos = ', '.join(str(peso) for peso in PESOS_BM25)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {TABLA_FTS} WHERE {TABLA_FTS} MATCH %s "
+            f"ORDER BY bm25({TABLA_FTS}, {pesos}) LIMIT %s",
+            [consulta, limite],
+        )
+        return [fila[0] for fila in cursor.fetchall()]
+
+
+def buscar_productos(texto, limite=50):
+    """Productos activos que coinciden con el texto, en orden de relevancia"""
+    ids = buscar_ids(texto, limite)
+    encontrados = (
+        Producto.objects.filter(activo=True)
+        .select_related('categoria', 'artista')
+        .in_bulk(ids)
+    )
+    return [encontrados[pk] for pk in ids if pk in encontrados]
@@ -0,0 +1,21 @@
+# cache_compartida.py - La caché que ven todos los procesos del servidor
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+
+
+def cache_compartida(alias=None):
+    """
+    La caché `alias` (por defecto CACHE_COMPARTIDA). Lo que se guarda aquí
+    tiene que ser igual para todos los procesos, así que una LocMemCache,
+    que existe por separado en cada uno, se rechaza.
+    """
+    alias = alias or getattr(settings, 'CACHE_COMPARTIDA', 'compartida')
+    cache = caches[alias]
+    if isinstance(cache, LocMemCache):
+        raise ImproperlyConfigured(
+            f"La caché '{alias}' es LocMemCache y no se comparte entre procesos; "
+            "usa DatabaseCache, Redis o Memcached"
+        )
+    return cache
@@ -0,0 +1,334 @@
+# carritos.py - Backends intercambiables para guardar el carrito
+import uuid
+from abc import ABC, abstractmethod
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from . import reservas
+from .cache_compartida import cache_compartida
+from .models import Carrito, ItemCarrito, Producto
+from .totales_carrito import ajustar_totales, vaciar_totales
+
+CLAVE_SESION = 'carrito'
+CLAVE_INVITADO = 'carrito_invitado'
+TIEMPO_CACHE_CARRITO = 60 * 60 * 24 * 30
+
+
+class LineaCarrito:
+    """Línea de un carrito que no vive en la base de datos (misma forma que ItemCarrito)"""
+
+    def __init__(self, producto, cantidad):
+        self.producto = producto
+        self.producto_id = producto.id
+        self.cantidad = cantidad
+
+    @property
+    def subtotal(self):
+        return self.producto.precio * self.cantidad
+
+
+class CarritoBase(ABC):
+    """
+    Interfaz común. Las líneas tienen producto, producto_id, cantidad y
+    subtotal; las vistas no necesitan saber dónde se guardan. Cada cambio de
+    cantidad ajusta la reserva de stock del titular; si no hay unidades libres
+    se lanza reservas.SinDisponibilidad y el carrito no cambia.
+    """
+    admite_invitados = False
+
+    def __init__(self, request, usuario=None):
+        self.request = request
+        self.usuario = request.user if usuario is None else usuario
+        self.invitado = not self.usuario.is_authenticated
+
+    @abstractmethod
+    def identidad(self):
+        """Dónde se guarda; dos backends con la misma identidad son el mismo carrito"""
+
+    def titular(self, crear=False):
+        """
+        A nombre de quién quedan las reservas: 'u<id>' o, para invitados,
+        'g<token>' con un token en la sesión que solo se crea al escribir.
+        """
+        if not self.invitado:
+            return f'u{self.usuario.id}'
+        token = self.request.session.get(CLAVE_INVITADO)
+        if token is None:
+            if not crear:
+                return None
+            token = self.request.session[CLAVE_INVITADO] = uuid.uuid4().hex
+        return f'g{token}'
+
+    def _reservar(self, cantidades):
+        """Fija las reservas de [(producto, cantidad nueva)]; todas o ninguna"""
+        titular = self.titular(crear=True)
+        with transaction.atomic():
+            for producto, cantidad in cantidades:
+                reservas.fijar_reserva(titular, producto, cantidad)
+
+    def _liberar(self, producto_ids=None):
+        titular = self.titular()
+        if titular:
+            reservas.liberar(titular, producto_ids)
+
+    @abstractmethod
+    def lineas(self):
+        ...
+
+    @abstractmethod
+    def cantidad_items(self):
+        ...
+
+    @abstractmethod
+    def subtotal(self):
+        ...
+
+    @abstractmethod
+    def agregar(self, producto, cantidad):
+        ...
+
+    @abstractmethod
+    def actualizar(self, cambios):
+        """`cambios` es una lista de (línea, cantidad nueva) ya validada"""
+
+    @abstractmethod
+    def quitar(self, producto_id):
+        """Devuelve True si la línea existía"""
+
+    @abstractmethod
+    def vaciar(self):
+        ...
+
+
+# ========== BASE DE DATOS ==========
+
+class CarritoBD(CarritoBase):
+    """Carrito y ItemCarrito en la base de datos, con los totales persistidos"""
+
+    def identidad(self):
+        return ('bd', self.usuario.id)
+
+    def _lineas_queryset(self):
+        return ItemCarrito.objects.filter(carrito__usuario_id=self.usuario.id)
+
+    def lineas(self):
+        return list(self._lineas_queryset().select_related('producto').order_by('fecha_agregado', 'id'))
+
+    def _totales(self):
+        if not hasattr(self, '_fila'):
+            self._fila = (
+                Carrito.objects.filter(usuario_id=self.usuario.id)
+                .values_list('cantidad_items', 'subtotal')
+                .first()
+            ) or (0, Decimal('0'))
+        return self._fila
+
+    def cantidad_items(self):
+        return self._totales()[0]
+
+    def subtotal(self):
+        return self._totales()[1]
+
+    def agregar(self, producto, cantidad):
+        with transaction.atomic():
+            carrito, _ = Carrito.objects.get_or_create(usuario=self.usuario)
+            item, creado = ItemCarrito.objects.get_or_create(
+                carrito=carrito,
+                producto=producto,
+                defaults={'cantidad': cantidad}
+            )
+            if not creado:
+                item.cantidad += cantidad
+            self._reservar([(producto, item.cantidad)])
+            if not creado:
+                item.save()
+            ajustar_totales(carrito.id, cantidad, producto.precio * cantidad)
+
+    def actualizar(self, cambios):
+        if not cambios:
+            return
+        unidades, importe = 0, Decimal('0')
+        for item, cantidad in cambios:
+            diferencia = cantidad - item.cantidad
+            unidades += diferencia
+            importe += item.producto.precio * diferencia
+        with transaction.atomic():
+            self._reservar([(item.producto, cantidad) for item, cantidad in cambios])
+            for item, cantidad in cambios:
+                item.cantidad = cantidad
+            ItemCarrito.objects.bulk_update([item for item, _ in cambios], ['cantidad'])
+            ajustar_totales(cambios[0][0].carrito_id, unidades, importe)
+
+    def quitar(self, producto_id):
+        item = self._lineas_queryset().filter(producto_id=producto_id).select_related('producto').first()
+        if item is None:
+            return False
+        with transaction.atomic():
+            item.delete()
+            ajustar_totales(item.carrito_id, -item.cantidad, -item.subtotal)
+            self._liberar([producto_id])
+        return True
+
+    def vaciar(self):
+        with transaction.atomic():
+            self._lineas_queryset().delete()
+            carrito_id = Carrito.objects.filter(usuario_id=self.usuario.id).values_list('id', flat=True).first()
+            if carrito_id:
+                vaciar_totales(carrito_id)
+            self._liberar()
+
+
+# ========== SESIÓN Y CACHÉ ==========
+
+class CarritoEnDiccionario(CarritoBase):
+    """
+    Guarda {producto_id: cantidad}. No crea filas, así que sirve para
+    invitados; los precios se leen al mostrar el carrito.
+    """
+    admite_invitados = True
+
+    @abstractmethod
+    def _leer(self):
+        ...
+
+    @abstractmethod
+    def _guardar(self, datos):
+        ...
+
+    def _datos(self):
+        if not hasattr(self, '_cargados'):
+            self._cargados = dict(self._leer() or {})
+        return self._cargados
+
+    def _escribir(self, datos):
+        self._cargados = datos
+        self._guardar(datos)
+
+    def lineas(self):
+        datos = self._datos()
+        productos = Producto.objects.in_bulk([int(pk) for pk in datos])
+        return [
+            LineaCarrito(productos[int(pk)], cantidad)
+            for pk, cantidad in datos.items() if int(pk) in productos
+        ]
+
+    def cantidad_items(self):
+        return sum(self._datos().values())
+
+    def subtotal(self):
+        return sum((linea.subtotal for linea in self.lineas()), Decimal('0'))
+
+    def agregar(self, producto, cantidad):
+        datos = dict(self._datos())
+        clave = str(producto.id)
+        datos[clave] = datos.get(clave, 0) + cantidad
+        self._reservar([(producto, datos[clave])])
+        self._escribir(datos)
+
+    def actualizar(self, cambios):
+        if not cambios:
+            return
+        self._reservar([(linea.producto, cantidad) for linea, cantidad in cambios])
+        datos = dict(self._datos())
+        for linea, cantidad in cambios:
+            linea.cantidad = datos[str(linea.producto_id)] = cantidad
+        self._escribir(datos)
+
+    def quitar(self, producto_id):
+        datos = dict(self._datos())
+        if datos.pop(str(producto_id), None) is None:
+            return False
+        self._escribir(datos)
+        self._liberar([producto_id])
+        return True
+
+    def vaciar(self):
+        self._escribir({})
+        self._liberar()
+
+
+class CarritoSesion(CarritoEnDiccionario):
+    """
+    En la sesión. Con SESSION_ENGINE = 'django.contrib.sessions.backends.signed_cookies'
+    el carrito viaja firmado en la cookie y no toca la base de datos.
+    """
+
+    def identidad(self):
+        return ('sesion',)
+
+    def _leer(self):
+        return self.request.session.get(CLAVE_SESION)
+
+    def _guardar(self, datos):
+        self.request.session[CLAVE_SESION] = datos
+
+
+class CarritoCache(CarritoEnDiccionario):
+    """En la caché compartida CARRITO_CACHE; los invitados se identifican con un token en la sesión"""
+
+    def _clave(self, crear=False):
+        # El token solo se crea al guardar: leer un carrito vacío no toca la sesión
+        titular = self.titular(crear)
+        return f'artstore:carrito:{titular}' if titular else None
+
+    def identidad(self):
+        return ('cache', self._clave())
+
+    def _cache(self):
+        # Las líneas tienen que verse igual desde cualquier proceso del servidor
+        return cache_compartida(getattr(settings, 'CARRITO_CACHE', None))
+
+    def _leer(self):
+        clave = self._clave()
+        return self._cache().get(clave) if clave else None
+
+    def _guardar(self, datos):
+        self._cache().set(self._clave(crear=True), datos, TIEMPO_CACHE_CARRITO)
+
+
+# ========== SELECCIÓN DEL BACKEND ==========
+
+def clase_carrito(invitado):
+    clase = import_string(getattr(settings, 'CARRITO_BACKEND', 'store.carritos.CarritoBD'))
+    if invitado and not clase.admite_invitados:
+        clase = import_string(getattr(settings, 'CARRITO_INVITADOS', 'store.carritos.CarritoSesion'))
+    return clase
+
+
+def obtener_carrito(request):
+    """El backend del carrito para esta petición (uno por petición)"""
+    carrito = getattr(request, '_carrito', None)
+    if carrito is None:
+        carrito = request._carrito = clase_carrito(not request.user.is_authenticated)(request)
+    return carrito
+
+
+def fusionar_carrito_invitado(request, usuario):
+    """
+    Al iniciar sesión pasa las líneas del carrito de invitado al del usuario.
+    Si ambos se guardan en el mismo sitio (p. ej. los dos en la sesión) no hay nada que hacer.
+    """
+    invitado = clase_carrito(True)(request, usuario=AnonymousUser())
+    destino = clase_carrito(False)(request, usuario=usuario)
+    # Las reservas cambian de titular aunque el carrito siga en el mismo sitio
+    origen = invitado.titular()
+    if origen:
+        reservas.transferir(origen, destino.titular())
+    if invitado.identidad() == destino.identidad():
+        return 0
+
+    lineas = invitado.lineas()
+    for linea in lineas:
+        try:
+            destino.agregar(linea.producto, linea.cantidad)
+        except reservas.SinDisponibilidad:
+            # La reserva del invitado venció y otro cliente se llevó las unidades
+            pass
+    if lineas:
+        invitado.vaciar()
+    request.__dict__.pop('_carrito', None)
+    return len(lineas)
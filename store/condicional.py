@@ -0,0 +1,102 @@
+# condicional.py - Validadores ETag / Last-Modified para las páginas de detalle
+import hashlib
+
+from django.contrib.messages import get_messages
+from django.db.models import Max
+
+from .models import Producto, Artista, Pedido
+from .resumen_carrito import obtener_resumen
+from .versiones import obtener_version
+
+
+def _puede_validarse(request):
+    """Con mensajes pendientes la página debe generarse para mostrarlos"""
+    return len(get_messages(request)) == 0
+
+
+def estado_carrito(request):
+    """
+    Lo único por usuario que muestra la barra de navegación: la cantidad de
+    artículos del carrito (también el de invitado). El resumen de la petición
+    la reutiliza después.
+    """
+    return obtener_resumen(request).cantidad_items
+
+
+def _etag(request, *partes):
+    if not _puede_validarse(request) or partes[0] is None:
+        return None
+    datos = repr((request.user.id, estado_carrito(request)) + partes)
+    return hashlib.md5(datos.encode()).hexdigest()
+
+
+def _last_modified(request, fecha):
+    # Solo para anónimos con el carrito vacío: si no, la página cambia sin tocar estas fechas
+    if request.user.is_authenticated or estado_carrito(request) or not _puede_validarse(request):
+        return None
+    return fecha
+
+
+# ========== PRODUCTO ==========
+
+def _estado_producto(producto_id):
+    return (
+        Producto.objects.filter(id=producto_id, activo=True)
+        .values_list('fecha_actualizacion', 'artista__fecha_actualizacion', 'categoria__nombre', 'stock_reservado')
+        .first()
+    )
+
+
+def semilla_relacionados(producto_id):
+    """
+    Los relacionados salen al azar, pero con la misma muestra mientras no
+    cambie ningún producto: así la página entera depende del ETag. La versión
+    de fragmentos sube con cada producto, artista o miniatura nueva.
+    """
+    return f'{producto_id}:{obtener_version("fragmentos:productos")}'
+
+
+def etag_producto(request, producto_id):
+    # Sin Last-Modified: los relacionados y las miniaturas cambian sin tocar
+    # las fechas del producto, y If-Modified-Since solo serviría páginas viejas
+    estado = _estado_producto(producto_id)
+    return _etag(request, estado, semilla_relacionados(producto_id)) if estado else None
+
+
+# ========== ARTISTA ==========
+
+def _fechas_artista(artista_id):
+    artista = (
+        Artista.objects.filter(id=artista_id, activo=True)
+        .values_list('fecha_actualizacion', 'productos_activos')
+        .first()
+    )
+    if artista is None:
+        return None
+    ultima_obra = Producto.objects.filter(artista_id=artista_id, activo=True).aggregate(
+        ultima=Max('fecha_actualizacion')
+    )['ultima']
+    return artista + (ultima_obra,)
+
+
+def etag_artista(request, artista_id):
+    return _etag(request, _fechas_artista(artista_id))
+
+
+def last_modified_artista(request, artista_id):
+    datos = _fechas_artista(artista_id)
+    if datos is None:
+        return None
+    fecha, _, ultima_obra = datos
+    return _last_modified(request, max(fecha, ultima_obra) if ultima_obra else fecha)
+
+
+# ========== PEDIDO ==========
+
+def etag_pedido(request, pedido_id):
+    fecha = (
+        Pedido.objects.filter(id=pedido_id, usuario_id=request.user.id)
+        .values_list('fecha_actualizacion', flat=True)
+        .first()
+    )
+    return _etag(request, fecha)
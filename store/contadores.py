@@ -0,0 +1,60 @@
+# contadores.py - Conteos desnormalizados de productos activos por artista y categoría
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import Producto, Artista, Categoria
+
+# (campo de Producto, modelo que guarda el contador)
+RELACIONES = [
+    ('artista_id', Artista),
+    ('categoria_id', Categoria),
+]
+
+
+def estado_producto(producto):
+    """Datos de un producto que afectan a los contadores"""
+    return {
+        'activo': producto.activo,
+        'artista_id': producto.artista_id,
+        'categoria_id': producto.categoria_id,
+    }
+
+
+def _ajustar(modelo, pk, delta):
+    if pk and delta:
+        modelo.objects.filter(pk=pk).update(productos_activos=F('productos_activos') + delta)
+
+
+def aplicar_cambio(anterior, actual):
+    """
+    Ajusta los contadores entre dos estados de un producto. `anterior` es None
+    para un producto nuevo y `actual` es None para uno eliminado.
+    """
+    with transaction.atomic():
+        for campo, modelo in RELACIONES:
+            antes = anterior[campo] if anterior and anterior['activo'] else None
+            despues = actual[campo] if actual and actual['activo'] else None
+            if antes != despues:
+                _ajustar(modelo, antes, -1)
+                _ajustar(modelo, despues, 1)
+
+
+def recalcular_contadores():
+    """Recalcula todos los contadores con un GROUP BY por relación"""
+    resultado = {}
+    with transaction.atomic():
+        for campo, modelo in RELACIONES:
+            conteos = dict(
+                Producto.objects.filter(activo=True)
+                .exclude(**{campo: None})
+                .order_by()
+                .values_list(campo)
+                .annotate(total=Count('id'))
+            )
+            objetos = list(modelo.objects.only('id', 'productos_activos'))
+            corregidos = [obj for obj in objetos if obj.productos_activos != conteos.get(obj.id, 0)]
+            for obj in corregidos:
+                obj.productos_activos = conteos.get(obj.id, 0)
+            modelo.objects.bulk_update(corregidos, ['productos_activos'], batch_size=500)
+            resultado[modelo._meta.verbose_name_plural] = len(corregidos)
+    return resultado
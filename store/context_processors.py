@@ -1,19 +1,13 @@
-from .models import Carrito
+from django.utils.functional import SimpleLazyObject
+
+from .resumen_carrito import obtener_resumen
 
 def carrito_context(request):
-    if request.user.is_authenticated:
-        try:
-            carrito = Carrito.objects.get(usuario=request.user)
-            cantidad_items = carrito.cantidad_items
-            total_carrito = carrito.total
-        except Carrito.DoesNotExist:
-            cantidad_items = 0
-            total_carrito = 0
-    else:
-        cantidad_items = 0
-        total_carrito = 0
-    
+    # Perezoso: solo consulta si la plantilla muestra el carrito, y la vista
+    # de la misma petición reutiliza las líneas ya cargadas
+    resumen = obtener_resumen(request)
     return {
-        'cantidad_carrito': cantidad_items,
-        'total_carrito': total_carrito,
-    }
\ No newline at end of file
+        'resumen_carrito': resumen,
+        'cantidad_carrito': SimpleLazyObject(lambda: resumen.cantidad_items),
+        'total_carrito': SimpleLazyObject(lambda: resumen.subtotal),
+    }
@@ -0,0 +1,133 @@
+# estadisticas.py - Contadores del panel de administración, en caché
+import time
+import uuid
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+
+from .cache_compartida import cache_compartida
+from .models import EncargoPersonalizado, Pedido, Producto, TotalesArchivoDia
+from .notificaciones import UMBRAL_STOCK_BAJO
+from .tareas import tarea
+
+PREFIJO = 'artstore:estadisticas:'
+# Existe mientras los contadores se consideran frescos (dura ESTADISTICAS_SEGUNDOS)
+CLAVE_VIGENTE = PREFIJO + 'vigente'
+CLAVE_CALCULANDO = PREFIJO + 'calculando'
+CONTADORES = (
+    'total_productos', 'stock_bajo',
+    'total_pedidos', 'pedidos_pendientes',
+    'total_encargos', 'encargos_pendientes',
+    'total_usuarios',
+)
+# Segundos que una petición espera a que otro proceso termine el primer cálculo
+ESPERA_MAXIMA = 2
+
+# Funciones a las que se avisa tras cada ajuste (el difusor SSE de tiempo_real.py)
+_oyentes = []
+
+
+def duracion():
+    return getattr(settings, 'ESTADISTICAS_SEGUNDOS', 30)
+
+
+def calcular():
+    """Todos los contadores con una consulta de agregación condicional por tabla"""
+    valores = {}
+    valores.update(Producto.objects.aggregate(
+        total_productos=Count('pk'),
+        stock_bajo=Count('pk', filter=Q(stock__lt=UMBRAL_STOCK_BAJO)),
+    ))
+    valores.update(Pedido.objects.aggregate(
+        total_pedidos=Count('pk'),
+        pedidos_pendientes=Count('pk', filter=Q(estado='pendiente')),
+    ))
+    valores.update(EncargoPersonalizado.objects.aggregate(
+        total_encargos=Count('pk'),
+        encargos_pendientes=Count('pk', filter=Q(estado='pendiente')),
+    ))
+    valores.update(User.objects.aggregate(total_usuarios=Count('pk')))
+    # Los archivados cuentan desde sus totales por día (ver archivo.py)
+    valores['total_pedidos'] += TotalesArchivoDia.objects.aggregate(total=Sum('pedidos'))['total'] or 0
+    return valores
+
+
+@tarea('estadisticas.recalcular')
+def recalcular():
+    """Calcula y guarda los contadores; también como tarea tras cambios masivos"""
+    cache = cache_compartida()
+    valores = calcular()
+    # Sin caducidad: al vencer CLAVE_VIGENTE se siguen sirviendo mientras se recalculan
+    cache.set_many({PREFIJO + nombre: valor for nombre, valor in valores.items()}, None)
+    cache.set(CLAVE_VIGENTE, True, duracion())
+    return valores
+
+
+def _leer(guardado):
+    return {nombre: guardado[PREFIJO + nombre] for nombre in CONTADORES}
+
+
+def obtener_estadisticas():
+    """
+    Contadores del panel desde la caché compartida. Al vencer, solo la
+    petición que consigue la marca CLAVE_CALCULANDO (cache.add es atómico)
+    consulta la base de datos, sea del proceso que sea; las demás siguen
+    sirviendo los valores anteriores, así que varias pestañas o varios
+    workers consultando a la vez no provocan varios cálculos.
+    """
+    cache = cache_compartida()
+    claves = [PREFIJO + nombre for nombre in CONTADORES]
+    guardado = cache.get_many(claves + [CLAVE_VIGENTE])
+    completos = all(clave in guardado for clave in claves)
+    if completos and CLAVE_VIGENTE in guardado:
+        return _leer(guardado)
+
+    marca = uuid.uuid4().hex
+    if cache.add(CLAVE_CALCULANDO, marca, ESPERA_MAXIMA * 5):
+        try:
+            return recalcular()
+        finally:
+            if cache.get(CLAVE_CALCULANDO) == marca:
+                cache.delete(CLAVE_CALCULANDO)
+    if completos:
+        return _leer(guardado)
+
+    # Primera lectura (o caché vaciada): se espera al proceso que calcula
+    limite = time.monotonic() + ESPERA_MAXIMA
+    while time.monotonic() < limite:
+        time.sleep(0.05)
+        guardado = cache.get_many(claves)
+        if len(guardado) == len(claves):
+            return _leer(guardado)
+    return calcular()
+
+
+def ajustar(**cambios):
+    """
+    Suma `cambios` ({contador: diferencia}) a los contadores en caché cuando
+    se confirma la transacción. Si aún no están en caché no hace nada: la
+    próxima lectura los calcula. Un cambio que coincida con un recálculo
+    puede perderse; se corrige en el siguiente, como mucho en
+    ESTADISTICAS_SEGUNDOS.
+    """
+    cambios = {nombre: cambio for nombre, cambio in cambios.items() if cambio}
+    if not cambios:
+        return
+
+    def aplicar():
+        cache = cache_compartida()
+        for nombre, cambio in cambios.items():
+            try:
+                cache.incr(PREFIJO + nombre, cambio)
+            except ValueError:
+                pass
+        for oyente in _oyentes:
+            oyente()
+    transaction.on_commit(aplicar)
+
+
+def al_ajustar(funcion):
+    _oyentes.append(funcion)
+
@@ -0,0 +1,247 @@
+# facetas.py - Filtros por facetas con conteos precalculados sobre bitsets
+import json
+import threading
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from .models import Producto, Artista, Categoria
+from .versiones import obtener_version, incrementar_version
+
+RANGOS_PRECIO = [
+    ('0-100', 'Hasta $100', Decimal('0'), Decimal('100')),
+    ('100-500', '$100 - $500', Decimal('100'), Decimal('500')),
+    ('500-1000', '$500 - $1,000', Decimal('500'), Decimal('1000')),
+    ('1000-5000', '$1,000 - $5,000', Decimal('1000'), Decimal('5000')),
+    ('5000+', 'Más de $5,000', Decimal('5000'), None),
+]
+
+# Facetas que el cliente puede seleccionar, con su título para la plantilla
+FACETAS = [
+    ('precio', 'Precio'),
+    ('artista', 'Artista'),
+    ('categoria', 'Categoría'),
+    ('disponible', 'Disponibilidad'),
+]
+
+VERSION_FACETAS = 'facetas'
+
+
+def edad_maxima():
+    """
+    Segundos tras los que el índice se reconstruye aunque no cambie la
+    versión: acota el error si dos procesos incrementan a la vez en una
+    caché sin incr atómico, o si algún cambio no pasó por las señales.
+    """
+    return getattr(settings, 'FACETAS_RECONSTRUIR_SEGUNDOS', 300)
+
+
+def _rango_precio(precio):
+    for clave, _, minimo, maximo in RANGOS_PRECIO:
+        if precio >= minimo and (maximo is None or precio < maximo):
+            return clave
+    return None
+
+
+def _claves_producto(tipo, precio, stock, stock_reservado, artista_id, categoria_id):
+    """Pares (faceta, valor) a los que pertenece un producto activo"""
+    claves = [
+        ('tipo', tipo),
+        ('precio', _rango_precio(Decimal(str(precio)))),
+        # Disponible = le quedan unidades sin reservar en carritos
+        ('disponible', '1' if stock > stock_reservado else '0'),
+    ]
+    if artista_id:
+        claves.append(('artista', artista_id))
+    if categoria_id:
+        claves.append(('categoria', categoria_id))
+    return claves
+
+
+def ids_de_bitset(bitset):
+    """Lista de ids (posiciones de los bits encendidos) en orden ascendente"""
+    binario = bin(bitset)[:1:-1]
+    return [posicion for posicion, bit in enumerate(binario) if bit == '1']
+
+
+def filtro_por_ids(bitset):
+    """
+    Subconsulta con los ids del bitset. En SQLite se envían como un solo
+    parámetro JSON para no chocar con el límite de variables por consulta.
+    """
+    ids = ids_de_bitset(bitset)
+    if connection.vendor == 'sqlite':
+        return RawSQL('SELECT value FROM json_each(%s)', [json.dumps(ids)])
+    return ids
+
+
+def leer_seleccion(parametros):
+    """Extrae de request.GET los valores elegidos para cada faceta"""
+    seleccion = {}
+    for faceta, _ in FACETAS:
+        valores = set(parametros.getlist(faceta))
+        if faceta in ('artista', 'categoria'):
+            valores = {int(valor) for valor in valores if valor.isdigit()}
+        elif faceta == 'precio':
+            valores &= {clave for clave, *_ in RANGOS_PRECIO}
+        elif faceta == 'disponible':
+            valores &= {'1'}
+        if valores:
+            seleccion[faceta] = valores
+    return seleccion
+
+
+class ResultadoFacetas:
+    def __init__(self, bitset, facetas):
+        self.bitset = bitset
+        self.total = bitset.bit_count()
+        self.facetas = facetas
+
+
+class IndiceFacetas:
+    """
+    Índice en memoria: para cada valor de faceta guarda un entero usado como
+    bitset de ids de producto. Las intersecciones y los conteos se resuelven
+    con operaciones de bits, sin consultar la base de datos.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._conjuntos = {}
+        self._miembros = {}
+        self._nombres = {'artista': {}, 'categoria': {}}
+        self._version = None
+        self._construido = 0
+
+    def _construir(self):
+        conjuntos = {}
+        miembros = {}
+        filas = Producto.objects.filter(activo=True).values_list(
+            'id', 'tipo', 'precio', 'stock', 'stock_reservado', 'artista_id', 'categoria_id'
+        )
+        for pk, *datos in filas.iterator(chunk_size=2000):
+            claves = _claves_producto(*datos)
+            miembros[pk] = claves
+            for clave in claves:
+                conjuntos[clave] = conjuntos.get(clave, 0) | (1 << pk)
+
+        self._conjuntos = conjuntos
+        self._miembros = miembros
+        self._nombres = {
+            'artista': dict(Artista.objects.values_list('id', 'nombre')),
+            'categoria': dict(Categoria.objects.values_list('id', 'nombre')),
+        }
+        self._construido = time.monotonic()
+
+    def _caducado(self, version):
+        return self._version != version or time.monotonic() - self._construido > edad_maxima()
+
+    def _asegurar_vigente(self):
+        # La versión está en la caché compartida: la cambia cualquier proceso
+        version = obtener_version(VERSION_FACETAS)
+        if self._caducado(version):
+            with self._lock:
+                if self._caducado(version):
+                    self._construir()
+                    self._version = version
+
+    def _quitar(self, pk):
+        for clave in self._miembros.pop(pk, []):
+            self._conjuntos[clave] &= ~(1 << pk)
+
+    def actualizar_producto(self, producto):
+        """Actualiza de forma incremental la pertenencia de un producto"""
+        with self._lock:
+            vigente = self._version is not None and self._version == obtener_version(VERSION_FACETAS)
+            nueva_version = incrementar_version(VERSION_FACETAS)
+            if not vigente:
+                # Se reconstruirá completo en la siguiente lectura
+                return
+
+            self._quitar(producto.pk)
+            if producto.activo:
+                claves = _claves_producto(
+                    producto.tipo, producto.precio, producto.stock, producto.stock_reservado,
+                    producto.artista_id, producto.categoria_id,
+                )
+                self._miembros[producto.pk] = claves
+                for clave in claves:
+                    self._conjuntos[clave] = self._conjuntos.get(clave, 0) | (1 << producto.pk)
+            self._version = nueva_version
+
+    def quitar_producto(self, pk):
+        with self._lock:
+            vigente = self._version is not None and self._version == obtener_version(VERSION_FACETAS)
+            nueva_version = incrementar_version(VERSION_FACETAS)
+            if vigente:
+                self._quitar(pk)
+                self._version = nueva_version
+
+    def invalidar(self):
+        """Fuerza una reconstrucción completa (p. ej. al renombrar un artista)"""
+        incrementar_version(VERSION_FACETAS)
+
+    def _etiqueta(self, faceta, valor):
+        if faceta == 'precio':
+            return next(etiqueta for clave, etiqueta, *_ in RANGOS_PRECIO if clave == valor)
+        if faceta == 'disponible':
+            return 'Solo disponibles'
+        return self._nombres[faceta].get(valor, '—')
+
+    def _valores(self, faceta):
+        if faceta == 'precio':
+            return [clave for clave, *_ in RANGOS_PRECIO]
+        if faceta == 'disponible':
+            return ['1']
+        valores = [valor for (nombre, valor) in self._conjuntos if nombre == faceta]
+        return sorted(valores, key=lambda valor: self._nombres[faceta].get(valor, ''))
+
+    def filtrar(self, tipo, seleccion):
+        """
+        Aplica la selección dentro de un tipo de producto. Los valores de una
+        misma faceta se combinan con OR y las facetas entre sí con AND; el
+        conteo de cada faceta ignora su propia selección.
+        """
+        self._asegurar_vigente()
+        conjuntos = self._conjuntos
+        universo = conjuntos.get(('tipo', tipo), 0)
+
+        por_faceta = {}
+        for faceta, valores in seleccion.items():
+            union = 0
+            for valor in valores:
+                union |= conjuntos.get((faceta, valor), 0)
+            por_faceta[faceta] = union
+
+        resultado = universo
+        for union in por_faceta.values():
+            resultado &= union
+
+        facetas = []
+        for faceta, titulo in FACETAS:
+            base = universo
+            for otra, union in por_faceta.items():
+                if otra != faceta:
+                    base &= union
+
+            opciones = []
+            elegidos = seleccion.get(faceta, set())
+            for valor in self._valores(faceta):
+                conteo = (base & conjuntos.get((faceta, valor), 0)).bit_count()
+                if conteo or valor in elegidos:
+                    opciones.append({
+                        'valor': valor,
+                        'etiqueta': self._etiqueta(faceta, valor),
+                        'conteo': conteo,
+                        'seleccionado': valor in elegidos,
+                    })
+            if opciones:
+                facetas.append({'nombre': faceta, 'titulo': titulo, 'opciones': opciones})
+
+        return ResultadoFacetas(resultado, facetas)
+
+
+indice_facetas = IndiceFacetas()
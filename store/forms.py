@@ -24,6 +24,10 @@ class LoginForm(AuthenticationForm):
     password = forms.CharField(widget=forms.PasswordInput(attrs={'class': 'form-control'}))
 
 class ProductoForm(forms.ModelForm):
+    # Stock que vio el administrador al abrir el formulario: el guardado
+    # aplica solo su diferencia, sin pisar las ventas hechas entre tanto
+    stock_original = forms.IntegerField(widget=forms.HiddenInput, required=False)
+    
     class Meta:
         model = Producto
         fields = '__all__'
@@ -31,6 +35,19 @@ class ProductoForm(forms.ModelForm):
             'descripcion': forms.Textarea(attrs={'rows': 3}),
             'precio': forms.NumberInput(attrs={'step': '0.01'}),
         }
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk:
+            self.fields['stock_original'].initial = self.instance.stock
+        else:
+            del self.fields['stock_original']
+    
+    def save(self, commit=True):
+        original = self.cleaned_data.get('stock_original')
+        if original is not None:
+            self.instance._stock_original = original
+        return super().save(commit)
 
 class ArtistaForm(forms.ModelForm):
     class Meta:
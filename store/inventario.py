@@ -0,0 +1,148 @@
+# inventario.py - Libro de movimientos de inventario
+from django.db import transaction
+from django.db.models import F, Max, Sum
+from django.utils import timezone
+
+from . import estadisticas
+from .facetas import indice_facetas
+from .models import ItemPedido, MovimientoInventario, Producto
+from .notificaciones import UMBRAL_STOCK_BAJO
+from .versiones import incrementar_version
+
+
+def stock_actualizado(cambios, liberadas=None):
+    """
+    Los cambios de stock con update() no disparan señales: se refrescan a
+    mano los datos derivados. `cambios` es {producto_id: unidades sumadas},
+    negativas si se descontaron; `liberadas`, las unidades que dejaron de
+    estar reservadas en el mismo cambio (las reservas que vende el checkout).
+    """
+    liberadas = liberadas or {}
+    stock_bajo = 0
+    for producto in Producto.objects.filter(pk__in=cambios):
+        anterior = producto.stock - cambios[producto.pk]
+        reservado_anterior = producto.stock_reservado + liberadas.get(producto.pk, 0)
+        # La faceta de disponibilidad solo cambia al quedarse sin unidades libres o recuperarlas
+        if (producto.stock > producto.stock_reservado) != (anterior > reservado_anterior):
+            indice_facetas.actualizar_producto(producto)
+        stock_bajo += (producto.stock < UMBRAL_STOCK_BAJO) - (anterior < UMBRAL_STOCK_BAJO)
+    estadisticas.ajustar(stock_bajo=stock_bajo)
+    incrementar_version('fragmentos:productos')
+
+
+def registrar(producto_id, tipo, cantidad, pedido=None):
+    """Añade una fila al libro; el stock ya lo cambió quien llama"""
+    return MovimientoInventario.objects.create(producto_id=producto_id, tipo=tipo, cantidad=cantidad, pedido=pedido)
+
+
+def registrar_venta(pedido, unidades):
+    """Una fila por producto vendido, con la fecha del pedido"""
+    MovimientoInventario.objects.bulk_create([
+        MovimientoInventario(producto_id=producto_id, tipo='venta', cantidad=-cantidad, pedido=pedido, fecha=pedido.fecha_pedido)
+        for producto_id, cantidad in unidades.items()
+    ])
+
+
+def _unidades_pedido(pedido):
+    return dict(
+        ItemPedido.objects.filter(pedido=pedido)
+        .order_by()
+        .values('producto')
+        .annotate(total=Sum('cantidad'))
+        .values_list('producto', 'total')
+    )
+
+
+def _mover_pedido(pedido, tipo, signo):
+    unidades = _unidades_pedido(pedido)
+    if not unidades:
+        return
+    ahora = timezone.now()
+    with transaction.atomic():
+        for producto_id, cantidad in unidades.items():
+            Producto.objects.filter(pk=producto_id).update(stock=F('stock') + signo * cantidad, fecha_actualizacion=ahora)
+        MovimientoInventario.objects.bulk_create([
+            MovimientoInventario(producto_id=producto_id, tipo=tipo, cantidad=signo * cantidad, pedido=pedido, fecha=ahora)
+            for producto_id, cantidad in unidades.items()
+        ])
+        transaction.on_commit(lambda: stock_actualizado({pk: signo * cantidad for pk, cantidad in unidades.items()}))
+
+
+def cancelar_pedido(pedido):
+    """Devuelve al stock las unidades de un pedido cancelado"""
+    _mover_pedido(pedido, 'cancelacion', 1)
+
+
+def reactivar_pedido(pedido):
+    """
+    Un pedido cancelado vuelve a un estado activo: se descuentan otra vez sus
+    unidades. Lo decide el administrador, así que no se comprueba el stock.
+    """
+    _mover_pedido(pedido, 'venta', -1)
+
+
+def stock_segun_libro(producto_ids=None):
+    """Saldo más los movimientos posteriores, por producto"""
+    movimientos = MovimientoInventario.objects.all()
+    if producto_ids is not None:
+        movimientos = movimientos.filter(producto_id__in=producto_ids)
+    return dict(
+        movimientos.order_by().values('producto').annotate(total=Sum('cantidad')).values_list('producto', 'total')
+    )
+
+
+def fecha_corte():
+    """Hasta dónde está compactado el libro (la fecha del último saldo)"""
+    return MovimientoInventario.objects.filter(tipo='saldo').aggregate(corte=Max('fecha'))['corte']
+
+
+def compactar(antes_de):
+    """
+    Resume los movimientos anteriores a `antes_de` en una fila 'saldo' por
+    producto con la misma suma. Devuelve (filas borradas, saldos creados).
+    """
+    with transaction.atomic():
+        antiguos = MovimientoInventario.objects.select_for_update().filter(fecha__lt=antes_de)
+        saldos = dict(
+            antiguos.order_by().values('producto').annotate(total=Sum('cantidad')).values_list('producto', 'total')
+        )
+        borrados, _ = antiguos.delete()
+        MovimientoInventario.objects.bulk_create([
+            MovimientoInventario(producto_id=producto_id, tipo='saldo', cantidad=total, fecha=antes_de)
+            for producto_id, total in saldos.items()
+        ])
+    return borrados, len(saldos)
+
+
+def conciliar():
+    """
+    Compara en bloque (consultas agrupadas, sin recorrer producto por producto):
+    - el stock de cada producto con la suma de su libro
+    - las ventas del libro con las líneas de pedido no canceladas posteriores al corte
+    Devuelve dos diccionarios {producto_id: (esperado, en el libro)} con las diferencias.
+    """
+    libro = stock_segun_libro()
+    stock = dict(Producto.objects.values_list('pk', 'stock'))
+    diferencias_stock = {
+        pk: (cantidad, libro.get(pk, 0))
+        for pk, cantidad in stock.items() if cantidad != libro.get(pk, 0)
+    }
+
+    corte = fecha_corte()
+    movimientos = MovimientoInventario.objects.filter(pedido__isnull=False)
+    lineas = ItemPedido.objects.exclude(pedido__estado='cancelado')
+    if corte is not None:
+        movimientos = movimientos.filter(pedido__fecha_pedido__gte=corte)
+        lineas = lineas.filter(pedido__fecha_pedido__gte=corte)
+    vendido_libro = dict(
+        movimientos.order_by().values('producto').annotate(total=Sum('cantidad')).values_list('producto', 'total')
+    )
+    vendido_pedidos = dict(
+        lineas.order_by().values('producto').annotate(total=Sum('cantidad')).values_list('producto', 'total')
+    )
+    diferencias_ventas = {
+        pk: (vendido_pedidos.get(pk, 0), -vendido_libro.get(pk, 0))
+        for pk in vendido_libro.keys() | vendido_pedidos.keys()
+        if vendido_pedidos.get(pk, 0) != -vendido_libro.get(pk, 0)
+    }
+    return diferencias_stock, diferencias_ventas
@@ -0,0 +1,24 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from store.archivo import archivar_pedidos, edad_archivo, recalcular_totales
+
+
+class Command(BaseCommand):
+    help = 'Mueve al archivo los pedidos entregados o cancelados sin cambios desde hace tiempo'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, help='Antigüedad mínima (por defecto ARCHIVO_PEDIDOS_DIAS)')
+        parser.add_argument('--lote', type=int, default=500, help='Pedidos que se mueven por transacción')
+        parser.add_argument('--recalcular', action='store_true',
+                            help='Además reconstruye los totales por usuario y por día del archivo')
+
+    def handle(self, *args, **options):
+        edad = timedelta(days=options['dias']) if options['dias'] is not None else edad_archivo()
+        total = archivar_pedidos(timezone.now() - edad, options['lote'])
+        self.stdout.write(self.style.SUCCESS(f'✓ {total} pedidos archivados'))
+        if options['recalcular']:
+            recalcular_totales()
+            self.stdout.write(self.style.SUCCESS('✓ Totales del archivo recalculados'))
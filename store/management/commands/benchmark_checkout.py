@@ -0,0 +1,147 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+from django.db.models import Sum
+from django.test import RequestFactory
+
+from store.models import ItemPedido, MovimientoInventario, Pedido, Producto, Tarea
+
+PREFIJO = 'benchmark_checkout_'
+
+
+def _iniciar_proceso(timeout):
+    import django
+    django.setup()
+    if connection.vendor == 'sqlite':
+        # SQLite serializa a los escritores: cada transacción toma el bloqueo de
+        # escritura al empezar y espera su turno en lugar de fallar
+        connection.settings_dict['OPTIONS'].update(timeout=timeout, transaction_mode='IMMEDIATE')
+
+
+def _comprador(usuario_id, producto_id, intentos, cantidad, inicio):
+    """Un proceso que compra en bucle el mismo producto; devuelve sus contadores"""
+    from store.carritos import clase_carrito
+    from store.pedidos import StockInsuficiente, crear_pedido
+    from store.reservas import SinDisponibilidad
+    from store.resumen_carrito import ResumenCarrito
+
+    usuario = User.objects.get(pk=usuario_id)
+    producto = Producto.objects.get(pk=producto_id)
+    resultado = {'vendidas': 0, 'pedidos': 0, 'rechazados': 0, 'bloqueos': 0}
+
+    # Todos los procesos empiezan a la vez para maximizar la contención
+    time.sleep(max(0, inicio - time.time()))
+    for _ in range(intentos):
+        request = RequestFactory().post('/checkout/')
+        request.user = usuario
+        request.session = import_module(settings.SESSION_ENGINE).SessionStore()
+        request._carrito = clase_carrito(False)(request)
+        try:
+            request._carrito.vaciar()
+            request._carrito.agregar(producto, cantidad)
+            crear_pedido(usuario, ResumenCarrito(request), 'efectivo', 'Benchmark')
+        except (SinDisponibilidad, StockInsuficiente):
+            resultado['rechazados'] += 1
+        except OperationalError:
+            resultado['bloqueos'] += 1
+        else:
+            resultado['pedidos'] += 1
+            resultado['vendidas'] += cantidad
+    connections.close_all()
+    return resultado
+
+
+class Command(BaseCommand):
+    help = 'Lanza compras simultáneas desde varios procesos sobre un producto y comprueba que no se sobrevende'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=8)
+        parser.add_argument('--intentos', type=int, default=25, help='Compras que intenta cada proceso')
+        parser.add_argument('--stock', type=int, default=100)
+        parser.add_argument('--cantidad', type=int, default=1, help='Unidades por compra')
+        parser.add_argument('--timeout', type=float, default=30, help='Espera máxima por el bloqueo en SQLite (segundos)')
+        parser.add_argument('--conservar', action='store_true', help='No borra el producto, los usuarios ni los pedidos creados')
+
+    def handle(self, *args, **options):
+        procesos, stock, cantidad = options['procesos'], options['stock'], options['cantidad']
+
+        producto = Producto.objects.create(
+            nombre=f'{PREFIJO}producto',
+            descripcion='Producto temporal del benchmark de checkout',
+            precio=Decimal('100.00'),
+            stock=stock,
+            tipo='original',
+            activo=False,
+        )
+        usuarios = [
+            User.objects.create_user(username=f'{PREFIJO}{indice}_{producto.pk}')
+            for indice in range(procesos)
+        ]
+        # Cada proceso abre su propia conexión
+        connections.close_all()
+
+        inicio = time.time() + 2
+        try:
+            with ProcessPoolExecutor(procesos, initializer=_iniciar_proceso, initargs=(options['timeout'],)) as pool:
+                futuros = [
+                    pool.submit(_comprador, usuario.pk, producto.pk, options['intentos'], cantidad, inicio)
+                    for usuario in usuarios
+                ]
+                resultados = [futuro.result() for futuro in futuros]
+            duracion = time.time() - inicio
+
+            totales = {clave: sum(r[clave] for r in resultados) for clave in resultados[0]}
+            producto.refresh_from_db()
+            registradas = ItemPedido.objects.filter(producto=producto).aggregate(total=Sum('cantidad'))['total'] or 0
+
+            intentos = procesos * options['intentos']
+            self.stdout.write(
+                f'{intentos} intentos en {duracion:.2f} s ({intentos / duracion:,.0f}/s): '
+                f'{totales["pedidos"]} pedidos, {totales["rechazados"]} sin stock, {totales["bloqueos"]} bloqueos'
+            )
+            self.stdout.write(
+                f'Stock inicial {stock}, vendidas {totales["vendidas"]}, '
+                f'en ItemPedido {registradas}, stock final {producto.stock}'
+            )
+
+            errores = []
+            if producto.stock < 0:
+                errores.append(f'stock negativo ({producto.stock})')
+            if stock - producto.stock != registradas:
+                errores.append('el stock descontado no coincide con las líneas de pedido')
+            if registradas != totales['vendidas']:
+                errores.append('hay líneas de pedido que los procesos no vieron confirmadas')
+            if totales['rechazados'] and producto.stock >= cantidad:
+                errores.append('se rechazaron compras con stock disponible')
+            if errores:
+                raise CommandError('Sobreventa detectada: ' + '; '.join(errores))
+            self.stdout.write(self.style.SUCCESS('✓ Sin sobreventa'))
+        finally:
+            if not options['conservar']:
+                self._limpiar(usuarios, producto)
+
+    def _limpiar(self, usuarios, producto):
+        """
+        Borra todo lo que dejó el benchmark en la base de datos real: también
+        las tareas que encoló cada pedido (el worker las tomaría) y los
+        movimientos del libro de inventario (los vería conciliar_inventario).
+        Un estadisticas.recalcular pendiente se deja: solo rehace los contadores.
+        """
+        pedido_ids = list(Pedido.objects.filter(usuario__in=usuarios).values_list('pk', flat=True))
+        tareas = [
+            tarea.pk
+            for tarea in Tarea.objects.filter(nombre__in=['pedido.confirmacion', 'artistas.venta', 'inventario.stock_bajo'])
+            if tarea.datos.get('pedido_id') in pedido_ids or tarea.datos.get('producto_ids') == [producto.pk]
+        ]
+        Tarea.objects.filter(pk__in=tareas).delete()
+        MovimientoInventario.objects.filter(producto=producto).delete()
+        Pedido.objects.filter(pk__in=pedido_ids).delete()
+        User.objects.filter(pk__in=[usuario.pk for usuario in usuarios]).delete()
+        producto.delete()
+        self.stdout.write(f'Limpieza: {len(pedido_ids)} pedidos, {len(tareas)} tareas y el producto temporal')
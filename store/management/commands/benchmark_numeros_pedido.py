@@ -0,0 +1,77 @@
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from store.models import Pedido
+from store.numeros_pedido import generar_numero_pedido
+
+PREFIJO = 'benchmark_numeros_'
+
+
+def _iniciar_proceso(timeout):
+    import django
+    django.setup()
+    if connection.vendor == 'sqlite':
+        connection.settings_dict['OPTIONS'].update(timeout=timeout)
+
+
+def _generador(cantidad, usuario_id, inicio):
+    """Genera `cantidad` números; con usuario_id además crea los pedidos (el índice único es el árbitro)"""
+    time.sleep(max(0, inicio - time.time()))
+    numeros = [generar_numero_pedido() for _ in range(cantidad)]
+    if usuario_id is not None:
+        Pedido.objects.bulk_create([
+            Pedido(usuario_id=usuario_id, numero_pedido=numero, metodo_pago='efectivo',
+                   subtotal=Decimal('0'), total=Decimal('0'), direccion_envio='Benchmark')
+            for numero in numeros
+        ], batch_size=500)
+    connections.close_all()
+    return numeros
+
+
+class Command(BaseCommand):
+    help = (
+        'Genera números de pedido desde varios procesos a la vez y comprueba que no se repite ninguno. '
+        'Mide solo la asignación de números; el checkout completo lo mide benchmark_checkout'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=8)
+        parser.add_argument('--numeros', type=int, default=5000, help='Números que genera cada proceso')
+        parser.add_argument('--pedidos', action='store_true', help='Además inserta un pedido por número')
+        parser.add_argument('--timeout', type=float, default=30, help='Espera máxima por el bloqueo en SQLite (segundos)')
+
+    def handle(self, *args, **options):
+        procesos, cantidad = options['procesos'], options['numeros']
+        usuario = User.objects.create_user(username=f'{PREFIJO}{time.time_ns()}') if options['pedidos'] else None
+        connections.close_all()
+
+        inicio = time.time() + 2
+        try:
+            with ProcessPoolExecutor(procesos, initializer=_iniciar_proceso, initargs=(options['timeout'],)) as pool:
+                futuros = [
+                    pool.submit(_generador, cantidad, usuario.pk if usuario else None, inicio)
+                    for _ in range(procesos)
+                ]
+                numeros = [numero for futuro in futuros for numero in futuro.result()]
+            duracion = time.time() - inicio
+
+            repetidos = [numero for numero, veces in Counter(numeros).items() if veces > 1]
+            medida = 'números+INSERT/s' if usuario else 'números/s'
+            self.stdout.write(
+                f'{len(numeros):,} números en {duracion:.2f} s ({len(numeros) / duracion:,.0f} {medida}) '
+                f'desde {procesos} procesos; {len(repetidos)} repetidos'
+            )
+            if usuario:
+                self.stdout.write(f'{Pedido.objects.filter(usuario=usuario).count():,} pedidos insertados')
+            if repetidos:
+                raise CommandError(f'Números repetidos: {", ".join(repetidos[:10])}')
+            self.stdout.write(self.style.SUCCESS('✓ Sin colisiones'))
+        finally:
+            if usuario:
+                usuario.delete()
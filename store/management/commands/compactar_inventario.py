@@ -0,0 +1,20 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from store.inventario import compactar
+
+
+class Command(BaseCommand):
+    help = 'Resume los movimientos de inventario antiguos en una fila de saldo por producto'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=90, help='Conserva el detalle de los últimos N días')
+
+    def handle(self, *args, **options):
+        corte = timezone.now() - timedelta(days=options['dias'])
+        borrados, saldos = compactar(corte)
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {borrados} movimientos anteriores al {corte:%Y-%m-%d} resumidos en {saldos} saldos'
+        ))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from store.inventario import conciliar, registrar
+from store.models import Producto
+
+
+class Command(BaseCommand):
+    help = 'Comprueba el stock contra el libro de inventario y las ventas del libro contra los pedidos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--corregir', action='store_true',
+                            help='Anota ajustes para que el libro cuadre con el stock actual')
+
+    def handle(self, *args, **options):
+        diferencias_stock, diferencias_ventas = conciliar()
+        nombres = dict(Producto.objects.filter(pk__in=diferencias_stock.keys() | diferencias_ventas.keys()).values_list('pk', 'nombre'))
+
+        for pk, (stock, libro) in sorted(diferencias_stock.items()):
+            self.stdout.write(self.style.WARNING(f'! {nombres.get(pk, pk)}: stock {stock}, según el libro {libro}'))
+        for pk, (pedidos, libro) in sorted(diferencias_ventas.items()):
+            self.stdout.write(self.style.WARNING(f'! {nombres.get(pk, pk)}: {pedidos} unidades en pedidos, {libro} vendidas según el libro'))
+
+        if options['corregir'] and diferencias_stock:
+            with transaction.atomic():
+                for pk, (stock, libro) in diferencias_stock.items():
+                    registrar(pk, 'ajuste', stock - libro)
+            self.stdout.write(f'Se anotaron {len(diferencias_stock)} ajustes')
+
+        if diferencias_stock or diferencias_ventas:
+            self.stdout.write(self.style.ERROR(
+                f'✗ {len(diferencias_stock)} productos descuadrados con el libro, '
+                f'{len(diferencias_ventas)} con los pedidos'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS('✓ El inventario cuadra con el libro y los pedidos'))
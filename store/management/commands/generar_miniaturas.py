@@ -0,0 +1,38 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+
+from store.miniaturas import generar_derivados
+from store.models import Producto, Artista
+
+
+def _iniciar_proceso():
+    import django
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = 'Genera los derivados WebP/JPEG de las imágenes de productos y artistas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--forzar', action='store_true', help='Regenera aunque ya existan derivados')
+        parser.add_argument('--procesos', type=int, default=2, help='Procesos que generan derivados en paralelo')
+
+    def handle(self, *args, **options):
+        nombres = set(Producto.objects.exclude(imagen='').exclude(imagen=None).values_list('imagen', flat=True))
+        nombres |= set(Artista.objects.exclude(foto='').exclude(foto=None).values_list('foto', flat=True))
+
+        errores = 0
+        # El pool vive solo lo que dura el comando; en la web los derivados los genera procesar_tareas
+        with ProcessPoolExecutor(max_workers=options['procesos'], initializer=_iniciar_proceso) as pool:
+            futuros = {pool.submit(generar_derivados, nombre, options['forzar']): nombre for nombre in sorted(nombres)}
+            for futuro in as_completed(futuros):
+                nombre = futuros[futuro]
+                try:
+                    anchos = futuro.result()
+                    self.stdout.write(f'✓ {nombre}: {", ".join(str(ancho) for ancho in anchos)} px')
+                except Exception as e:
+                    errores += 1
+                    self.stdout.write(self.style.ERROR(f'✗ {nombre}: {e}'))
+
+        self.stdout.write(self.style.SUCCESS(f'Listo: {len(nombres) - errores} imágenes procesadas, {errores} con error'))
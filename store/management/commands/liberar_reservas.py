@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from store.reservas import liberar_vencidas, recalcular_reservado
+
+
+class Command(BaseCommand):
+    help = 'Libera en bloque las reservas de stock vencidas (pensado para ejecutarse cada minuto)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recalcular', action='store_true',
+                            help='Además recalcula stock_reservado de todos los productos desde las reservas')
+
+    def handle(self, *args, **options):
+        liberadas = liberar_vencidas()
+        self.stdout.write(self.style.SUCCESS(f'✓ {liberadas} reservas vencidas liberadas'))
+        if options['recalcular']:
+            total = recalcular_reservado()
+            self.stdout.write(self.style.SUCCESS(f'✓ {total} productos recalculados'))
@@ -0,0 +1,107 @@
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from store import miniaturas
+from store.almacenamiento import almacenamiento_por_contenido, calcular_digest, es_inmutable, nombre_por_digest
+from store.models import Producto, Artista, PerfilUsuario
+from store.versiones import incrementar_version
+
+CAMPOS = [(Producto, 'imagen'), (Artista, 'foto'), (PerfilUsuario, 'avatar')]
+
+# Solo estos campos tienen miniaturas (ver signals.CAMPOS_IMAGEN)
+CON_MINIATURAS = {Producto, Artista}
+
+
+def _kb(cantidad):
+    return f'{cantidad / 1024:,.1f} KB'
+
+
+def _archivos(almacenamiento, carpeta):
+    """Archivos bajo la carpeta de upload_to que aún no están por contenido"""
+    try:
+        directorios, archivos = almacenamiento.listdir(carpeta)
+    except FileNotFoundError:
+        return
+    for archivo in archivos:
+        if not es_inmutable(carpeta + archivo):
+            yield carpeta + archivo
+    for directorio in directorios:
+        yield from _archivos(almacenamiento, f'{carpeta}{directorio}/')
+
+
+class Command(BaseCommand):
+    help = 'Pasa las imágenes existentes al almacenamiento por contenido y elimina las copias repetidas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--simular', action='store_true', help='Solo informa, no copia ni borra nada')
+
+    def handle(self, *args, **options):
+        simular = options['simular']
+        almacenamiento = almacenamiento_por_contenido()
+
+        referencias = {}  # nombre anterior -> [(modelo, campo, pk)]
+        carpetas = []
+        for modelo, campo in CAMPOS:
+            carpetas.append(modelo._meta.get_field(campo).upload_to)
+            filas = modelo.objects.exclude(**{campo: ''}).exclude(**{f'{campo}__isnull': True}).values_list('pk', campo)
+            for pk, nombre in filas:
+                if not es_inmutable(nombre):
+                    referencias.setdefault(nombre, []).append((modelo, campo, pk))
+
+        # Primero los referenciados, así una copia huérfana nunca se queda como el blob
+        huerfanos = sorted({nombre for carpeta in carpetas for nombre in _archivos(almacenamiento, carpeta)} - set(referencias))
+        nuevos = {}   # nombre anterior -> nombre por digest
+        blobs = {}    # nombre por digest -> archivo del que se copia
+        borrados = 0  # bytes de los archivos anteriores que se eliminan
+
+        for nombre in list(referencias) + huerfanos:
+            if not almacenamiento.exists(nombre):
+                self.stdout.write(self.style.WARNING(f'! No existe {nombre}'))
+                continue
+            with almacenamiento.open(nombre, 'rb') as archivo:
+                nuevo = nombre_por_digest(nombre, calcular_digest(File(archivo)))
+            repetido = nuevo in blobs or almacenamiento.exists(nuevo)
+
+            if nombre not in referencias and not repetido:
+                self.stdout.write(f'  {nombre}: sin referencias y sin copia, se conserva')
+                continue
+
+            if not repetido:
+                blobs[nuevo] = nombre
+            nuevos[nombre] = nuevo
+            borrados += almacenamiento.size(nombre)
+            self.stdout.write(f'  {nombre} -> {nuevo}{" (copia repetida)" if repetido else ""}')
+
+        escritos = sum(almacenamiento.size(nombre) for nombre in blobs.values())
+
+        if not simular and nuevos:
+            for nuevo, nombre in blobs.items():
+                with almacenamiento.open(nombre, 'rb') as archivo:
+                    almacenamiento.save(nombre, File(archivo))
+
+            ahora = timezone.now()
+            with transaction.atomic():
+                # update() directo: el contenido no cambia, solo el nombre. Se toca
+                # fecha_actualizacion para que los ETag de las páginas de detalle cambien
+                for nombre, filas in referencias.items():
+                    for modelo, campo, pk in filas:
+                        if nombre in nuevos:
+                            modelo.objects.filter(pk=pk).update(**{campo: nuevos[nombre], 'fecha_actualizacion': ahora})
+
+            for nombre, filas in referencias.items():
+                if nombre in nuevos and any(modelo in CON_MINIATURAS for modelo, _, _ in filas):
+                    miniaturas.generar_derivados(nuevos[nombre])
+
+            for nombre in nuevos:
+                miniaturas.borrar_derivados(nombre)
+                almacenamiento.delete(nombre)
+
+            incrementar_version('fragmentos:productos')
+
+        verbo = 'Se recuperarían' if simular else 'Se recuperaron'
+        self.stdout.write(self.style.SUCCESS(
+            f'Listo: {len(nuevos)} archivos -> {len(blobs)} blobs nuevos. '
+            f'{verbo} {_kb(borrados - escritos)} ({_kb(borrados)} -> {_kb(escritos)})'
+        ))
@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from store.tareas import ejecutar, nombre_trabajador, purgar_terminadas, reclamar
+
+# Las tareas hechas se purgan como mucho una vez por hora
+INTERVALO_PURGA = 60 * 60
+
+
+class Command(BaseCommand):
+    help = 'Worker de la cola de tareas: ejecuta las pendientes y reintenta las que fallan'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=10, help='Tareas que toma en cada consulta')
+        parser.add_argument('--espera', type=float, default=2, help='Segundos de espera cuando no hay tareas')
+        parser.add_argument('--una-vez', action='store_true', help='Vacía la cola y termina (para cron o pruebas)')
+        parser.add_argument('--retencion', type=int, default=7, help='Días que se conservan las tareas hechas')
+
+    def handle(self, *args, **options):
+        trabajador = nombre_trabajador()
+        self.stdout.write(f'Worker {trabajador} iniciado')
+        ultima_purga = 0
+
+        while True:
+            lote = reclamar(trabajador, options['lote'])
+            for trabajo in lote:
+                if ejecutar(trabajo):
+                    self.stdout.write(self.style.SUCCESS(f'✓ {trabajo.nombre} #{trabajo.pk}'))
+                else:
+                    self.stdout.write(self.style.ERROR(f'✗ {trabajo.nombre} #{trabajo.pk} (intento {trabajo.intentos})'))
+
+            if lote:
+                continue
+            if time.monotonic() - ultima_purga > INTERVALO_PURGA:
+                borradas = purgar_terminadas(options['retencion'])
+                if borradas:
+                    self.stdout.write(f'{borradas} tareas antiguas purgadas')
+                ultima_purga = time.monotonic()
+            if options['una_vez']:
+                break
+            # No retener la conexión mientras se espera
+            connections.close_all()
+            time.sleep(options['espera'])
@@ -0,0 +1,72 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from store import miniaturas
+from store.almacenamiento import almacenamiento_por_contenido, es_inmutable
+from store.management.commands.migrar_media_por_contenido import CAMPOS, _kb
+from store.models import Pedido, PedidoArchivado
+
+
+def _blobs(almacenamiento, carpeta):
+    """Blobs por contenido bajo la carpeta de upload_to"""
+    try:
+        directorios, archivos = almacenamiento.listdir(carpeta)
+    except FileNotFoundError:
+        return
+    for archivo in archivos:
+        if es_inmutable(carpeta + archivo):
+            yield carpeta + archivo
+    for directorio in directorios:
+        yield from _blobs(almacenamiento, f'{carpeta}{directorio}/')
+
+
+def nombres_en_uso():
+    """Nombres a los que apunta alguna fila, incluidas las imágenes de resumen_lineas"""
+    nombres = set()
+    for modelo, campo in CAMPOS:
+        nombres.update(modelo.objects.exclude(**{campo: ''}).exclude(**{f'{campo}__isnull': True}).values_list(campo, flat=True))
+    for modelo in (Pedido, PedidoArchivado):
+        for lineas in modelo.objects.exclude(resumen_lineas=[]).values_list('resumen_lineas', flat=True).iterator():
+            nombres.update(linea['imagen'] for linea in lineas if linea.get('imagen'))
+    return nombres
+
+
+class Command(BaseCommand):
+    help = 'Elimina los blobs por contenido (y sus miniaturas) que ya no referencia ninguna fila'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--simular', action='store_true', help='Solo informa, no borra nada')
+        parser.add_argument(
+            '--horas', type=int, default=24,
+            help='Respeta los blobs más recientes: pueden ser de un formulario que aún no guardó su fila',
+        )
+
+    def handle(self, *args, **options):
+        simular = options['simular']
+        almacenamiento = almacenamiento_por_contenido()
+        limite = timezone.now() - timedelta(hours=options['horas'])
+
+        en_uso = nombres_en_uso()
+        carpetas = [modelo._meta.get_field(campo).upload_to for modelo, campo in CAMPOS]
+
+        borrados = []
+        liberados = 0
+        for carpeta in carpetas:
+            for nombre in _blobs(almacenamiento, carpeta):
+                if nombre in en_uso or almacenamiento.get_modified_time(nombre) > limite:
+                    continue
+                borrados.append(nombre)
+                liberados += almacenamiento.size(nombre)
+                self.stdout.write(f'  {nombre}')
+
+        if not simular:
+            for nombre in borrados:
+                miniaturas.borrar_derivados(nombre)
+                almacenamiento.borrar_blob(nombre)
+
+        verbo = 'Se liberarían' if simular else 'Se liberaron'
+        self.stdout.write(self.style.SUCCESS(
+            f'Listo: {len(borrados)} blobs sin referencias. {verbo} {_kb(liberados)} (sin contar miniaturas)'
+        ))
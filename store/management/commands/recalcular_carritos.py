@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from store.totales_carrito import recalcular_totales
+
+
+class Command(BaseCommand):
+    help = 'Recalcula la cantidad y el subtotal guardados en todos los carritos'
+
+    def handle(self, *args, **options):
+        total = recalcular_totales()
+        self.stdout.write(self.style.SUCCESS(f'✓ {total} carritos recalculados'))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from store.contadores import recalcular_contadores
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los contadores de productos activos de artistas y categorías'
+
+    def handle(self, *args, **options):
+        corregidos = recalcular_contadores()
+        for nombre, total in corregidos.items():
+            self.stdout.write(self.style.SUCCESS(f'✓ {nombre}: {total} contadores corregidos'))
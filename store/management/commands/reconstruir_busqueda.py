@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from store.busqueda import indice_disponible, reconstruir_indice
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye desde cero el índice de búsqueda de productos (FTS5)'
+
+    def handle(self, *args, **options):
+        if not indice_disponible():
+            self.stdout.write(self.style.WARNING('El índice FTS5 solo está disponible con SQLite.'))
+            return
+
+        total = reconstruir_indice()
+        self.stdout.write(self.style.SUCCESS(f'✓ Índice reconstruido con {total} productos'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from store.resumen_pedido import rellenar_resumenes
+
+
+class Command(BaseCommand):
+    help = 'Rellena resumen_lineas en los pedidos creados antes de que existiera'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=500, help='Pedidos que se actualizan por consulta')
+
+    def handle(self, *args, **options):
+        total = rellenar_resumenes(options['lote'])
+        self.stdout.write(self.style.SUCCESS(f'✓ {total} pedidos resumidos'))
@@ -0,0 +1,39 @@
+from django.db import migrations
+
+TABLA_FTS = 'store_producto_fts'
+
+
+def crear_indice(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA_FTS} USING fts5(
+            nombre, descripcion, categoria, artista,
+            tokenize = 'unicode61 remove_diacritics 2'
+        )
+    """)
+    schema_editor.execute(f"""
+        INSERT INTO {TABLA_FTS} (rowid, nombre, descripcion, categoria, artista)
+        SELECT p.id, p.nombre, p.descripcion, COALESCE(c.nombre, ''), COALESCE(a.nombre, '')
+        FROM store_producto p
+        LEFT JOIN store_categoria c ON c.id = p.categoria_id
+        LEFT JOIN store_artista a ON a.id = p.artista_id
+        WHERE p.activo
+    """)
+
+
+def borrar_indice(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(f"DROP TABLE IF EXISTS {TABLA_FTS}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0005_alter_pedido_numero_pedido'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, borrar_indice),
+    ]
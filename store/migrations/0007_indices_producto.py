@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0006_indice_busqueda'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('activo', True)), fields=['tipo', '-fecha_creacion', '-id'], name='producto_tipo_activo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('activo', True)), fields=['artista', '-fecha_creacion', '-id'], name='producto_artista_activo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('activo', True), ('destacado', True)), fields=['-fecha_creacion', '-id'], name='producto_destacado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('stock__lt', 5)), fields=['-fecha_creacion'], name='producto_stock_bajo_idx'),
+        ),
+    ]
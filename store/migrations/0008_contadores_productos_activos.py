@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:23
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def calcular_contadores(apps, schema_editor):
+    Producto = apps.get_model('store', 'Producto')
+    for campo, nombre_modelo in [('artista_id', 'Artista'), ('categoria_id', 'Categoria')]:
+        Modelo = apps.get_model('store', nombre_modelo)
+        conteos = (
+            Producto.objects.filter(activo=True)
+            .exclude(**{campo: None})
+            .order_by()
+            .values_list(campo)
+            .annotate(total=Count('id'))
+        )
+        for pk, total in conteos:
+            Modelo.objects.filter(pk=pk).update(productos_activos=total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0007_indices_producto'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='artista',
+            name='productos_activos',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='categoria',
+            name='productos_activos',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(calcular_contadores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0008_contadores_productos_activos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='artista',
+            name='fecha_actualizacion',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
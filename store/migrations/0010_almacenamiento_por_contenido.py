@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:29
+
+import store.almacenamiento
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0009_artista_fecha_actualizacion'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='artista',
+            name='foto',
+            field=models.ImageField(blank=True, null=True, storage=store.almacenamiento.almacenamiento_por_contenido, upload_to='artistas/'),
+        ),
+        migrations.AlterField(
+            model_name='perfilusuario',
+            name='avatar',
+            field=models.ImageField(blank=True, null=True, storage=store.almacenamiento.almacenamiento_por_contenido, upload_to='avatars/'),
+        ),
+        migrations.AlterField(
+            model_name='producto',
+            name='imagen',
+            field=models.ImageField(blank=True, null=True, storage=store.almacenamiento.almacenamiento_por_contenido, upload_to='productos/'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:32
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import F, Sum
+
+
+def calcular_totales(apps, schema_editor):
+    ItemCarrito = apps.get_model('store', 'ItemCarrito')
+    Carrito = apps.get_model('store', 'Carrito')
+    totales = (
+        ItemCarrito.objects.order_by()
+        .values_list('carrito_id')
+        .annotate(unidades=Sum('cantidad'), importe=Sum(
+            F('cantidad') * F('producto__precio'),
+            output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        ))
+    )
+    for carrito_id, unidades, importe in totales:
+        Carrito.objects.filter(pk=carrito_id).update(cantidad_items=unidades, subtotal=importe or Decimal('0'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0010_almacenamiento_por_contenido'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='carrito',
+            name='cantidad_items',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='carrito',
+            name='subtotal',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.RunPython(calcular_totales, migrations.RunPython.noop),
+    ]
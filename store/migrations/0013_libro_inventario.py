@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:47
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def saldo_inicial(apps, schema_editor):
+    # Una fila 'saldo' por producto con su stock actual: desde aquí el libro cuadra
+    Producto = apps.get_model('store', 'Producto')
+    MovimientoInventario = apps.get_model('store', 'MovimientoInventario')
+    ahora = django.utils.timezone.now()
+    MovimientoInventario.objects.bulk_create([
+        MovimientoInventario(producto_id=pk, tipo='saldo', cantidad=stock, fecha=ahora)
+        for pk, stock in Producto.objects.values_list('pk', 'stock')
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0012_reservas_stock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovimientoInventario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('saldo', 'Saldo'), ('venta', 'Venta'), ('reposicion', 'Reposición'), ('ajuste', 'Ajuste'), ('cancelacion', 'Cancelación')], max_length=20)),
+                ('cantidad', models.IntegerField()),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('pedido', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movimientos', to='store.pedido')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movimientos', to='store.producto')),
+            ],
+            options={
+                'ordering': ['fecha', 'id'],
+                'indexes': [models.Index(fields=['fecha'], name='movimiento_fecha_idx'), models.Index(fields=['producto', 'fecha'], name='movimiento_producto_fecha_idx')],
+            },
+        ),
+        migrations.RunPython(saldo_inicial, migrations.RunPython.noop),
+    ]
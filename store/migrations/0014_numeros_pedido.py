@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:49
+
+import store.numeros_pedido
+from django.db import migrations, models
+
+
+def crear_secuencia(apps, schema_editor):
+    # Los números anteriores son hexadecimales: 'AS' + dígitos no puede repetirlos
+    SecuenciaPedido = apps.get_model('store', 'SecuenciaPedido')
+    SecuenciaPedido.objects.get_or_create(nombre='pedidos', defaults={'siguiente': 1})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0013_libro_inventario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SecuenciaPedido',
+            fields=[
+                ('nombre', models.CharField(max_length=30, primary_key=True, serialize=False)),
+                ('siguiente', models.BigIntegerField(default=1)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='pedido',
+            name='numero_pedido',
+            field=models.CharField(default=store.numeros_pedido.generar_numero_pedido, max_length=20, unique=True),
+        ),
+        migrations.RunPython(crear_secuencia, migrations.RunPython.noop),
+    ]
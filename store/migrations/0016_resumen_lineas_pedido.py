@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0015_cola_tareas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pedido',
+            name='resumen_lineas',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:55
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('store', '0016_resumen_lineas_pedido'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TotalesArchivoDia',
+            fields=[
+                ('fecha', models.DateField(primary_key=True, serialize=False)),
+                ('pedidos', models.PositiveIntegerField(default=0)),
+                ('entregados', models.PositiveIntegerField(default=0)),
+                ('cancelados', models.PositiveIntegerField(default=0)),
+                ('total_entregado', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'ordering': ['fecha'],
+            },
+        ),
+        migrations.CreateModel(
+            name='TotalesArchivoUsuario',
+            fields=[
+                ('usuario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='totales_archivo', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('pedidos', models.PositiveIntegerField(default=0)),
+                ('entregados', models.PositiveIntegerField(default=0)),
+                ('total_entregado', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PedidoArchivado',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('numero_pedido', models.CharField(max_length=20, unique=True)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('procesando', 'Procesando'), ('enviado', 'Enviado'), ('entregado', 'Entregado'), ('cancelado', 'Cancelado')], max_length=20)),
+                ('metodo_pago', models.CharField(choices=[('efectivo', 'Efectivo'), ('tarjeta_credito', 'Tarjeta de Crédito'), ('tarjeta_debito', 'Tarjeta de Débito'), ('paypal', 'PayPal')], max_length=20)),
+                ('subtotal', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('iva', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('total', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('direccion_envio', models.TextField()),
+                ('notas', models.TextField(blank=True)),
+                ('resumen_lineas', models.JSONField(blank=True, default=list)),
+                ('fecha_pedido', models.DateTimeField(db_index=True)),
+                ('fecha_actualizacion', models.DateTimeField()),
+                ('fecha_archivado', models.DateTimeField(default=django.utils.timezone.now)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pedidos_archivados', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Pedidos archivados',
+                'ordering': ['-fecha_pedido'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ItemPedidoArchivado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad', models.IntegerField()),
+                ('precio_unitario', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('subtotal', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('producto', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='store.producto')),
+                ('pedido', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='store.pedidoarchivado')),
+            ],
+        ),
+    ]
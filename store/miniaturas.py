@@ -0,0 +1,121 @@
+# miniaturas.py - Derivados de imagen (WebP y JPEG en varios anchos) para srcset
+import json
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from .cache_compartida import cache_compartida
+from .tareas import encolar, tarea
+from .versiones import incrementar_version
+
+ANCHOS = (160, 320, 640, 1024)
+FORMATOS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'jpeg': {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True},
+}
+CARPETA = 'miniaturas'
+TIEMPO_CACHE_MANIFIESTO = 60 * 60
+TIEMPO_CACHE_SIN_MANIFIESTO = 60
+
+
+def ruta_derivado(nombre, ancho, formato):
+    base, _ = os.path.splitext(nombre)
+    return f'{CARPETA}/{base}-{ancho}.{formato}'
+
+
+def ruta_manifiesto(nombre):
+    base, _ = os.path.splitext(nombre)
+    return f'{CARPETA}/{base}.json'
+
+
+def _clave_cache(nombre):
+    return f'miniaturas:{nombre}'
+
+
+def generar_derivados(nombre, forzar=False):
+    """
+    Crea los derivados de una imagen guardada en el storage y escribe un
+    manifiesto con los anchos disponibles. Devuelve la lista de anchos.
+    """
+    if not forzar and default_storage.exists(ruta_manifiesto(nombre)):
+        return leer_manifiesto(nombre) or []
+
+    with default_storage.open(nombre, 'rb') as archivo:
+        original = ImageOps.exif_transpose(Image.open(archivo))
+        original.load()
+
+    # Solo se reducen: un ancho mayor que el original no aporta nada
+    anchos = [ancho for ancho in ANCHOS if ancho < original.width] or [original.width]
+
+    for ancho in anchos:
+        alto = max(1, round(original.height * ancho / original.width))
+        reducida = original.resize((ancho, alto), Image.LANCZOS)
+        for formato, opciones in FORMATOS.items():
+            imagen = reducida
+            if formato == 'jpeg' and imagen.mode not in ('RGB', 'L'):
+                # JPEG no tiene transparencia: se compone sobre fondo blanco
+                fondo = Image.new('RGB', imagen.size, (255, 255, 255))
+                fondo.paste(imagen.convert('RGBA'), mask=imagen.convert('RGBA').split()[-1])
+                imagen = fondo
+            salida = BytesIO()
+            imagen.save(salida, **opciones)
+            destino = ruta_derivado(nombre, ancho, formato)
+            if default_storage.exists(destino):
+                default_storage.delete(destino)
+            default_storage.save(destino, ContentFile(salida.getvalue()))
+
+    manifiesto = ruta_manifiesto(nombre)
+    if default_storage.exists(manifiesto):
+        default_storage.delete(manifiesto)
+    default_storage.save(manifiesto, ContentFile(json.dumps({'anchos': anchos}).encode()))
+    # En la caché compartida: los procesos web dejan de ver "sin derivados" al momento
+    cache_compartida().delete(_clave_cache(nombre))
+    # Las tarjetas en caché y los ETag de detalle pasan a usar el srcset
+    incrementar_version('fragmentos:productos')
+    return anchos
+
+
+def leer_manifiesto(nombre):
+    """Anchos disponibles para una imagen, o None si aún no hay derivados"""
+    cache = cache_compartida()
+    clave = _clave_cache(nombre)
+    anchos = cache.get(clave)
+    if anchos is not None:
+        return anchos or None
+
+    try:
+        with default_storage.open(ruta_manifiesto(nombre), 'rb') as archivo:
+            anchos = json.loads(archivo.read())['anchos']
+        cache.set(clave, anchos, TIEMPO_CACHE_MANIFIESTO)
+    except (OSError, ValueError, KeyError):
+        # Se vuelve a revisar pronto: puede que el worker aún esté generándolos
+        anchos = None
+        cache.set(clave, [], TIEMPO_CACHE_SIN_MANIFIESTO)
+    return anchos
+
+
+def borrar_derivados(nombre):
+    """Elimina los derivados y el manifiesto de una imagen que ya no se usa"""
+    anchos = leer_manifiesto(nombre) or []
+    rutas = [ruta_derivado(nombre, ancho, formato) for ancho in anchos for formato in FORMATOS]
+    for ruta in rutas + [ruta_manifiesto(nombre)]:
+        if default_storage.exists(ruta):
+            default_storage.delete(ruta)
+    cache_compartida().delete(_clave_cache(nombre))
+
+
+@tarea('miniaturas.generar')
+def _generar_en_worker(imagen):
+    generar_derivados(imagen)
+
+
+def encolar_derivados(nombre):
+    """
+    Deja los derivados a `procesar_tareas`, fuera del proceso web. Con el
+    almacenamiento por contenido el nombre identifica los bytes, así que si ya
+    hay manifiesto (otra subida idéntica) no se regeneran.
+    """
+    return encolar('miniaturas.generar', imagen=nombre)
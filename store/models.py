@@ -1,18 +1,39 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator
-import uuid
+from django.utils import timezone
+
+from .almacenamiento import almacenamiento_por_contenido
+from .numeros_pedido import generar_numero_pedido
+
+def guardar_sin_contador(instancia, kwargs, contadores=('productos_activos',)):
+    """
+    Al actualizar no se escriben los contadores: se mantienen con F() y una
+    instancia cargada antes los sobrescribiría con un valor viejo.
+    """
+    if not instancia._state.adding and kwargs.get('update_fields') is None:
+        kwargs['update_fields'] = [
+            campo.name for campo in instancia._meta.concrete_fields
+            if not campo.primary_key and campo.name not in contadores
+        ]
 
 # Modelo existente para Categoria...
 class Categoria(models.Model):
     nombre = models.CharField(max_length=100)
     slug = models.SlugField(unique=True)
+    # Contador desnormalizado de productos activos; lo mantienen las señales de Producto
+    productos_activos = models.PositiveIntegerField(default=0, editable=False)
     
     class Meta:
         ordering = ['nombre']
     
     def __str__(self):
         return self.nombre
+    
+    def save(self, *args, **kwargs):
+        guardar_sin_contador(self, kwargs)
+        super().save(*args, **kwargs)
 
 # Modelo existente para Artista...
 class Artista(models.Model):
@@ -20,14 +41,21 @@ class Artista(models.Model):
     nombre = models.CharField(max_length=200)
     biografia = models.TextField()
     especialidad = models.CharField(max_length=100)
-    foto = models.ImageField(upload_to='artistas/', null=True, blank=True)
+    foto = models.ImageField(upload_to='artistas/', storage=almacenamiento_por_contenido, null=True, blank=True)
     activo = models.BooleanField(default=True)
+    # Contador desnormalizado de productos activos; lo mantienen las señales de Producto
+    productos_activos = models.PositiveIntegerField(default=0, editable=False)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['nombre']
     
     def __str__(self):
         return self.nombre
+    
+    def save(self, *args, **kwargs):
+        guardar_sin_contador(self, kwargs)
+        super().save(*args, **kwargs)
 
 # NUEVO MODELO PARA PERFIL DE USUARIO
 class PerfilUsuario(models.Model):
@@ -45,7 +73,7 @@ class PerfilUsuario(models.Model):
     pais = models.CharField(max_length=100, blank=True, null=True)
     codigo_postal = models.CharField(max_length=10, blank=True, null=True)
     fecha_nacimiento = models.DateField(blank=True, null=True)
-    avatar = models.ImageField(upload_to='avatars/', blank=True, null=True)
+    avatar = models.ImageField(upload_to='avatars/', storage=almacenamiento_por_contenido, blank=True, null=True)
     notificaciones_activas = models.BooleanField(default=True)
     newsletter = models.BooleanField(default=False)
     fecha_creacion = models.DateTimeField(auto_now_add=True)
@@ -87,10 +115,12 @@ class Producto(models.Model):
     descripcion = models.TextField()
     precio = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
     stock = models.IntegerField(default=0, validators=[MinValueValidator(0)])
+    # Unidades apartadas en carritos; lo mantiene reservas.py con F()
+    stock_reservado = models.PositiveIntegerField(default=0, editable=False)
     tipo = models.CharField(max_length=20, choices=TIPO_CHOICES)
     categoria = models.ForeignKey(Categoria, on_delete=models.SET_NULL, null=True, blank=True)
     artista = models.ForeignKey(Artista, on_delete=models.SET_NULL, null=True, blank=True)
-    imagen = models.ImageField(upload_to='productos/', null=True, blank=True)
+    imagen = models.ImageField(upload_to='productos/', storage=almacenamiento_por_contenido, null=True, blank=True)
     destacado = models.BooleanField(default=False)
     activo = models.BooleanField(default=True)
     fecha_creacion = models.DateTimeField(auto_now_add=True)
@@ -98,26 +128,74 @@ class Producto(models.Model):
     
     class Meta:
         ordering = ['-fecha_creacion']
+        # Índices para los filtros más usados; los parciales solo guardan las filas que cumplen la condición
+        indexes = [
+            models.Index(fields=['tipo', '-fecha_creacion', '-id'], condition=models.Q(activo=True), name='producto_tipo_activo_idx'),
+            models.Index(fields=['artista', '-fecha_creacion', '-id'], condition=models.Q(activo=True), name='producto_artista_activo_idx'),
+            models.Index(fields=['-fecha_creacion', '-id'], condition=models.Q(activo=True, destacado=True), name='producto_destacado_idx'),
+            models.Index(fields=['-fecha_creacion'], condition=models.Q(stock__lt=5), name='producto_stock_bajo_idx'),
+        ]
     
     def __str__(self):
         return f"{self.nombre} - ${self.precio}"
+    
+    @property
+    def stock_disponible(self):
+        return max(0, self.stock - self.stock_reservado)
+    
+    def save(self, *args, **kwargs):
+        # Stock al cargar la instancia (lo guarda una señal post_init)
+        anterior = None if self._state.adding else getattr(self, '_stock_original', None)
+        cambia_stock = anterior is not None and kwargs.get('update_fields') is None and self.stock != anterior
+        contadores = ('stock_reservado', 'stock') if cambia_stock else ('stock_reservado',)
+        guardar_sin_contador(self, kwargs, contadores=contadores)
+        if not cambia_stock:
+            super().save(*args, **kwargs)
+            return
+        with transaction.atomic():
+            self._sumar_stock(self.stock - anterior)
+            super().save(*args, **kwargs)
+    
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        # Lo recargado pasa a ser el punto de partida de la próxima edición
+        if 'stock' not in self.get_deferred_fields():
+            self._stock_original = self._stock_estadisticas = self.stock
+    
+    def _sumar_stock(self, diferencia):
+        """
+        Una edición del stock (p. ej. desde el panel) se aplica como diferencia
+        con F(): si un checkout descontó unidades desde que se cargó la
+        instancia, no se pisa su descuento y el libro anota justo `diferencia`.
+        """
+        actualizados = Producto.objects.filter(pk=self.pk, stock__gte=-diferencia).update(stock=F('stock') + diferencia)
+        if not actualizados:
+            raise ValueError(f'El stock de {self.nombre} quedaría negativo: se vendieron unidades mientras se editaba')
+        actual = Producto.objects.values_list('stock', flat=True).get(pk=self.pk)
+        self.stock = actual
+        # Las señales de post_save comparan con el stock justo anterior a este cambio
+        self._stock_estadisticas = actual - diferencia
+        self._diferencia_stock = diferencia
 
 # Modelo existente para Carrito...
 class Carrito(models.Model):
     usuario = models.OneToOneField(User, on_delete=models.CASCADE, related_name='carrito')
+    # Totales desnormalizados; los mantiene totales_carrito.py con F()
+    cantidad_items = models.PositiveIntegerField(default=0, editable=False)
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     fecha_actualizacion = models.DateTimeField(auto_now=True)
     
     @property
     def total(self):
-        return sum(item.subtotal for item in self.items.all())
-    
-    @property
-    def cantidad_items(self):
-        return sum(item.cantidad for item in self.items.all())
+        return self.subtotal
     
     def __str__(self):
         return f"Carrito de {self.usuario.username}"
+    
+    def save(self, *args, **kwargs):
+        guardar_sin_contador(self, kwargs, contadores=('cantidad_items', 'subtotal'))
+        super().save(*args, **kwargs)
 
 # Modelo existente para ItemCarrito...
 class ItemCarrito(models.Model):
@@ -136,6 +214,60 @@ class ItemCarrito(models.Model):
     def __str__(self):
         return f"{self.cantidad} x {self.producto.nombre}"
 
+class ReservaStock(models.Model):
+    """Unidades apartadas por un carrito hasta `expira` (ver reservas.py)"""
+    # 'u<id>' para usuarios, 'g<token>' para invitados
+    titular = models.CharField(max_length=40)
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='reservas')
+    cantidad = models.PositiveIntegerField()
+    # Indexado: el barrido de vencidas solo lee las filas que ya expiraron
+    expira = models.DateTimeField(db_index=True)
+    
+    class Meta:
+        unique_together = ['titular', 'producto']
+    
+    def __str__(self):
+        return f"{self.cantidad} x {self.producto_id} para {self.titular}"
+
+class MovimientoInventario(models.Model):
+    """
+    Libro de inventario: cada cambio de stock deja una fila y la suma de las
+    filas de un producto es su stock. compactar_inventario resume las antiguas
+    en una fila 'saldo' por producto.
+    """
+    TIPO_CHOICES = [
+        ('saldo', 'Saldo'),
+        ('venta', 'Venta'),
+        ('reposicion', 'Reposición'),
+        ('ajuste', 'Ajuste'),
+        ('cancelacion', 'Cancelación'),
+    ]
+    
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='movimientos')
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES)
+    # Con signo: las ventas restan, las reposiciones y cancelaciones suman
+    cantidad = models.IntegerField()
+    pedido = models.ForeignKey('Pedido', on_delete=models.SET_NULL, null=True, blank=True, related_name='movimientos')
+    fecha = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['fecha', 'id']
+        indexes = [
+            models.Index(fields=['fecha'], name='movimiento_fecha_idx'),
+            models.Index(fields=['producto', 'fecha'], name='movimiento_producto_fecha_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_tipo_display()} {self.cantidad:+d} de {self.producto_id}"
+
+class SecuenciaPedido(models.Model):
+    """Siguiente número libre; numeros_pedido.py reserva bloques de aquí"""
+    nombre = models.CharField(max_length=30, primary_key=True)
+    siguiente = models.BigIntegerField(default=1)
+    
+    def __str__(self):
+        return f"{self.nombre}: {self.siguiente}"
+
 # Modelo existente para Pedido...
 class Pedido(models.Model):
     ESTADO_CHOICES = [
@@ -154,7 +286,7 @@ class Pedido(models.Model):
     ]
     
     usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='pedidos')
-    numero_pedido = models.CharField(max_length=20, unique=True, default=uuid.uuid4().hex[:10].upper())
+    numero_pedido = models.CharField(max_length=20, unique=True, default=generar_numero_pedido)
     estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='pendiente')
     metodo_pago = models.CharField(max_length=20, choices=METODO_PAGO_CHOICES)
     subtotal = models.DecimalField(max_digits=10, decimal_places=2)
@@ -162,6 +294,9 @@ class Pedido(models.Model):
     total = models.DecimalField(max_digits=10, decimal_places=2)
     direccion_envio = models.TextField()
     notas = models.TextField(blank=True)
+    # Copia de las líneas al confirmar (nombre, cantidad, precios, imagen): el
+    # historial se pinta sin consultar ItemPedido ni Producto (ver resumen_pedido.py)
+    resumen_lineas = models.JSONField(default=list, blank=True, editable=False)
     fecha_pedido = models.DateTimeField(auto_now_add=True)
     fecha_actualizacion = models.DateTimeField(auto_now=True)
     
@@ -182,6 +317,74 @@ class ItemPedido(models.Model):
     def __str__(self):
         return f"{self.cantidad} x {self.producto.nombre}"
 
+# ========== ARCHIVO DE PEDIDOS ==========
+# Pedidos entregados o cancelados hace tiempo salen de Pedido/ItemPedido a
+# estas tablas (ver archivo.py); las consultas diarias solo leen las activas
+
+class PedidoArchivado(models.Model):
+    id = models.BigIntegerField(primary_key=True)  # el mismo id que tenía en Pedido
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='pedidos_archivados')
+    numero_pedido = models.CharField(max_length=20, unique=True)
+    estado = models.CharField(max_length=20, choices=Pedido.ESTADO_CHOICES)
+    metodo_pago = models.CharField(max_length=20, choices=Pedido.METODO_PAGO_CHOICES)
+    subtotal = models.DecimalField(max_digits=10, decimal_places=2)
+    iva = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    total = models.DecimalField(max_digits=10, decimal_places=2)
+    direccion_envio = models.TextField()
+    notas = models.TextField(blank=True)
+    resumen_lineas = models.JSONField(default=list, blank=True)
+    fecha_pedido = models.DateTimeField(db_index=True)
+    fecha_actualizacion = models.DateTimeField()
+    fecha_archivado = models.DateTimeField(default=timezone.now)
+
+    # Para las plantillas que muestran activos y archivados juntos
+    archivado = True
+
+    class Meta:
+        ordering = ['-fecha_pedido']
+        verbose_name_plural = 'Pedidos archivados'
+
+    def __str__(self):
+        return f"Pedido {self.numero_pedido} (archivado)"
+
+
+class ItemPedidoArchivado(models.Model):
+    pedido = models.ForeignKey(PedidoArchivado, on_delete=models.CASCADE, related_name='items')
+    # Borrar un producto no debe borrar la historia de ventas
+    producto = models.ForeignKey(Producto, on_delete=models.SET_NULL, null=True, related_name='+')
+    cantidad = models.IntegerField()
+    precio_unitario = models.DecimalField(max_digits=10, decimal_places=2)
+    subtotal = models.DecimalField(max_digits=10, decimal_places=2)
+
+    def __str__(self):
+        return f"{self.cantidad} x producto {self.producto_id}"
+
+
+class TotalesArchivoUsuario(models.Model):
+    """Totales de los pedidos archivados de cada usuario, para no recorrer el archivo"""
+    usuario = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='totales_archivo')
+    pedidos = models.PositiveIntegerField(default=0)
+    entregados = models.PositiveIntegerField(default=0)
+    total_entregado = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.usuario_id}: {self.pedidos} pedidos archivados"
+
+
+class TotalesArchivoDia(models.Model):
+    """Totales de los pedidos archivados por día del pedido"""
+    fecha = models.DateField(primary_key=True)
+    pedidos = models.PositiveIntegerField(default=0)
+    entregados = models.PositiveIntegerField(default=0)
+    cancelados = models.PositiveIntegerField(default=0)
+    total_entregado = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ['fecha']
+
+    def __str__(self):
+        return f"{self.fecha}: {self.pedidos} pedidos archivados"
+
 # Modelo existente para EncargoPersonalizado...
 class EncargoPersonalizado(models.Model):
     TIPO_OBRA_CHOICES = [
@@ -213,4 +416,37 @@ class EncargoPersonalizado(models.Model):
         ordering = ['-fecha_solicitud']
     
     def __str__(self):
-        return f"Encargo de {self.cliente.username} - {self.get_tipo_obra_display()}"
\ No newline at end of file
+        return f"Encargo de {self.cliente.username} - {self.get_tipo_obra_display()}"
+
+class Tarea(models.Model):
+    """Trabajo pendiente para el worker (ver tareas.py y `manage.py procesar_tareas`)"""
+    ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('en_curso', 'En curso'),
+        ('hecha', 'Hecha'),
+        ('fallida', 'Fallida'),
+    ]
+    
+    nombre = models.CharField(max_length=100)
+    datos = models.JSONField(default=dict)
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='pendiente')
+    intentos = models.PositiveIntegerField(default=0)
+    max_intentos = models.PositiveIntegerField(default=5)
+    # No se ejecuta antes de esta fecha (así se espacian los reintentos)
+    disponible_desde = models.DateTimeField(default=timezone.now)
+    # Quién la tomó y hasta cuándo; si el worker muere, otro la recupera al vencer
+    trabajador = models.CharField(max_length=100, blank=True)
+    bloqueada_hasta = models.DateTimeField(null=True, blank=True)
+    ultimo_error = models.TextField(blank=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_fin = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['disponible_desde', 'id']
+        indexes = [
+            models.Index(fields=['disponible_desde', 'id'], condition=models.Q(estado='pendiente'), name='tarea_pendiente_idx'),
+            models.Index(fields=['bloqueada_hasta'], condition=models.Q(estado='en_curso'), name='tarea_en_curso_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.nombre} ({self.get_estado_display()})"
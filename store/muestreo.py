@@ -0,0 +1,51 @@
+# muestreo.py - Selección aleatoria de filas sin ORDER BY RANDOM()
+import random
+
+from django.core.cache import cache
+
+from .versiones import obtener_version, incrementar_version
+
+# La lista de ids se invalida por versión; el tiempo es solo un límite de seguridad
+TIEMPO_CACHE_IDS = 60 * 60
+
+
+def _version_modelo(modelo):
+    return f'muestreo:{modelo._meta.label_lower}'
+
+
+def invalidar_muestras(modelo):
+    """Descarta las listas de ids en caché de un modelo (se llama desde señales)"""
+    incrementar_version(_version_modelo(modelo))
+
+
+def ids_elegibles(queryset, clave):
+    """Ids de las filas del queryset, guardados en caché bajo `clave`"""
+    version = obtener_version(_version_modelo(queryset.model))
+    clave_cache = f'muestreo:{clave}:{version}'
+    ids = cache.get(clave_cache)
+    if ids is None:
+        ids = list(queryset.order_by().values_list('pk', flat=True))
+        cache.set(clave_cache, ids, TIEMPO_CACHE_IDS)
+    return ids
+
+
+def muestra_aleatoria(queryset, k, clave, excluir=None, semilla=None):
+    """
+    Devuelve hasta `k` objetos al azar del queryset. El sorteo se hace en
+    Python sobre la lista de ids en caché (O(k)) y luego se traen solo los
+    elegidos por clave primaria. Con `semilla` la misma semilla da la misma
+    muestra, para páginas que se validan con ETag.
+    """
+    ids = ids_elegibles(queryset, clave)
+    azar = random.Random(semilla) if semilla is not None else random
+
+    # Se sortea uno de más por si sale el excluido, sin recorrer toda la lista
+    extra = 1 if excluir is not None else 0
+    elegidos = azar.sample(ids, min(k + extra, len(ids)))
+    elegidos = [pk for pk in elegidos if pk != excluir][:k]
+    if not elegidos:
+        return []
+
+    # in_bulk conserva los filtros, así que un id obsoleto simplemente se omite
+    objetos = queryset.in_bulk(elegidos)
+    return [objetos[pk] for pk in elegidos if pk in objetos]
@@ -0,0 +1,72 @@
+# notificaciones.py - Trabajos posteriores a un pedido; los ejecuta el worker
+from django.contrib.auth.models import User
+from django.core.mail import send_mail
+from django.template.loader import render_to_string
+
+from .models import Artista, ItemPedido, Pedido, Producto
+from .resumen_pedido import cargar_lineas
+from .tareas import encolar_varias, tarea
+
+UMBRAL_STOCK_BAJO = 5
+
+
+def encolar_posteriores(pedido, lineas, stock_bajo_ids=()):
+    """
+    Lo que implica un pedido confirmado, como tareas independientes (cada
+    una se reintenta por su cuenta). Se llama dentro de la transacción del
+    pedido. `stock_bajo_ids` son los productos que este pedido dejó por
+    debajo de UMBRAL_STOCK_BAJO: solo se avisa de ellos, una vez.
+    """
+    artista_ids = sorted({linea.producto.artista_id for linea in lineas if linea.producto.artista_id})
+    tareas = [('pedido.confirmacion', {'pedido_id': pedido.pk})]
+    if stock_bajo_ids:
+        tareas += [
+            ('inventario.stock_bajo', {'producto_ids': sorted(stock_bajo_ids)}),
+            # Cambia el contador de stock bajo del panel
+            ('estadisticas.recalcular', {}),
+        ]
+    tareas += [('artistas.venta', {'pedido_id': pedido.pk, 'artista_id': artista_id}) for artista_id in artista_ids]
+    encolar_varias(tareas)
+
+
+def _lineas(pedido, **filtros):
+    return ItemPedido.objects.filter(pedido=pedido, **filtros).select_related('producto')
+
+
+@tarea('pedido.confirmacion')
+def enviar_confirmacion(pedido_id):
+    pedido = Pedido.objects.select_related('usuario').filter(pk=pedido_id).first()
+    if pedido is None or not pedido.usuario.email:
+        return
+    cargar_lineas([pedido])
+    cuerpo = render_to_string('emails/confirmacion_pedido.txt', {'pedido': pedido, 'items': pedido.lineas})
+    send_mail(f'Pedido #{pedido.numero_pedido} recibido', cuerpo, None, [pedido.usuario.email])
+
+
+@tarea('inventario.stock_bajo')
+def avisar_stock_bajo(producto_ids):
+    productos = list(Producto.objects.filter(pk__in=producto_ids, stock__lt=UMBRAL_STOCK_BAJO).order_by('stock'))
+    destinatarios = list(
+        User.objects.filter(is_staff=True, is_active=True).exclude(email='').values_list('email', flat=True)
+    )
+    if not productos or not destinatarios:
+        return
+    cuerpo = render_to_string('emails/stock_bajo.txt', {'productos': productos, 'umbral': UMBRAL_STOCK_BAJO})
+    send_mail(f'Stock bajo: {len(productos)} productos', cuerpo, None, destinatarios)
+
+
+@tarea('artistas.venta')
+def avisar_venta_artista(pedido_id, artista_id):
+    artista = Artista.objects.select_related('usuario__perfil').filter(pk=artista_id).first()
+    pedido = Pedido.objects.filter(pk=pedido_id).first()
+    if artista is None or pedido is None or not artista.usuario.email:
+        return
+    perfil = getattr(artista.usuario, 'perfil', None)
+    if perfil is not None and not perfil.notificaciones_activas:
+        return
+    cuerpo = render_to_string('emails/venta_artista.txt', {
+        'artista': artista,
+        'pedido': pedido,
+        'items': _lineas(pedido, producto__artista_id=artista_id),
+    })
+    send_mail(f'Vendiste obra en el pedido #{pedido.numero_pedido}', cuerpo, None, [artista.usuario.email])
@@ -0,0 +1,132 @@
+# numeros_pedido.py - Números de pedido únicos entre procesos sin reintentos
+import os
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connections
+
+SECUENCIA = 'pedidos'
+PREFIJO = 'AS'
+
+
+class _Bloques:
+    """
+    Cada proceso reserva en la tabla de secuencias un bloque de números
+    consecutivos (un UPDATE) y los reparte desde memoria. Dos procesos nunca
+    reciben el mismo bloque, así que no hay colisiones ni reintentos; los
+    números que quedan sin usar al terminar el proceso solo dejan huecos.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reiniciar()
+
+    def _reiniciar(self):
+        self._siguiente = self._limite = 0
+        self._conexion = None
+
+    def _conexion_para_reservar(self):
+        """
+        (conexión, compartida). Con SQLite, dentro de una transacción de la
+        conexión principal, una conexión aparte no podría escribir hasta que
+        esa transacción termine: se reserva en la misma conexión.
+        """
+        principal = connections[DEFAULT_DB_ALIAS]
+        if principal.vendor == 'sqlite' and principal.in_atomic_block:
+            return principal, True
+        # Conexión propia en autocommit: el bloque queda confirmado aunque el
+        # pedido que lo pidió se deshaga, y nunca se entrega dos veces
+        if self._conexion is None:
+            self._conexion = connections.create_connection(DEFAULT_DB_ALIAS)
+            self._conexion.inc_thread_sharing()
+        return self._conexion, False
+
+    def _reservar(self, conexion, tamano):
+        """Avanza la secuencia `tamano` números y devuelve el límite del bloque"""
+        from .models import SecuenciaPedido
+        tabla = conexion.ops.quote_name(SecuenciaPedido._meta.db_table)
+        with conexion.cursor() as cursor:
+            cursor.execute(f'UPDATE {tabla} SET siguiente = siguiente + %s WHERE nombre = %s', [tamano, SECUENCIA])
+            cursor.execute(f'SELECT siguiente FROM {tabla} WHERE nombre = %s', [SECUENCIA])
+            fila = cursor.fetchone()
+        if fila is None:
+            raise RuntimeError(
+                f'No existe la secuencia de números de pedido "{SECUENCIA}" en {tabla} '
+                f'y no se pudo crear; revise la migración 0014_numeros_pedido'
+            )
+        return fila[0]
+
+    def _crear_secuencia(self, conexion):
+        """
+        La fila la crea la migración 0014, pero flush o el final de un
+        TransactionTestCase la borran: se vuelve a crear (si falta) a
+        continuación del mayor número 'AS…' ya usado. Se llama fuera de la
+        transacción del bloque, así que un INSERT que pierde la carrera con
+        otro proceso no deja la transacción inutilizable.
+        """
+        from .models import Pedido, PedidoArchivado, SecuenciaPedido
+        tabla = conexion.ops.quote_name(SecuenciaPedido._meta.db_table)
+        with conexion.cursor() as cursor:
+            cursor.execute(f'SELECT 1 FROM {tabla} WHERE nombre = %s', [SECUENCIA])
+            if cursor.fetchone() is not None:
+                return
+            ultimo = 0
+            for modelo in (Pedido, PedidoArchivado):
+                cursor.execute(
+                    f'SELECT numero_pedido FROM {conexion.ops.quote_name(modelo._meta.db_table)} '
+                    f"WHERE numero_pedido LIKE %s ORDER BY LENGTH(numero_pedido) DESC, numero_pedido DESC",
+                    [PREFIJO + '%'],
+                )
+                for (numero,) in cursor.fetchmany(20):
+                    if numero[len(PREFIJO):].isdigit():
+                        ultimo = max(ultimo, int(numero[len(PREFIJO):]))
+                        break
+            try:
+                cursor.execute(f'INSERT INTO {tabla} (nombre, siguiente) VALUES (%s, %s)', [SECUENCIA, ultimo + 1])
+            except IntegrityError:
+                pass  # otro proceso la creó entre el SELECT y el INSERT
+
+    def siguiente(self):
+        with self._lock:
+            if self._siguiente < self._limite:
+                numero = self._siguiente
+                self._siguiente += 1
+                return numero
+
+            conexion, compartida = self._conexion_para_reservar()
+            self._crear_secuencia(conexion)
+            if compartida:
+                # Un solo número dentro de la transacción del llamador: si se
+                # deshace, el número vuelve a la secuencia junto con su pedido
+                return self._reservar(conexion, 1) - 1
+
+            tamano = getattr(settings, 'NUMERO_PEDIDO_BLOQUE', 100)
+            conexion.set_autocommit(False)
+            try:
+                limite = self._reservar(conexion, tamano)
+                conexion.commit()
+            except Exception:
+                conexion.rollback()
+                raise
+            finally:
+                conexion.set_autocommit(True)
+            self._siguiente, self._limite = limite - tamano + 1, limite
+            return limite - tamano
+
+
+_bloques = _Bloques()
+# Un proceso hijo no puede seguir repartiendo el bloque del padre
+os.register_at_fork(after_in_child=_bloques._reiniciar)
+
+
+def formatear(numero):
+    return f'{PREFIJO}{numero:08d}'
+
+
+def generar_numero_pedido():
+    """
+    Default de Pedido.numero_pedido. Con SQLite conviene pedirlo antes de
+    abrir la transacción del pedido: dentro de ella no se reservan bloques,
+    solo un número cada vez en la propia transacción.
+    """
+    return formatear(_bloques.siguiente())
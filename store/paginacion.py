@@ -0,0 +1,92 @@
+# paginacion.py - Paginación por cursor (keyset) para el catálogo público
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+PRODUCTOS_POR_PAGINA = 24
+
+
+def codificar_cursor(direccion, fecha, pk):
+    """Convierte (dirección, fecha, id) en un cursor opaco para la URL"""
+    crudo = f"{direccion}|{fecha.isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(crudo.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Devuelve (dirección, fecha, id) o None si el cursor no es válido"""
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        crudo = base64.urlsafe_b64decode(cursor + relleno).decode()
+        direccion, fecha, pk = crudo.split('|')
+        if direccion not in ('sig', 'ant'):
+            return None
+        return direccion, datetime.fromisoformat(fecha), int(pk)
+    except (ValueError, TypeError, UnicodeDecodeError):
+        return None
+
+
+def _clave_orden(objeto):
+    """(fecha_creacion, id) de una instancia o de un dict de .values()"""
+    if isinstance(objeto, dict):
+        return objeto['fecha_creacion'], objeto['id']
+    return objeto.fecha_creacion, objeto.pk
+
+
+class PaginaCursor:
+    """Una página de resultados con los cursores para moverse a los lados"""
+
+    def __init__(self, objetos, hay_siguiente, hay_anterior):
+        self.objetos = objetos
+        self.hay_siguiente = hay_siguiente
+        self.hay_anterior = hay_anterior
+
+    @property
+    def cursor_siguiente(self):
+        if not (self.hay_siguiente and self.objetos):
+            return None
+        return codificar_cursor('sig', *_clave_orden(self.objetos[-1]))
+
+    @property
+    def cursor_anterior(self):
+        if not (self.hay_anterior and self.objetos):
+            return None
+        return codificar_cursor('ant', *_clave_orden(self.objetos[0]))
+
+    def __iter__(self):
+        return iter(self.objetos)
+
+    def __len__(self):
+        return len(self.objetos)
+
+
+def paginar_por_cursor(queryset, cursor=None, por_pagina=PRODUCTOS_POR_PAGINA):
+    """
+    Pagina un queryset ordenado por (-fecha_creacion, -id) sin COUNT ni OFFSET.
+    Se pide un registro extra para saber si hay más páginas en esa dirección.
+    Acepta también querysets de .values() que incluyan fecha_creacion e id.
+    """
+    datos = decodificar_cursor(cursor) if cursor else None
+
+    if datos is None:
+        filas = list(queryset.order_by('-fecha_creacion', '-id')[:por_pagina + 1])
+        return PaginaCursor(filas[:por_pagina], len(filas) > por_pagina, False)
+
+    direccion, fecha, pk = datos
+
+    if direccion == 'sig':
+        filas = list(
+            queryset.filter(Q(fecha_creacion__lt=fecha) | Q(fecha_creacion=fecha, id__lt=pk))
+            .order_by('-fecha_creacion', '-id')[:por_pagina + 1]
+        )
+        return PaginaCursor(filas[:por_pagina], len(filas) > por_pagina, True)
+
+    # Hacia atrás se recorre en orden ascendente y luego se invierte
+    filas = list(
+        queryset.filter(Q(fecha_creacion__gt=fecha) | Q(fecha_creacion=fecha, id__gt=pk))
+        .order_by('fecha_creacion', 'id')[:por_pagina + 1]
+    )
+    hay_anterior = len(filas) > por_pagina
+    filas = filas[:por_pagina]
+    filas.reverse()
+    return PaginaCursor(filas, True, hay_anterior)
@@ -0,0 +1,113 @@
+# pedidos.py - Paso del carrito a Pedido
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import inventario, notificaciones, reservas
+from .models import Pedido, ItemPedido, Producto
+from .numeros_pedido import generar_numero_pedido
+from .resumen_pedido import resumir
+
+
+class StockInsuficiente(Exception):
+    """Alguna línea pide más unidades de las que quedan; el pedido no se crea"""
+
+    def __init__(self, productos):
+        self.productos = productos
+        nombres = ', '.join(producto.nombre for producto in productos)
+        super().__init__(f'Stock insuficiente para: {nombres}')
+
+
+def _descontar_stock(unidades, propias, ahora):
+    """
+    Un UPDATE condicional por producto (stock = stock - n WHERE stock >= n más
+    lo reservado por otros). La comprobación y el descuento ocurren en la misma
+    sentencia, así que dos compras simultáneas nunca venden la misma unidad.
+    Las reservas propias se convierten en venta. Devuelve los ids que no
+    tenían stock suficiente.
+    """
+    fallidos = []
+    # En orden de id para que dos pedidos bloqueen las filas en el mismo orden
+    for producto_id in sorted(unidades):
+        cantidad, reservada = unidades[producto_id], propias.get(producto_id, 0)
+        actualizados = Producto.objects.filter(
+            pk=producto_id,
+            stock__gte=F('stock_reservado') - reservada + cantidad,
+        ).update(
+            stock=F('stock') - cantidad,
+            stock_reservado=F('stock_reservado') - reservada,
+            fecha_actualizacion=ahora,
+        )
+        if not actualizados:
+            fallidos.append(producto_id)
+    return fallidos
+
+
+def _cruzan_stock_bajo(unidades):
+    """Ids que estaban en UMBRAL_STOCK_BAJO o más y tras el descuento quedan por debajo"""
+    return [
+        producto_id
+        for producto_id, stock in Producto.objects.filter(
+            pk__in=unidades, stock__lt=notificaciones.UMBRAL_STOCK_BAJO
+        ).values_list('pk', 'stock')
+        if stock + unidades[producto_id] >= notificaciones.UMBRAL_STOCK_BAJO
+    ]
+
+
+def crear_pedido(usuario, resumen, metodo_pago, direccion, notas=''):
+    """
+    Materializa el carrito (cualquier backend) en un Pedido con sus
+    ItemPedido y su copia en resumen_lineas, descuenta el stock
+    (convirtiendo las reservas del carrito), lo anota en el libro de
+    inventario, encola los trabajos posteriores y vacía el carrito, todo en una transacción. Si una línea no tiene
+    stock se lanza StockInsuficiente y no queda nada escrito.
+    """
+    lineas = resumen.lineas
+    unidades = {}
+    for item in lineas:
+        unidades[item.producto_id] = unidades.get(item.producto_id, 0) + item.cantidad
+
+    # Antes de la transacción: si toca reservar otro bloque de números no
+    # debe esperar al bloqueo que toma el propio pedido
+    numero = generar_numero_pedido()
+
+    with transaction.atomic():
+        titular = resumen.almacen.titular()
+        propias = reservas.consumir(titular, list(unidades)) if titular else {}
+        fallidos = _descontar_stock(unidades, propias, timezone.now())
+        if fallidos:
+            # La excepción deshace también los descuentos y devuelve las reservas
+            raise StockInsuficiente([item.producto for item in lineas if item.producto_id in fallidos])
+
+        items = [
+            ItemPedido(
+                producto=item.producto,
+                cantidad=item.cantidad,
+                precio_unitario=item.producto.precio,
+                subtotal=item.subtotal,
+            )
+            for item in lineas
+        ]
+        pedido = Pedido.objects.create(
+            usuario=usuario,
+            numero_pedido=numero,
+            metodo_pago=metodo_pago,
+            subtotal=resumen.subtotal,
+            iva=resumen.iva,
+            total=resumen.total,
+            direccion_envio=direccion,
+            notas=notas,
+            resumen_lineas=resumir(items),
+        )
+        for item in items:
+            item.pedido = pedido
+        ItemPedido.objects.bulk_create(items)
+        inventario.registrar_venta(pedido, unidades)
+        # Correo, avisos de stock y a los artistas: los hace el worker
+        notificaciones.encolar_posteriores(pedido, lineas, _cruzan_stock_bajo(unidades))
+
+        resumen.almacen.vaciar()
+        transaction.on_commit(
+            lambda: inventario.stock_actualizado({pk: -cantidad for pk, cantidad in unidades.items()}, propias)
+        )
+    return pedido
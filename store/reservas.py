@@ -0,0 +1,190 @@
+# reservas.py - Reservas temporales de stock para las líneas del carrito
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .facetas import indice_facetas
+from .models import Producto, ReservaStock
+from .versiones import incrementar_version
+
+
+class SinDisponibilidad(Exception):
+    """No quedan unidades libres (sin reservar) para la cantidad pedida"""
+
+    def __init__(self, producto, disponibles):
+        self.producto = producto
+        self.disponibles = disponibles
+        super().__init__(f'Solo hay {disponibles} disponibles de {producto.nombre}')
+
+
+def duracion_reserva():
+    return timedelta(seconds=getattr(settings, 'RESERVA_STOCK_SEGUNDOS', 15 * 60))
+
+
+def _agrupar(filas):
+    """(pk, producto_id, cantidad) -> {producto_id: unidades}"""
+    por_producto = {}
+    for _, producto_id, cantidad in filas:
+        por_producto[producto_id] = por_producto.get(producto_id, 0) + cantidad
+    return por_producto
+
+
+def _refrescar_disponibilidad(cambios):
+    """
+    `cambios` es {producto_id: unidades sumadas a stock_reservado}. Si algún
+    producto se quedó sin unidades libres o volvió a tenerlas, al confirmar
+    se actualizan su faceta de disponibilidad y las tarjetas en caché.
+    """
+    cruzados = []
+    for producto in Producto.objects.filter(pk__in=cambios):
+        libres = producto.stock - producto.stock_reservado
+        if (libres > 0) != (libres + cambios[producto.pk] > 0):
+            cruzados.append(producto)
+    if not cruzados:
+        return
+
+    def refrescar():
+        for producto in cruzados:
+            indice_facetas.actualizar_producto(producto)
+        incrementar_version('fragmentos:productos')
+    transaction.on_commit(refrescar)
+
+
+def _ocupar(producto_id, unidades):
+    """stock_reservado += unidades solo si quedan unidades libres; en la misma sentencia"""
+    ocupado = bool(
+        Producto.objects.filter(pk=producto_id, stock__gte=F('stock_reservado') + unidades)
+        .update(stock_reservado=F('stock_reservado') + unidades)
+    )
+    if ocupado:
+        _refrescar_disponibilidad({producto_id: unidades})
+    return ocupado
+
+
+def _soltar(por_producto):
+    """Resta las unidades liberadas de varios productos con un solo UPDATE"""
+    if not por_producto:
+        return
+    unidades = Case(
+        *[When(pk=producto_id, then=Value(cantidad)) for producto_id, cantidad in por_producto.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+    Producto.objects.filter(pk__in=por_producto).update(stock_reservado=F('stock_reservado') - unidades)
+    _refrescar_disponibilidad({producto_id: -cantidad for producto_id, cantidad in por_producto.items()})
+
+
+def _borrar(reservas):
+    """Borra las reservas (ya bloqueadas) y devuelve las unidades a los productos"""
+    filas = list(reservas.values_list('pk', 'producto_id', 'cantidad'))
+    if filas:
+        ReservaStock.objects.filter(pk__in=[pk for pk, _, _ in filas]).delete()
+        _soltar(_agrupar(filas))
+    return filas
+
+
+def disponibles_para(titular, producto):
+    """Unidades que el titular puede tener: las libres más las que ya reservó"""
+    propias = ReservaStock.objects.filter(titular=titular, producto=producto).values_list('cantidad', flat=True).first()
+    libres = Producto.objects.filter(pk=producto.pk).values_list('stock', 'stock_reservado').first()
+    return max(0, libres[0] - libres[1]) + (propias or 0) if libres else 0
+
+
+def _fijar(titular, producto, cantidad):
+    reserva = ReservaStock.objects.select_for_update().filter(titular=titular, producto=producto).first()
+    diferencia = cantidad - (reserva.cantidad if reserva else 0)
+    if diferencia > 0 and not _ocupar(producto.pk, diferencia):
+        return False
+    if diferencia < 0:
+        _soltar({producto.pk: -diferencia})
+
+    expira = timezone.now() + duracion_reserva()
+    if reserva:
+        ReservaStock.objects.filter(pk=reserva.pk).update(cantidad=cantidad, expira=expira)
+    else:
+        ReservaStock.objects.create(titular=titular, producto=producto, cantidad=cantidad, expira=expira)
+    return True
+
+
+def fijar_reserva(titular, producto, cantidad):
+    """
+    Deja la reserva del titular sobre el producto en `cantidad` unidades y
+    renueva su vencimiento. Si no hay unidades libres se barren las reservas
+    vencidas y se intenta una vez más antes de lanzar SinDisponibilidad.
+    """
+    for intento in range(2):
+        with transaction.atomic():
+            if _fijar(titular, producto, cantidad):
+                return
+        if intento or not liberar_vencidas():
+            break
+    raise SinDisponibilidad(producto, disponibles_para(titular, producto))
+
+
+def liberar(titular, producto_ids=None):
+    """Suelta las reservas del titular (todas o solo las de esos productos)"""
+    with transaction.atomic():
+        reservas = ReservaStock.objects.select_for_update().filter(titular=titular)
+        if producto_ids is not None:
+            reservas = reservas.filter(producto_id__in=producto_ids)
+        return len(_borrar(reservas))
+
+
+def liberar_vencidas(ahora=None):
+    """
+    Barrido en bloque de las reservas vencidas: una lectura por el índice de
+    `expira`, un DELETE y un UPDATE para todos los productos afectados.
+    """
+    with transaction.atomic():
+        vencidas = ReservaStock.objects.select_for_update().filter(expira__lte=ahora or timezone.now())
+        return len(_borrar(vencidas))
+
+
+def transferir(origen, destino):
+    """Pasa las reservas del carrito de invitado al del usuario al iniciar sesión"""
+    expira = timezone.now() + duracion_reserva()
+    with transaction.atomic():
+        propias = dict(ReservaStock.objects.filter(titular=destino).values_list('producto_id', 'pk'))
+        for reserva in ReservaStock.objects.select_for_update().filter(titular=origen):
+            if reserva.producto_id in propias:
+                # Las unidades ya cuentan en stock_reservado: solo cambian de dueño
+                ReservaStock.objects.filter(pk=propias[reserva.producto_id]).update(
+                    cantidad=F('cantidad') + reserva.cantidad, expira=expira
+                )
+                reserva.delete()
+            else:
+                reserva.titular, reserva.expira = destino, expira
+                reserva.save(update_fields=['titular', 'expira'])
+
+
+def consumir(titular, producto_ids):
+    """
+    Borra las reservas del titular sobre esos productos sin devolver las
+    unidades a stock_reservado (lo hace el descuento del checkout) y
+    devuelve {producto_id: unidades}. Debe llamarse dentro de la transacción
+    del pedido para que un fallo las restaure.
+    """
+    reservas = ReservaStock.objects.select_for_update().filter(titular=titular, producto_id__in=producto_ids)
+    filas = list(reservas.values_list('pk', 'producto_id', 'cantidad'))
+    if filas:
+        ReservaStock.objects.filter(pk__in=[pk for pk, _, _ in filas]).delete()
+    return _agrupar(filas)
+
+
+def recalcular_reservado():
+    """Recalcula stock_reservado de todos los productos a partir de las reservas (un UPDATE)"""
+    suma = (
+        ReservaStock.objects.filter(producto=OuterRef('pk'))
+        .order_by()
+        .values('producto')
+        .annotate(total=Sum('cantidad'))
+        .values('total')
+    )
+    total = Producto.objects.update(stock_reservado=Coalesce(Subquery(suma), Value(0)))
+    indice_facetas.invalidar()
+    incrementar_version('fragmentos:productos')
+    return total
@@ -0,0 +1,72 @@
+# resumen_carrito.py - Carrito del usuario cargado una sola vez por petición
+from decimal import Decimal
+
+from django.utils.functional import cached_property
+
+from .carritos import obtener_carrito
+
+TASA_IVA = Decimal('0.16')
+
+
+class ResumenCarrito:
+    """
+    Líneas, cantidad y totales del carrito. Nada se consulta hasta que se usa;
+    después la barra de navegación, la vista y la plantilla comparten el mismo
+    resultado (una consulta con select_related('producto')). Si solo se piden
+    los totales se leen los que guarda el backend.
+    """
+
+    def __init__(self, request):
+        self.almacen = obtener_carrito(request)
+
+    @cached_property
+    def lineas(self):
+        return self.almacen.lineas()
+
+    @cached_property
+    def _totales(self):
+        # Con las líneas ya cargadas se suman; si no, se piden al backend
+        # (la barra de navegación no necesita las líneas)
+        if 'lineas' in self.__dict__:
+            return (
+                sum(item.cantidad for item in self.lineas),
+                sum((item.subtotal for item in self.lineas), Decimal('0')),
+            )
+        return self.almacen.cantidad_items(), None
+
+    @property
+    def cantidad_items(self):
+        return self._totales[0]
+
+    @property
+    def subtotal(self):
+        subtotal = self._totales[1]
+        if subtotal is None:
+            subtotal = self.almacen.subtotal()
+            self._totales = (self._totales[0], subtotal)
+        return subtotal
+
+    @property
+    def iva(self):
+        return self.subtotal * TASA_IVA
+
+    @property
+    def total(self):
+        return self.subtotal + self.iva
+
+    @property
+    def esta_vacio(self):
+        return not self.lineas
+
+
+def obtener_resumen(request):
+    """El mismo ResumenCarrito para toda la petición"""
+    resumen = getattr(request, '_resumen_carrito', None)
+    if resumen is None:
+        resumen = request._resumen_carrito = ResumenCarrito(request)
+    return resumen
+
+
+def descartar_resumen(request):
+    """Tras modificar el carrito dentro de la misma petición"""
+    request.__dict__.pop('_resumen_carrito', None)
@@ -0,0 +1,69 @@
+# resumen_pedido.py - Líneas de un pedido copiadas en el propio Pedido
+from decimal import Decimal
+
+from .models import ItemPedido, Pedido
+
+
+class LineaPedido:
+    """Línea del resumen con los nombres de ItemPedido que usan las plantillas"""
+
+    def __init__(self, datos):
+        self.producto_id = datos['producto_id']
+        self.nombre = datos['nombre']
+        self.cantidad = datos['cantidad']
+        self.precio_unitario = Decimal(datos['precio_unitario'])
+        self.subtotal = Decimal(datos['subtotal'])
+        # Nombre en el storage; el tag imagen_responsiva lo acepta tal cual
+        self.imagen = datos['imagen']
+
+
+def resumir(items):
+    """Resumen para Pedido.resumen_lineas a partir de ItemPedido (guardados o no) con su producto"""
+    return [
+        {
+            'producto_id': item.producto_id,
+            'nombre': item.producto.nombre,
+            'cantidad': item.cantidad,
+            'precio_unitario': str(item.precio_unitario),
+            'subtotal': str(item.subtotal),
+            'imagen': item.producto.imagen.name or '',
+        }
+        for item in items
+    ]
+
+
+def cargar_lineas(pedidos):
+    """
+    Pone `pedido.lineas` en cada pedido a partir de su resumen. Los pedidos
+    anteriores al resumen se completan con una sola consulta para todos.
+    """
+    # Los archivados siempre llevan resumen (archivo.py lo rellena al moverlos)
+    sin_resumen = [pedido for pedido in pedidos if not pedido.resumen_lineas and isinstance(pedido, Pedido)]
+    items = {}
+    if sin_resumen:
+        consulta = ItemPedido.objects.filter(pedido__in=sin_resumen).select_related('producto').order_by('id')
+        for item in consulta:
+            items.setdefault(item.pedido_id, []).append(item)
+
+    for pedido in pedidos:
+        datos = pedido.resumen_lineas or resumir(items.get(pedido.pk, []))
+        pedido.lineas = [LineaPedido(linea) for linea in datos]
+    return pedidos
+
+
+def rellenar_resumenes(lote=500):
+    """Copia las líneas de los pedidos que aún no tienen resumen, por lotes; devuelve cuántos"""
+    total = 0
+    ultimo_id = 0
+    while True:
+        pedidos = list(Pedido.objects.filter(resumen_lineas=[], pk__gt=ultimo_id).order_by('pk')[:lote])
+        if not pedidos:
+            return total
+        items = {}
+        for item in ItemPedido.objects.filter(pedido__in=pedidos).select_related('producto').order_by('id'):
+            items.setdefault(item.pedido_id, []).append(item)
+        for pedido in pedidos:
+            pedido.resumen_lineas = resumir(items.get(pedido.pk, []))
+        Pedido.objects.bulk_update(pedidos, ['resumen_lineas'])
+        total += len(pedidos)
+        ultimo_id = pedidos[-1].pk
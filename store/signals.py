@@ -1,9 +1,282 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_init, pre_save, post_save, pre_delete, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import Carrito
+from django.contrib.auth.signals import user_logged_in
+from .models import Carrito, ItemCarrito, Producto, Categoria, Artista, Pedido, EncargoPersonalizado
+from . import busqueda
+from . import carritos
+from . import contadores
+from . import estadisticas
+from . import inventario
+from . import miniaturas
+from . import totales_carrito
+from .facetas import indice_facetas
+from .muestreo import invalidar_muestras
+from .notificaciones import UMBRAL_STOCK_BAJO
+from .versiones import incrementar_version
 
 @receiver(post_save, sender=User)
 def crear_carrito_usuario(sender, instance, created, **kwargs):
     if created:
-        Carrito.objects.create(usuario=instance)
\ No newline at end of file
+        Carrito.objects.create(usuario=instance)
+
+@receiver(user_logged_in)
+def fusionar_carrito_invitado(sender, request, user, **kwargs):
+    # Lo que el invitado agregó antes de iniciar sesión pasa a su carrito
+    if request is not None and not (user.is_staff or user.is_superuser):
+        carritos.fusionar_carrito_invitado(request, user)
+
+# ========== ÍNDICE DE BÚSQUEDA ==========
+
+# Las escrituras al índice esperan a que se confirme la transacción
+
+@receiver(post_save, sender=Producto)
+def indexar_producto(sender, instance, raw=False, **kwargs):
+    if not raw:
+        busqueda.reindexar_al_confirmar([instance.pk])
+
+@receiver(post_delete, sender=Producto)
+def desindexar_producto(sender, instance, **kwargs):
+    busqueda.reindexar_al_confirmar([instance.pk])
+
+def _productos_de(instance):
+    campo = 'categoria' if isinstance(instance, Categoria) else 'artista'
+    return Producto.objects.filter(**{campo: instance}).values_list('pk', flat=True)
+
+@receiver(post_save, sender=Categoria)
+@receiver(post_save, sender=Artista)
+def reindexar_productos_relacionados(sender, instance, created, raw=False, **kwargs):
+    # Los productos guardan en el índice el nombre de su categoría y de su artista
+    if not created and not raw:
+        busqueda.reindexar_al_confirmar(_productos_de(instance))
+
+@receiver(pre_delete, sender=Categoria)
+@receiver(pre_delete, sender=Artista)
+def recordar_productos_indexados(sender, instance, **kwargs):
+    # Después del borrado ya tienen la relación en NULL (SET_NULL) y no se encuentran
+    instance._productos_indexados = list(_productos_de(instance))
+
+@receiver(post_delete, sender=Categoria)
+@receiver(post_delete, sender=Artista)
+def reindexar_productos_sin_relacion(sender, instance, **kwargs):
+    busqueda.reindexar_al_confirmar(getattr(instance, '_productos_indexados', []))
+
+# ========== ÍNDICE DE FACETAS ==========
+
+@receiver(post_save, sender=Producto)
+def actualizar_facetas_producto(sender, instance, raw=False, **kwargs):
+    if not raw:
+        indice_facetas.actualizar_producto(instance)
+
+@receiver(post_delete, sender=Producto)
+def quitar_facetas_producto(sender, instance, **kwargs):
+    indice_facetas.quitar_producto(instance.pk)
+
+@receiver(post_save, sender=Artista)
+@receiver(post_delete, sender=Artista)
+@receiver(post_save, sender=Categoria)
+@receiver(post_delete, sender=Categoria)
+def invalidar_facetas(sender, **kwargs):
+    # Cambian los nombres mostrados o se desvinculan productos (SET_NULL)
+    indice_facetas.invalidar()
+
+# ========== MUESTREO ALEATORIO ==========
+
+@receiver(post_save, sender=Artista)
+@receiver(post_delete, sender=Artista)
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+def invalidar_muestras_aleatorias(sender, **kwargs):
+    invalidar_muestras(sender)
+
+# ========== FRAGMENTOS EN CACHÉ DE LA PÁGINA DE INICIO ==========
+
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+@receiver(post_save, sender=Artista)
+@receiver(post_delete, sender=Artista)
+def invalidar_fragmento_productos(sender, **kwargs):
+    # Las tarjetas muestran el nombre del artista, por eso también depende de Artista
+    incrementar_version('fragmentos:productos')
+
+# ========== CONTADORES DE PRODUCTOS ACTIVOS ==========
+
+CAMPOS_CONTADORES = {'activo', 'artista_id', 'categoria_id'}
+
+@receiver(post_init, sender=Producto)
+def recordar_estado_producto(sender, instance, **kwargs):
+    # Se guarda el estado cargado para calcular la diferencia al guardar
+    if instance.pk and not CAMPOS_CONTADORES & instance.get_deferred_fields():
+        instance._estado_contadores = contadores.estado_producto(instance)
+
+@receiver(pre_save, sender=Producto)
+def completar_estado_producto(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding or hasattr(instance, '_estado_contadores'):
+        return
+    anterior = Producto.objects.filter(pk=instance.pk).values(*CAMPOS_CONTADORES).first()
+    instance._estado_contadores = anterior
+
+@receiver(post_save, sender=Producto)
+def actualizar_contadores(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    anterior = None if created else getattr(instance, '_estado_contadores', None)
+    actual = contadores.estado_producto(instance)
+    contadores.aplicar_cambio(anterior, actual)
+    instance._estado_contadores = actual
+
+@receiver(post_delete, sender=Producto)
+def descontar_producto_eliminado(sender, instance, **kwargs):
+    anterior = getattr(instance, '_estado_contadores', None) or contadores.estado_producto(instance)
+    contadores.aplicar_cambio(anterior, None)
+
+# ========== MINIATURAS ==========
+
+CAMPOS_IMAGEN = {Producto: 'imagen', Artista: 'foto'}
+
+@receiver(post_init, sender=Producto)
+@receiver(post_init, sender=Artista)
+def recordar_imagen(sender, instance, **kwargs):
+    campo = CAMPOS_IMAGEN[sender]
+    if instance.pk and campo not in instance.get_deferred_fields():
+        instance._imagen_original = getattr(instance, campo).name
+
+@receiver(post_save, sender=Producto)
+@receiver(post_save, sender=Artista)
+def generar_miniaturas(sender, instance, raw=False, **kwargs):
+    nombre = getattr(instance, CAMPOS_IMAGEN[sender]).name
+    if raw or not nombre or nombre == getattr(instance, '_imagen_original', None):
+        return
+    instance._imagen_original = nombre
+    # Fuera de la petición: la tarea se confirma con el guardado y la genera el worker
+    miniaturas.encolar_derivados(nombre)
+
+# ========== TOTALES DE LOS CARRITOS ==========
+
+@receiver(post_init, sender=Producto)
+def recordar_precio(sender, instance, **kwargs):
+    if instance.pk and 'precio' not in instance.get_deferred_fields():
+        instance._precio_original = instance.precio
+
+@receiver(post_save, sender=Producto)
+def recalcular_carritos_por_precio(sender, instance, created, raw=False, **kwargs):
+    if raw or created or instance.precio == getattr(instance, '_precio_original', None):
+        return
+    instance._precio_original = instance.precio
+    totales_carrito.recalcular_carritos_con_producto(instance.pk)
+
+@receiver(pre_delete, sender=Producto)
+def recordar_carritos_afectados(sender, instance, **kwargs):
+    # El borrado en cascada quita las líneas; se recalculan esos carritos después
+    instance._carritos_afectados = list(
+        ItemCarrito.objects.filter(producto_id=instance.pk).values_list('carrito_id', flat=True)
+    )
+
+@receiver(post_delete, sender=Producto)
+def recalcular_carritos_sin_producto(sender, instance, **kwargs):
+    carritos = getattr(instance, '_carritos_afectados', None)
+    if carritos:
+        totales_carrito.recalcular_totales(Carrito.objects.filter(pk__in=carritos))
+
+# ========== LIBRO DE INVENTARIO ==========
+
+@receiver(post_init, sender=Producto)
+def recordar_stock(sender, instance, **kwargs):
+    if instance.pk and 'stock' not in instance.get_deferred_fields():
+        instance._stock_original = instance.stock
+
+@receiver(post_save, sender=Producto)
+def anotar_cambio_stock(sender, instance, created, raw=False, **kwargs):
+    # Cambios hechos con save() (alta y edición desde el panel); el checkout
+    # y las cancelaciones usan update() y anotan sus propios movimientos
+    if raw:
+        return
+    if '_diferencia_stock' in instance.__dict__:
+        # Edición aplicada con F() en Producto.save: ya se sabe cuánto cambió
+        diferencia = instance.__dict__.pop('_diferencia_stock')
+    else:
+        anterior = 0 if created else getattr(instance, '_stock_original', None)
+        diferencia = 0 if anterior is None else instance.stock - anterior
+    if diferencia:
+        inventario.registrar(instance.pk, 'reposicion' if diferencia > 0 else 'ajuste', diferencia)
+    instance._stock_original = instance.stock
+
+@receiver(post_init, sender=Pedido)
+def recordar_estado_pedido(sender, instance, **kwargs):
+    if instance.pk and 'estado' not in instance.get_deferred_fields():
+        instance._estado_original = instance.estado
+
+@receiver(post_save, sender=Pedido)
+def mover_inventario_por_estado(sender, instance, created, raw=False, **kwargs):
+    anterior = getattr(instance, '_estado_original', None)
+    instance._estado_original = instance.estado
+    if raw or created or anterior is None or anterior == instance.estado:
+        return
+    if instance.estado == 'cancelado':
+        inventario.cancelar_pedido(instance)
+    elif anterior == 'cancelado':
+        inventario.reactivar_pedido(instance)
+
+# ========== ESTADÍSTICAS DEL PANEL ==========
+# Ajustan los contadores en caché entre recálculos (ver estadisticas.py)
+
+CONTADORES_POR_ESTADO = {
+    Pedido: ('total_pedidos', 'pedidos_pendientes'),
+    EncargoPersonalizado: ('total_encargos', 'encargos_pendientes'),
+}
+
+@receiver(post_init, sender=Pedido)
+@receiver(post_init, sender=EncargoPersonalizado)
+def recordar_estado_estadisticas(sender, instance, **kwargs):
+    if instance.pk and 'estado' not in instance.get_deferred_fields():
+        instance._estado_estadisticas = instance.estado
+
+@receiver(post_save, sender=Pedido)
+@receiver(post_save, sender=EncargoPersonalizado)
+def contar_por_estado(sender, instance, created, raw=False, **kwargs):
+    anterior = getattr(instance, '_estado_estadisticas', None)
+    instance._estado_estadisticas = instance.estado
+    if raw or (not created and anterior is None):
+        return
+    total, pendientes = CONTADORES_POR_ESTADO[sender]
+    estadisticas.ajustar(**{
+        total: int(created),
+        pendientes: (instance.estado == 'pendiente') - (not created and anterior == 'pendiente'),
+    })
+
+@receiver(post_delete, sender=Pedido)
+@receiver(post_delete, sender=EncargoPersonalizado)
+def descontar_por_estado(sender, instance, **kwargs):
+    total, pendientes = CONTADORES_POR_ESTADO[sender]
+    estadisticas.ajustar(**{total: -1, pendientes: -(instance.estado == 'pendiente')})
+
+@receiver(post_init, sender=Producto)
+def recordar_stock_estadisticas(sender, instance, **kwargs):
+    if instance.pk and 'stock' not in instance.get_deferred_fields():
+        instance._stock_estadisticas = instance.stock
+
+@receiver(post_save, sender=Producto)
+def contar_producto(sender, instance, created, raw=False, **kwargs):
+    # El checkout y las cancelaciones cambian el stock con update(): los
+    # ajusta inventario.stock_actualizado
+    anterior = getattr(instance, '_stock_estadisticas', None)
+    instance._stock_estadisticas = instance.stock
+    if raw or (not created and anterior is None):
+        return
+    estadisticas.ajustar(
+        total_productos=int(created),
+        stock_bajo=(instance.stock < UMBRAL_STOCK_BAJO) - (not created and anterior < UMBRAL_STOCK_BAJO),
+    )
+
+@receiver(post_delete, sender=Producto)
+def descontar_producto(sender, instance, **kwargs):
+    estadisticas.ajustar(total_productos=-1, stock_bajo=-(instance.stock < UMBRAL_STOCK_BAJO))
+
+@receiver(post_save, sender=User)
+def contar_usuario(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        estadisticas.ajustar(total_usuarios=1)
+
+@receiver(post_delete, sender=User)
+def descontar_usuario(sender, instance, **kwargs):
+    estadisticas.ajustar(total_usuarios=-1)
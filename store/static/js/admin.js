@@ -427,40 +427,69 @@ function showNoResultsMessage(searchTerm, visibleCount) {
     }
 }
 
-// Cargar estadísticas
+// Estadísticas del dashboard: el servidor envía por Server-Sent Events solo
+// los contadores que cambian. Sin ASGI (respuesta 204) se consultan cada 60 s
 function loadStats() {
-    // En una implementación real, aquí harías una petición AJAX
-    // Por ahora simulamos datos
-    const stats = {
-        totalSales: 12500,
-        newOrders: 15,
-        pendingTasks: 8,
-        conversionRate: '4.2%'
+    const grid = document.querySelector('.stats-grid[data-stream]');
+    if (!grid) return;
+    
+    const applyStats = stats => {
+        Object.keys(stats).forEach(key => {
+            const element = grid.querySelector(`[data-stat="${key}"]`);
+            if (element) {
+                animateCounter(element, stats[key]);
+            }
+        });
+    };
+    
+    let pollTimer = null;
+    const startPolling = () => {
+        if (pollTimer) return;
+        pollTimer = setInterval(() => {
+            fetch(grid.dataset.url)
+                .then(response => response.json())
+                .then(applyStats)
+                .catch(() => {});
+        }, 60000);
     };
     
-    // Actualizar elementos en el DOM
-    Object.keys(stats).forEach(key => {
-        const element = document.querySelector(`.stat-${key}`);
-        if (element) {
-            animateCounter(element, stats[key]);
+    if (!window.EventSource) {
+        startPolling();
+        return;
+    }
+    
+    const source = new EventSource(grid.dataset.stream);
+    source.addEventListener('estadisticas', event => applyStats(JSON.parse(event.data)));
+    source.onerror = () => {
+        // Mientras esté CONNECTING el navegador reintenta solo
+        if (source.readyState === EventSource.CLOSED) {
+            startPolling();
         }
-    });
+    };
 }
 
-// Animación de contadores
-function animateCounter(element, targetValue) {
-    const currentValue = parseInt(element.textContent) || 0;
-    const increment = targetValue > currentValue ? 1 : -1;
-    let current = currentValue;
-    
-    const timer = setInterval(() => {
-        current += increment;
-        element.textContent = current;
-        
-        if (current === targetValue) {
-            clearInterval(timer);
-        }
-    }, 50);
+// Animación de contadores: misma duración sea cual sea la diferencia
+function animateCounter(element, targetValue, duration = 600) {
+    const startValue = parseInt(element.textContent, 10) || 0;
+    const target = parseInt(targetValue, 10);
+    
+    if (element._counterFrame) {
+        cancelAnimationFrame(element._counterFrame);
+        element._counterFrame = null;
+    }
+    if (isNaN(target) || target === startValue) {
+        element.textContent = targetValue;
+        return;
+    }
+    
+    const startTime = performance.now();
+    const step = now => {
+        const progress = Math.min((now - startTime) / duration, 1);
+        const eased = 1 - Math.pow(1 - progress, 3);
+        element.textContent = Math.round(startValue + (target - startValue) * eased);
+        element._counterFrame = progress < 1 ? requestAnimationFrame(step) : null;
+    };
+    element._counterFrame = requestAnimationFrame(step);
 }
 
 // Función debounce para búsqueda
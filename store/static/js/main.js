@@ -66,4 +66,80 @@ document.addEventListener('DOMContentLoaded', function() {
             }
         });
     });
-});
\ No newline at end of file
+});
+// ========== Carrito por AJAX ==========
+
+// Actualiza los contadores del carrito en la barra de navegación
+function actualizarContadorCarrito(cantidad) {
+    const enlace = document.querySelector('.carrito-icon a');
+    if (enlace) {
+        let contador = enlace.querySelector('.carrito-count');
+        if (!contador && cantidad > 0) {
+            contador = document.createElement('span');
+            contador.className = 'carrito-count';
+            enlace.appendChild(contador);
+        }
+        if (contador) {
+            contador.textContent = cantidad;
+            contador.style.display = cantidad > 0 ? '' : 'none';
+        }
+    }
+    document.querySelectorAll('.dropdown-carrito-count').forEach(contador => {
+        contador.textContent = cantidad;
+    });
+}
+
+// Muestra un aviso con el mismo estilo que los mensajes de Django
+function mostrarAvisoCarrito(texto, tipo) {
+    let contenedor = document.querySelector('.messages-container');
+    if (!contenedor) {
+        contenedor = document.createElement('div');
+        contenedor.className = 'messages-container';
+        document.querySelector('.contenido').before(contenedor);
+    }
+    const aviso = document.createElement('div');
+    aviso.className = `message ${tipo}`;
+    aviso.textContent = texto;
+    contenedor.appendChild(aviso);
+    setTimeout(() => aviso.remove(), 4000);
+}
+
+// POST a la API del carrito; el token CSRF va en los datos del formulario
+async function enviarCarrito(url, datos) {
+    const respuesta = await fetch(url, {
+        method: 'POST',
+        body: datos,
+        headers: {'X-Requested-With': 'XMLHttpRequest'},
+        credentials: 'same-origin',
+    });
+    const json = await respuesta.json();
+    if (json.carrito) {
+        actualizarContadorCarrito(json.carrito.cantidad_items);
+    }
+    if (!respuesta.ok) {
+        throw new Error(json.error || 'No se pudo actualizar el carrito.');
+    }
+    return json;
+}
+
+// Formularios de "Añadir al carrito": sin recargar la página
+document.addEventListener('submit', async function(e) {
+    const form = e.target.closest('form[data-carrito-api]');
+    if (!form) return;
+    e.preventDefault();
+    
+    const button = form.querySelector('button[type="submit"]');
+    const originalHTML = button.innerHTML;
+    button.innerHTML = '<i class="fas fa-spinner fa-spin"></i>';
+    button.disabled = true;
+    
+    try {
+        const json = await enviarCarrito(form.dataset.carritoApi, new FormData(form));
+        mostrarAvisoCarrito(json.mensaje, 'success');
+    } catch (error) {
+        mostrarAvisoCarrito(error.message, 'error');
+    } finally {
+        button.innerHTML = originalHTML;
+        button.disabled = false;
+    }
+});
@@ -0,0 +1,106 @@
+# tareas.py - Cola de trabajos en la base de datos, sin broker
+import logging
+import os
+import socket
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Tarea
+
+logger = logging.getLogger(__name__)
+
+DURACION_BLOQUEO = timedelta(minutes=5)
+ESPERA_REINTENTO = 30  # segundos; se duplica con cada intento fallido
+
+_registro = {}
+
+
+def tarea(nombre):
+    """Registra la función que ejecuta las tareas con ese nombre"""
+    def decorador(funcion):
+        _registro[nombre] = funcion
+        return funcion
+    return decorador
+
+
+def encolar(nombre, **datos):
+    """
+    Inserta la tarea en la transacción en curso: si el pedido se deshace la
+    tarea desaparece con él, y el worker no la ve hasta el commit.
+    """
+    return Tarea.objects.create(nombre=nombre, datos=datos)
+
+
+def encolar_varias(tareas):
+    """[(nombre, datos)] en un solo INSERT"""
+    return Tarea.objects.bulk_create([Tarea(nombre=nombre, datos=datos) for nombre, datos in tareas])
+
+
+def nombre_trabajador():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def _disponibles(ahora):
+    # Pendientes que ya tocan, o en curso con el bloqueo vencido (su worker murió)
+    return Q(estado='pendiente', disponible_desde__lte=ahora) | Q(estado='en_curso', bloqueada_hasta__lt=ahora)
+
+
+def reclamar(trabajador, limite=10):
+    """
+    Toma hasta `limite` tareas. El UPDATE repite la condición, así que si dos
+    workers eligen la misma fila solo uno la consigue; no hace falta
+    SELECT ... FOR UPDATE SKIP LOCKED (que SQLite no tiene).
+    """
+    ahora = timezone.now()
+    candidatas = list(Tarea.objects.filter(_disponibles(ahora)).values_list('pk', flat=True)[:limite])
+    if not candidatas:
+        return []
+    # Marca única de esta toma: si el bloqueo vence y otro worker la retoma,
+    # el resultado de este ya no sobrescribe nada
+    marca = f'{trabajador}/{uuid.uuid4().hex[:8]}'
+    Tarea.objects.filter(_disponibles(ahora), pk__in=candidatas).update(
+        estado='en_curso',
+        trabajador=marca,
+        bloqueada_hasta=ahora + DURACION_BLOQUEO,
+        intentos=F('intentos') + 1,
+    )
+    return list(Tarea.objects.filter(trabajador=marca, estado='en_curso'))
+
+
+def ejecutar(trabajo):
+    """Ejecuta una tarea reclamada y guarda el resultado; devuelve True si terminó bien"""
+    funcion = _registro.get(trabajo.nombre)
+    try:
+        if funcion is None:
+            raise LookupError(f'No hay ninguna función registrada para "{trabajo.nombre}"')
+        with transaction.atomic():
+            funcion(**trabajo.datos)
+    except Exception:
+        error = traceback.format_exc()
+        logger.warning('La tarea %s (%s) falló en el intento %s', trabajo.pk, trabajo.nombre, trabajo.intentos)
+        if trabajo.intentos >= trabajo.max_intentos:
+            cambios = {'estado': 'fallida', 'fecha_fin': timezone.now()}
+        else:
+            espera = timedelta(seconds=ESPERA_REINTENTO * 2 ** (trabajo.intentos - 1))
+            cambios = {'estado': 'pendiente', 'disponible_desde': timezone.now() + espera}
+        Tarea.objects.filter(pk=trabajo.pk, trabajador=trabajo.trabajador).update(
+            ultimo_error=error, bloqueada_hasta=None, **cambios
+        )
+        return False
+
+    Tarea.objects.filter(pk=trabajo.pk, trabajador=trabajo.trabajador).update(
+        estado='hecha', bloqueada_hasta=None, fecha_fin=timezone.now()
+    )
+    return True
+
+
+def purgar_terminadas(dias=7):
+    """Borra las tareas hechas hace más de `dias` días (las fallidas se conservan)"""
+    limite = timezone.now() - timedelta(days=dias)
+    borradas, _ = Tarea.objects.filter(estado='hecha', fecha_fin__lt=limite).delete()
+    return borradas
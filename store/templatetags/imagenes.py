@@ -0,0 +1,47 @@
+# store/templatetags/imagenes.py
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html
+
+from store.miniaturas import leer_manifiesto, ruta_derivado
+
+register = template.Library()
+
+
+def _srcset(nombre, anchos, formato):
+    return ', '.join(
+        f'{default_storage.url(ruta_derivado(nombre, ancho, formato))} {ancho}w' for ancho in anchos
+    )
+
+
+@register.simple_tag
+def imagen_responsiva(campo, alt='', sizes='100vw', clase='', ancho=None, lazy=True):
+    """
+    <picture> con srcset en WebP y JPEG; sin derivados usa la imagen original.
+    `campo` puede ser un ImageField o solo el nombre en el storage (resumen de pedidos).
+    """
+    if not campo:
+        return ''
+
+    nombre = campo if isinstance(campo, str) else campo.name
+    anchos = leer_manifiesto(nombre)
+    extras = format_html(
+        '{}{}{}',
+        format_html(' class="{}"', clase) if clase else '',
+        format_html(' width="{}"', ancho) if ancho else '',
+        format_html(' loading="lazy"') if lazy else '',
+    )
+
+    if not anchos:
+        return format_html('<img src="{}" alt="{}"{}>', default_storage.url(nombre), alt, extras)
+
+    return format_html(
+        '<picture>'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" alt="{}"{}>'
+        '</picture>',
+        _srcset(nombre, anchos, 'webp'), sizes,
+        default_storage.url(ruta_derivado(nombre, anchos[-1], 'jpeg')),
+        _srcset(nombre, anchos, 'jpeg'), sizes,
+        alt, extras,
+    )
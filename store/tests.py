@@ -1,3 +1,1040 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+import unittest
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import AnonymousUser, User
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management import call_command
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured, SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models import Q
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import busqueda, carritos, estadisticas, inventario, miniaturas, numeros_pedido, reservas, tareas, tiempo_real
+from .almacenamiento import almacenamiento_por_contenido, es_inmutable
+from .facetas import IndiceFacetas, indice_facetas
+from .forms import ProductoForm
+from .models import Artista, Carrito, Categoria, ItemCarrito, ItemPedido, MovimientoInventario, Pedido, Producto, ReservaStock, SecuenciaPedido, Tarea
+from .paginacion import codificar_cursor, paginar_por_cursor
+from .pedidos import StockInsuficiente, crear_pedido
+from .resumen_carrito import obtener_resumen
+from .resumen_pedido import cargar_lineas, resumir
+from .versiones import obtener_version
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN es específico de SQLite')
+class PlanConsultasProductoTests(TestCase):
+    """Las consultas frecuentes sobre Producto no deben recorrer la tabla completa"""
+
+    def consultas(self):
+        ahora = timezone.now()
+        activos_oleo = Producto.objects.filter(tipo='oleo', activo=True)
+        return {
+            'productos_por_categoria': activos_oleo.order_by('-fecha_creacion', '-id')[:25],
+            'productos_por_categoria_cursor': activos_oleo.filter(
+                Q(fecha_creacion__lt=ahora) | Q(fecha_creacion=ahora, id__lt=100)
+            ).order_by('-fecha_creacion', '-id')[:25],
+            'index_destacados': Producto.objects.filter(destacado=True, activo=True)[:6],
+            'detalle_artista': Producto.objects.filter(artista_id=1, activo=True)[:6],
+            'panel_stock_bajo': Producto.objects.filter(stock__lt=5)[:5],
+        }
+
+    def test_sin_recorridos_completos(self):
+        # Recorrer un índice parcial es válido: solo contiene las filas que cumplen el filtro
+        parciales = {indice.name for indice in Producto._meta.indexes if indice.condition is not None}
+        tabla = Producto._meta.db_table
+
+        for nombre, queryset in self.consultas().items():
+            plan = queryset.explain()
+            with self.subTest(consulta=nombre):
+                self.assertNotIn('USE TEMP B-TREE', plan, plan)
+                for linea in plan.splitlines():
+                    coincidencia = re.search(rf'\bSCAN {tabla}\b(?: USING (?:COVERING )?INDEX (\w+))?', linea)
+                    if coincidencia:
+                        self.assertIn(coincidencia.group(1), parciales, plan)
+
+
+class NumerosPedidoTests(TestCase):
+    """Los números se reservan también dentro de una transacción (TestCase, atomic)"""
+
+    def setUp(self):
+        # Sin bloque en memoria: cada prueba obliga a reservar
+        numeros_pedido._bloques._reiniciar()
+        self.usuario = User.objects.create_user('comprador')
+
+    def crear_pedido(self, **extra):
+        return Pedido.objects.create(
+            usuario=self.usuario, metodo_pago='efectivo', subtotal=0, total=0, direccion_envio='Calle 1', **extra
+        )
+
+    def test_pedidos_dentro_de_transaccion(self):
+        primero, segundo = self.crear_pedido(), self.crear_pedido()
+        self.assertRegex(primero.numero_pedido, r'^AS\d{8}$')
+        self.assertNotEqual(primero.numero_pedido, segundo.numero_pedido)
+
+    def test_secuencia_borrada_se_recrea_tras_el_mayor_numero(self):
+        SecuenciaPedido.objects.all().delete()
+        self.crear_pedido(numero_pedido=numeros_pedido.formatear(41))
+        self.assertEqual(numeros_pedido.generar_numero_pedido(), numeros_pedido.formatear(42))
+        self.assertEqual(SecuenciaPedido.objects.get().siguiente, 43)
+
+
+class CrearPedidoTests(TestCase):
+    """Checkout: descuento de stock, reservas, libro de inventario, tareas y resumen en una transacción"""
+
+    def setUp(self):
+        numeros_pedido._bloques._reiniciar()
+        self.usuario = User.objects.create_user('comprador')
+        self.lienzo = Producto.objects.create(
+            nombre='Lienzo 30x40', descripcion='', precio=Decimal('150.00'), stock=6, tipo='lienzo'
+        )
+        self.oleo = Producto.objects.create(
+            nombre='Óleo azul', descripcion='', precio=Decimal('80.00'), stock=3, tipo='oleo'
+        )
+
+    def resumen(self, *lineas):
+        """Resumen del carrito del usuario tras agregar [(producto, cantidad)] (reserva las unidades)"""
+        request = RequestFactory().post('/checkout/')
+        request.user = self.usuario
+        resumen = obtener_resumen(request)
+        for producto, cantidad in lineas:
+            resumen.almacen.agregar(producto, cantidad)
+        return resumen
+
+    def test_pedido_descuenta_stock_y_registra_todo(self):
+        resumen = self.resumen((self.lienzo, 2), (self.oleo, 1))
+        pedido = crear_pedido(self.usuario, resumen, 'efectivo', 'Calle 1')
+
+        self.lienzo.refresh_from_db()
+        self.oleo.refresh_from_db()
+        self.assertEqual((self.lienzo.stock, self.lienzo.stock_reservado), (4, 0))
+        self.assertEqual((self.oleo.stock, self.oleo.stock_reservado), (2, 0))
+        self.assertFalse(ReservaStock.objects.exists())
+
+        self.assertEqual(pedido.total, Decimal('380.00') * Decimal('1.16'))
+        self.assertEqual(
+            set(ItemPedido.objects.filter(pedido=pedido).values_list('producto_id', 'cantidad', 'subtotal')),
+            {(self.lienzo.pk, 2, Decimal('300.00')), (self.oleo.pk, 1, Decimal('80.00'))},
+        )
+        self.assertEqual(
+            set(MovimientoInventario.objects.filter(pedido=pedido, tipo='venta').values_list('producto_id', 'cantidad')),
+            {(self.lienzo.pk, -2), (self.oleo.pk, -1)},
+        )
+        pedido.refresh_from_db()
+        self.assertEqual(
+            sorted((linea['nombre'], linea['cantidad']) for linea in pedido.resumen_lineas),
+            [('Lienzo 30x40', 2), ('Óleo azul', 1)],
+        )
+        self.assertIn(
+            {'pedido_id': pedido.pk}, Tarea.objects.filter(nombre='pedido.confirmacion').values_list('datos', flat=True)
+        )
+        # Solo el lienzo cruza el umbral (6 -> 4); el óleo ya estaba por debajo
+        self.assertEqual(
+            list(Tarea.objects.filter(nombre='inventario.stock_bajo').values_list('datos', flat=True)),
+            [{'producto_ids': [self.lienzo.pk]}],
+        )
+        self.assertTrue(Tarea.objects.filter(nombre='estadisticas.recalcular').exists())
+        self.assertEqual(resumen.almacen.cantidad_items(), 0)
+
+    def test_stock_insuficiente_no_deja_nada_escrito(self):
+        resumen = self.resumen((self.lienzo, 2), (self.oleo, 3))
+        # Otro canal vende unidades del óleo después de que el cliente las reservara
+        Producto.objects.filter(pk=self.oleo.pk).update(stock=1)
+
+        with self.assertRaises(StockInsuficiente) as contexto:
+            crear_pedido(self.usuario, resumen, 'efectivo', 'Calle 1')
+        self.assertEqual(contexto.exception.productos, [self.oleo])
+
+        self.lienzo.refresh_from_db()
+        self.assertEqual((self.lienzo.stock, self.lienzo.stock_reservado), (6, 2))
+        self.assertEqual(ReservaStock.objects.count(), 2)
+        self.assertFalse(Pedido.objects.exists())
+        self.assertFalse(ItemPedido.objects.exists())
+        self.assertFalse(MovimientoInventario.objects.filter(tipo='venta').exists())
+        self.assertFalse(Tarea.objects.exists())
+        self.assertEqual(len(resumen.almacen.lineas()), 2)
+
+
+class ResumenPedidoTests(TestCase):
+    """resumen_lineas repite las líneas de ItemPedido y resumir_pedidos completa los pedidos viejos"""
+
+    setUp = CrearPedidoTests.setUp
+    resumen = CrearPedidoTests.resumen
+
+    def lineas(self, pedido):
+        return resumir(ItemPedido.objects.filter(pedido=pedido).select_related('producto').order_by('id'))
+
+    def test_resumen_coincide_con_las_lineas(self):
+        pedido = crear_pedido(self.usuario, self.resumen((self.lienzo, 2), (self.oleo, 1)), 'efectivo', 'Calle 1')
+        pedido.refresh_from_db()
+        self.assertEqual(len(pedido.resumen_lineas), 2)
+        self.assertEqual(
+            sorted(pedido.resumen_lineas, key=lambda linea: linea['producto_id']),
+            sorted(self.lineas(pedido), key=lambda linea: linea['producto_id']),
+        )
+
+    def test_resumir_pedidos_rellena_los_anteriores(self):
+        viejos = []
+        for producto, cantidad in ((self.lienzo, 1), (self.oleo, 2), (self.lienzo, 3)):
+            pedido = Pedido.objects.create(
+                usuario=self.usuario, metodo_pago='efectivo', subtotal=0, total=0, direccion_envio='Calle 1'
+            )
+            ItemPedido.objects.create(
+                pedido=pedido, producto=producto, cantidad=cantidad,
+                precio_unitario=producto.precio, subtotal=producto.precio * cantidad,
+            )
+            viejos.append(pedido)
+        nuevo = crear_pedido(self.usuario, self.resumen((self.oleo, 1)), 'efectivo', 'Calle 1')
+        nuevo.refresh_from_db()
+        resumen_nuevo = nuevo.resumen_lineas
+
+        # Sin resumen, cargar_lineas lo arma desde ItemPedido
+        (pedido,) = cargar_lineas([Pedido.objects.get(pk=viejos[1].pk)])
+        self.assertEqual([(linea.nombre, linea.cantidad) for linea in pedido.lineas], [('Óleo azul', 2)])
+
+        salida = StringIO()
+        call_command('resumir_pedidos', lote=2, stdout=salida)
+        self.assertIn('3 pedidos resumidos', salida.getvalue())
+        for pedido in viejos:
+            pedido.refresh_from_db()
+            self.assertEqual(pedido.resumen_lineas, self.lineas(pedido))
+        nuevo.refresh_from_db()
+        self.assertEqual(nuevo.resumen_lineas, resumen_nuevo)
+
+
+class PaginacionCursorTests(TestCase):
+    """Cursores sobre (-fecha_creacion, -id): los empates de fecha no repiten ni saltan filas"""
+
+    def setUp(self):
+        for i in range(7):
+            Producto.objects.create(nombre=f'Óleo {i}', descripcion='', precio=Decimal('10.00'), stock=1, tipo='oleo')
+        # Todos con la misma fecha: el orden lo decide solo el id
+        Producto.objects.update(fecha_creacion=timezone.now())
+        self.ids = list(Producto.objects.order_by('-id').values_list('id', flat=True))
+
+    def test_siguiente_y_anterior_con_fechas_empatadas(self):
+        productos = Producto.objects.all()
+        paginas = [paginar_por_cursor(productos, None, 3)]
+        while paginas[-1].hay_siguiente:
+            paginas.append(paginar_por_cursor(productos, paginas[-1].cursor_siguiente, 3))
+        self.assertEqual([[p.pk for p in pagina] for pagina in paginas], [self.ids[:3], self.ids[3:6], self.ids[6:]])
+        self.assertFalse(paginas[0].hay_anterior)
+
+        anterior = paginar_por_cursor(productos, paginas[-1].cursor_anterior, 3)
+        self.assertEqual([p.pk for p in anterior], self.ids[3:6])
+        primera = paginar_por_cursor(productos, anterior.cursor_anterior, 3)
+        self.assertEqual([p.pk for p in primera], self.ids[:3])
+        self.assertFalse(primera.hay_anterior)
+        self.assertTrue(primera.hay_siguiente)
+
+    def test_cursor_invalido_muestra_la_primera_pagina(self):
+        url = reverse('productos_por_categoria', args=['oleos'])
+        for cursor in ('no-es-un-cursor', codificar_cursor('otra', timezone.now(), 1)[:-2], 'eHx5fHo'):
+            respuesta = self.client.get(url, {'cursor': cursor})
+            self.assertEqual(respuesta.status_code, 200)
+            self.assertEqual([p.pk for p in respuesta.context['productos']], self.ids)
+
+
+class DisponibilidadReservasTests(TestCase):
+    """Un producto con todo su stock reservado en carritos no cuenta como disponible"""
+
+    def setUp(self):
+        self.producto = Producto.objects.create(
+            nombre='Óleo rojo', descripcion='', precio=Decimal('80.00'), stock=1, tipo='oleo'
+        )
+        # El índice es global al proceso: se reconstruye sin restos de otras pruebas
+        indice_facetas.invalidar()
+
+    def disponibles(self):
+        return indice_facetas.filtrar('oleo', {'disponible': {'1'}}).total
+
+    def test_reservar_la_ultima_unidad_cambia_faceta_y_fragmentos(self):
+        self.assertEqual(self.disponibles(), 1)
+        version = obtener_version('fragmentos:productos')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reservas.fijar_reserva('u1', self.producto, 1)
+        self.assertEqual(self.disponibles(), 0)
+        self.assertNotEqual(obtener_version('fragmentos:productos'), version)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reservas.liberar('u1')
+        self.assertEqual(self.disponibles(), 1)
+
+
+class CarritoBackendTests:
+    """Mismo recorrido para cada backend; las subclases fijan `backend` y el usuario"""
+    backend = None
+
+    def setUp(self):
+        caches['compartida'].clear()
+        self.usuario = User.objects.create_user('comprador')
+        self.lienzo = Producto.objects.create(
+            nombre='Lienzo 30x40', descripcion='', precio=Decimal('150.00'), stock=5, tipo='lienzo'
+        )
+        self.oleo = Producto.objects.create(
+            nombre='Óleo azul', descripcion='', precio=Decimal('80.00'), stock=3, tipo='oleo'
+        )
+        self.sesion = SessionStore()
+
+    def usuario_peticion(self):
+        return self.usuario
+
+    def carrito(self):
+        """Un backend nuevo sobre la misma sesión, como en la siguiente petición"""
+        request = RequestFactory().get('/carrito/')
+        request.user = self.usuario_peticion()
+        request.session = self.sesion
+        return self.backend(request)
+
+    def reservado(self, producto):
+        producto.refresh_from_db()
+        return producto.stock_reservado
+
+    def test_agregar_actualizar_y_quitar(self):
+        carrito = self.carrito()
+        carrito.agregar(self.lienzo, 2)
+        carrito.agregar(self.oleo, 1)
+        carrito.agregar(self.lienzo, 1)
+
+        carrito = self.carrito()
+        self.assertEqual({linea.producto_id: linea.cantidad for linea in carrito.lineas()}, {self.lienzo.pk: 3, self.oleo.pk: 1})
+        self.assertEqual(carrito.cantidad_items(), 4)
+        self.assertEqual(carrito.subtotal(), Decimal('530.00'))
+        self.assertEqual(self.reservado(self.lienzo), 3)
+
+        linea = next(linea for linea in carrito.lineas() if linea.producto_id == self.oleo.pk)
+        carrito.actualizar([(linea, 2)])
+        carrito = self.carrito()
+        self.assertEqual(carrito.cantidad_items(), 5)
+        self.assertEqual(self.reservado(self.oleo), 2)
+
+        self.assertTrue(carrito.quitar(self.lienzo.pk))
+        self.assertFalse(carrito.quitar(self.lienzo.pk))
+        carrito = self.carrito()
+        self.assertEqual([linea.producto_id for linea in carrito.lineas()], [self.oleo.pk])
+        self.assertEqual(self.reservado(self.lienzo), 0)
+
+        carrito.vaciar()
+        self.assertEqual(self.carrito().cantidad_items(), 0)
+        self.assertFalse(ReservaStock.objects.exists())
+
+    def test_sin_unidades_libres_no_cambia_el_carrito(self):
+        carrito = self.carrito()
+        carrito.agregar(self.oleo, 2)
+        reservas.fijar_reserva('u999', self.oleo, 1)
+
+        with self.assertRaises(reservas.SinDisponibilidad):
+            self.carrito().agregar(self.oleo, 1)
+        self.assertEqual(self.carrito().cantidad_items(), 2)
+        self.assertEqual(self.reservado(self.oleo), 3)
+
+
+class CarritoBDTests(CarritoBackendTests, TestCase):
+    backend = carritos.CarritoBD
+
+    def totales(self, usuario=None):
+        return Carrito.objects.filter(usuario=usuario or self.usuario).values_list('cantidad_items', 'subtotal').get()
+
+    def test_totales_persistidos_siguen_a_las_lineas(self):
+        carrito = self.carrito()
+        carrito.agregar(self.lienzo, 2)
+        carrito.agregar(self.oleo, 1)
+        self.assertEqual(self.totales(), (3, Decimal('380.00')))
+
+        linea = next(linea for linea in carrito.lineas() if linea.producto_id == self.lienzo.pk)
+        carrito.actualizar([(linea, 1)])
+        self.assertEqual(self.totales(), (2, Decimal('230.00')))
+        carrito.quitar(self.oleo.pk)
+        self.assertEqual(self.totales(), (1, Decimal('150.00')))
+
+        # La insignia de la barra es una lectura por clave
+        with self.assertNumQueries(1):
+            self.assertEqual(self.carrito().cantidad_items(), 1)
+
+    def test_cambio_de_precio_recalcula_solo_los_carritos_afectados(self):
+        self.carrito().agregar(self.lienzo, 2)
+        otro = User.objects.create_user('otro')
+        carritos.CarritoBD(RequestFactory().get('/carrito/'), otro).agregar(self.oleo, 1)
+
+        self.lienzo.precio = Decimal('100.00')
+        self.lienzo.save()
+        self.assertEqual(self.totales(), (2, Decimal('200.00')))
+        self.assertEqual(self.totales(otro), (1, Decimal('80.00')))
+
+
+class CarritoSesionTests(CarritoBackendTests, TestCase):
+    backend = carritos.CarritoSesion
+
+    def usuario_peticion(self):
+        return AnonymousUser()
+
+    def test_solo_guarda_cantidades_en_la_sesion(self):
+        self.carrito().agregar(self.lienzo, 2)
+        self.assertEqual(self.sesion[carritos.CLAVE_SESION], {str(self.lienzo.pk): 2})
+
+
+@override_settings(CARRITO_CACHE='compartida')
+class CarritoCacheTests(CarritoBackendTests, TestCase):
+    backend = carritos.CarritoCache
+
+    def usuario_peticion(self):
+        return AnonymousUser()
+
+    def test_lineas_en_la_cache_compartida(self):
+        self.carrito().agregar(self.lienzo, 2)
+        token = self.sesion[carritos.CLAVE_INVITADO]
+        self.assertEqual(caches['compartida'].get(f'artstore:carrito:g{token}'), {str(self.lienzo.pk): 2})
+
+    @override_settings(CARRITO_CACHE='default')
+    def test_rechaza_una_cache_local_del_proceso(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.carrito().agregar(self.lienzo, 1)
+
+
+class ActualizarCarritoTests(TestCase):
+    """ver_carrito/actualizar: se valida todo antes de escribir y los errores vuelven por línea"""
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('comprador')
+        self.lienzo = Producto.objects.create(
+            nombre='Lienzo 30x40', descripcion='', precio=Decimal('150.00'), stock=5, tipo='lienzo'
+        )
+        self.oleo = Producto.objects.create(
+            nombre='Óleo azul', descripcion='', precio=Decimal('80.00'), stock=3, tipo='oleo'
+        )
+        self.client.force_login(self.usuario)
+        carrito = carritos.CarritoBD(RequestFactory().get('/carrito/'), self.usuario)
+        carrito.agregar(self.lienzo, 1)
+        carrito.agregar(self.oleo, 1)
+        self.url = reverse('ver_carrito')
+
+    def cantidades(self):
+        return dict(ItemCarrito.objects.filter(carrito__usuario=self.usuario).values_list('producto_id', 'cantidad'))
+
+    def test_actualiza_todas_las_lineas(self):
+        respuesta = self.client.post(self.url, {
+            'action': 'actualizar', f'cantidad_{self.lienzo.pk}': '4', f'cantidad_{self.oleo.pk}': '2',
+        })
+        self.assertRedirects(respuesta, self.url)
+        self.assertEqual(self.cantidades(), {self.lienzo.pk: 4, self.oleo.pk: 2})
+        self.assertEqual(Carrito.objects.get(usuario=self.usuario).cantidad_items, 6)
+
+    def test_una_linea_invalida_no_guarda_ninguna(self):
+        respuesta = self.client.post(self.url, {
+            'action': 'actualizar', f'cantidad_{self.lienzo.pk}': '4', f'cantidad_{self.oleo.pk}': '9',
+        })
+        self.assertEqual(respuesta.status_code, 200)
+        errores = {item.producto_id: item.error for item in respuesta.context['items']}
+        self.assertEqual(errores, {self.lienzo.pk: None, self.oleo.pk: 'Solo hay 3 disponibles.'})
+        self.assertContains(respuesta, 'value="9"')
+        self.assertEqual(self.cantidades(), {self.lienzo.pk: 1, self.oleo.pk: 1})
+
+
+class ApiCarritoTests(TestCase):
+    """Endpoints JSON del carrito: CSRF obligatorio, errores de reserva y totales en la respuesta"""
+    TOKEN = 'a' * 32
+
+    def setUp(self):
+        self.oleo = Producto.objects.create(
+            nombre='Óleo azul', descripcion='', precio=Decimal('80.00'), stock=3, tipo='oleo'
+        )
+        self.client = Client(enforce_csrf_checks=True)
+        self.client.force_login(User.objects.create_user('comprador'))
+        self.client.cookies['csrftoken'] = self.TOKEN
+
+    def post(self, nombre, con_token=True, **datos):
+        extra = {'HTTP_X_CSRFTOKEN': self.TOKEN} if con_token else {}
+        return self.client.post(reverse(nombre, args=[self.oleo.pk]), datos, **extra)
+
+    def test_sin_token_csrf_se_rechaza(self):
+        self.assertEqual(self.post('api_carrito_agregar', con_token=False, cantidad=1).status_code, 403)
+        self.assertFalse(ItemCarrito.objects.exists())
+
+    def test_agregar_actualizar_y_quitar_devuelven_los_totales(self):
+        respuesta = self.post('api_carrito_agregar', cantidad=2)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['linea'], {
+            'producto_id': self.oleo.pk, 'nombre': 'Óleo azul', 'cantidad': 2, 'precio': '80.00', 'subtotal': '160.00',
+        })
+        self.assertEqual(respuesta.json()['carrito'], {
+            'cantidad_items': 2, 'subtotal': '160.00', 'iva': '25.60', 'total': '185.60',
+        })
+
+        respuesta = self.post('api_carrito_actualizar', cantidad=3)
+        self.assertEqual(respuesta.json()['carrito']['cantidad_items'], 3)
+
+        respuesta = self.post('api_carrito_quitar')
+        self.assertIsNone(respuesta.json()['linea'])
+        self.assertEqual(respuesta.json()['carrito']['cantidad_items'], 0)
+
+    def test_sin_unidades_libres_responde_409(self):
+        reservas.fijar_reserva('u999', self.oleo, 2)
+        respuesta = self.post('api_carrito_agregar', cantidad=2)
+        self.assertEqual(respuesta.status_code, 409)
+        self.assertEqual(respuesta.json(), {'ok': False, 'error': 'Solo hay 1 unidades disponibles.'})
+        self.assertFalse(ItemCarrito.objects.exists())
+
+        self.post('api_carrito_agregar', cantidad=1)
+        respuesta = self.post('api_carrito_actualizar', cantidad=3)
+        self.assertEqual(respuesta.status_code, 409)
+        self.assertEqual(respuesta.json()['error'], 'Solo hay 1 disponibles.')
+        self.assertEqual(self.post('api_carrito_actualizar', cantidad=0).status_code, 400)
+        self.assertEqual(ItemCarrito.objects.get().cantidad, 1)
+
+
+@override_settings(CARRITO_BACKEND='store.carritos.CarritoBD', CARRITO_INVITADOS='store.carritos.CarritoSesion')
+class FusionarCarritoInvitadoTests(TestCase):
+    """Al iniciar sesión las líneas y las reservas del invitado pasan al carrito del usuario"""
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('comprador', password='clave-segura-123')
+        self.lienzo = Producto.objects.create(
+            nombre='Lienzo 30x40', descripcion='', precio=Decimal('150.00'), stock=5, tipo='lienzo'
+        )
+        self.oleo = Producto.objects.create(
+            nombre='Óleo azul', descripcion='', precio=Decimal('80.00'), stock=3, tipo='oleo'
+        )
+
+    def test_invitado_agrega_y_ve_su_carrito_sin_iniciar_sesion(self):
+        respuesta = self.client.post(reverse('agregar_al_carrito', args=[self.lienzo.pk]), {'cantidad': 2})
+        self.assertEqual(respuesta.status_code, 302)
+        respuesta = self.client.get(reverse('ver_carrito'))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual([item.cantidad for item in respuesta.context['items']], [2])
+
+    def test_fusion_al_iniciar_sesion(self):
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        request.session = SessionStore()
+        invitado = carritos.CarritoSesion(request)
+        invitado.agregar(self.lienzo, 2)
+        invitado.agregar(self.oleo, 1)
+        # El usuario ya tenía una unidad del lienzo en su carrito
+        carritos.CarritoBD(request, usuario=self.usuario).agregar(self.lienzo, 1)
+
+        self.assertEqual(carritos.fusionar_carrito_invitado(request, self.usuario), 2)
+
+        destino = carritos.CarritoBD(request, usuario=self.usuario)
+        self.assertEqual({linea.producto_id: linea.cantidad for linea in destino.lineas()}, {self.lienzo.pk: 3, self.oleo.pk: 1})
+        self.assertEqual(carritos.CarritoSesion(request, usuario=AnonymousUser()).cantidad_items(), 0)
+        self.assertEqual(
+            set(ReservaStock.objects.values_list('titular', 'producto_id', 'cantidad')),
+            {(f'u{self.usuario.pk}', self.lienzo.pk, 3), (f'u{self.usuario.pk}', self.oleo.pk, 1)},
+        )
+        self.lienzo.refresh_from_db()
+        self.assertEqual(self.lienzo.stock_reservado, 3)
+
+    def test_login_fusiona_el_carrito_de_la_sesion(self):
+        self.client.post(reverse('agregar_al_carrito', args=[self.oleo.pk]), {'cantidad': 2})
+        self.client.post(reverse('login'), {'username': 'comprador', 'password': 'clave-segura-123'})
+        respuesta = self.client.get(reverse('ver_carrito'))
+        self.assertTrue(respuesta.context['user'].is_authenticated)
+        self.assertEqual([(item.producto_id, item.cantidad) for item in respuesta.context['items']], [(self.oleo.pk, 2)])
+        self.assertEqual(ItemCarrito.objects.get(carrito__usuario=self.usuario).cantidad, 2)
+
+
+class FragmentoInicioTests(TestCase):
+    """Las versiones de los fragmentos viven en la caché compartida: un cambio en otro proceso también invalida"""
+
+    def setUp(self):
+        caches['default'].clear()
+        self.producto = Producto.objects.create(
+            nombre='Paisaje al óleo', descripcion='', precio=Decimal('900.00'), stock=1, tipo='original', destacado=True
+        )
+
+    def test_version_incrementada_en_otro_proceso_regenera_el_fragmento(self):
+        self.assertContains(self.client.get(reverse('index')), 'Paisaje al óleo')
+        # Sin señales: el fragmento en memoria de este proceso sigue sirviéndose
+        Producto.objects.filter(pk=self.producto.pk).update(nombre='Marina al óleo')
+        self.assertContains(self.client.get(reverse('index')), 'Paisaje al óleo')
+
+        # Lo que haría otro proceso al guardar el producto
+        caches['compartida'].incr('artstore:version:fragmentos:productos')
+        self.assertContains(self.client.get(reverse('index')), 'Marina al óleo')
+
+
+class IndiceFacetasProcesosTests(TestCase):
+    """Cada proceso tiene su índice; la versión compartida y la edad máxima los mantienen al día"""
+
+    def setUp(self):
+        self.producto = Producto.objects.create(
+            nombre='Óleo rojo', descripcion='', precio=Decimal('80.00'), stock=2, tipo='oleo'
+        )
+        indice_facetas.invalidar()
+        # Índice de otro proceso del servidor, ya construido
+        self.otro = IndiceFacetas()
+        self.assertEqual(self.disponibles(self.otro), 1)
+
+    def disponibles(self, indice):
+        return indice.filtrar('oleo', {'disponible': {'1'}}).total
+
+    def test_cambio_en_este_proceso_reconstruye_el_otro(self):
+        self.producto.stock = 0
+        self.producto.save()
+        self.assertEqual(self.disponibles(indice_facetas), 0)
+        self.assertEqual(self.disponibles(self.otro), 0)
+
+    def test_reconstruye_por_edad_aunque_no_cambie_la_version(self):
+        # update() no dispara señales ni cambia la versión
+        Producto.objects.filter(pk=self.producto.pk).update(stock=0)
+        self.assertEqual(self.disponibles(self.otro), 1)
+        with override_settings(FACETAS_RECONSTRUIR_SEGUNDOS=0):
+            self.assertEqual(self.disponibles(self.otro), 0)
+
+
+class EstadisticasPanelTests(TestCase):
+    """Contadores del panel en la caché compartida, calculados una sola vez aunque lleguen muchas peticiones"""
+
+    def setUp(self):
+        caches['compartida'].clear()
+        Producto.objects.create(nombre='Pincel', descripcion='', precio=Decimal('20.00'), stock=2, tipo='pincel')
+
+    def test_llamadas_simultaneas_calculan_una_vez(self):
+        estadisticas.recalcular()
+        # Vencen los valores: la siguiente lectura debe recalcular
+        caches['compartida'].delete(estadisticas.CLAVE_VIGENTE)
+
+        calcular = estadisticas.calcular
+        calculos, durante = [], []
+
+        def calcular_lento():
+            calculos.append(1)
+            self.assertIsNotNone(caches['compartida'].get(estadisticas.CLAVE_CALCULANDO))
+            # Mientras este proceso calcula llegan las peticiones de otros workers;
+            # la marca está en la caché compartida, así que no recalculan
+            durante.extend(estadisticas.obtener_estadisticas() for _ in range(5))
+            return calcular()
+
+        with mock.patch.object(estadisticas, 'calcular', side_effect=calcular_lento):
+            valores = estadisticas.obtener_estadisticas()
+        self.assertEqual(len(calculos), 1)
+        self.assertEqual([fila['total_productos'] for fila in durante], [1] * 5)
+        self.assertEqual(valores['stock_bajo'], 1)
+
+        # Vigentes otra vez: nadie consulta la base de datos
+        with mock.patch.object(estadisticas, 'calcular', side_effect=AssertionError('recalculó')):
+            self.assertEqual(estadisticas.obtener_estadisticas(), valores)
+
+    def test_senales_ajustan_los_contadores_en_cache(self):
+        estadisticas.recalcular()
+        with self.captureOnCommitCallbacks(execute=True):
+            Producto.objects.create(nombre='Lienzo', descripcion='', precio=Decimal('50.00'), stock=10, tipo='lienzo')
+            User.objects.create_user('nuevo')
+        self.assertEqual(estadisticas.obtener_estadisticas(), estadisticas.calcular())
+
+
+class LibroInventarioTests(TestCase):
+    """Cada cambio de stock deja un movimiento y la suma del libro es el stock"""
+
+    def setUp(self):
+        numeros_pedido._bloques._reiniciar()
+        self.usuario = User.objects.create_user('comprador')
+        self.producto = Producto.objects.create(
+            nombre='Lienzo 50x70', descripcion='', precio=Decimal('200.00'), stock=10, tipo='lienzo'
+        )
+
+    def comprar(self, cantidad):
+        request = RequestFactory().post('/checkout/')
+        request.user = self.usuario
+        resumen = obtener_resumen(request)
+        resumen.almacen.agregar(self.producto, cantidad)
+        return crear_pedido(self.usuario, resumen, 'efectivo', 'Calle 1')
+
+    def assertCuadra(self):
+        self.producto.refresh_from_db()
+        self.assertEqual(inventario.stock_segun_libro([self.producto.pk]), {self.producto.pk: self.producto.stock})
+        self.assertEqual(inventario.conciliar(), ({}, {}))
+
+    def test_alta_venta_y_cancelacion(self):
+        pedido = self.comprar(3)
+        pedido.estado = 'cancelado'
+        pedido.save()
+        self.assertEqual(
+            list(MovimientoInventario.objects.values_list('tipo', 'cantidad')),
+            [('reposicion', 10), ('venta', -3), ('cancelacion', 3)],
+        )
+        self.assertCuadra()
+
+    def test_edicion_del_panel_no_pisa_una_venta_simultanea(self):
+        datos = {
+            'nombre': self.producto.nombre, 'descripcion': 'x', 'precio': '200.00', 'tipo': 'lienzo',
+            'activo': 'on', 'stock': 15,
+        }
+        # El administrador abre el formulario con stock 10...
+        form = ProductoForm(instance=self.producto)
+        datos['stock_original'] = form['stock_original'].value()
+        # ...mientras tanto se venden 3 unidades...
+        self.comprar(3)
+        # ...y guarda 15: son 5 unidades más sobre las 7 que quedan
+        form = ProductoForm(datos, instance=Producto.objects.get(pk=self.producto.pk))
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+
+        self.assertEqual(MovimientoInventario.objects.last().cantidad, 5)
+        self.assertCuadra()
+        self.assertEqual(self.producto.stock, 12)
+
+    def test_compactar_resume_en_saldos_sin_cambiar_el_stock(self):
+        self.comprar(2)
+        self.comprar(1)
+        corte = timezone.now() + timedelta(seconds=1)
+        borrados, saldos = inventario.compactar(corte)
+        self.assertEqual((borrados, saldos), (3, 1))
+        self.assertEqual(list(MovimientoInventario.objects.values_list('tipo', 'cantidad')), [('saldo', 7)])
+        self.assertEqual(inventario.fecha_corte(), corte)
+
+        self.producto.refresh_from_db()
+        self.producto.stock += 4
+        self.producto.save()
+        self.assertCuadra()
+        self.assertEqual(self.producto.stock, 11)
+
+    def test_conciliar_detecta_y_corrige_descuadres(self):
+        Producto.objects.filter(pk=self.producto.pk).update(stock=8)
+        self.assertEqual(inventario.conciliar()[0], {self.producto.pk: (8, 10)})
+
+        salida = StringIO()
+        call_command('conciliar_inventario', corregir=True, stdout=salida)
+        self.assertIn('Se anotaron 1 ajustes', salida.getvalue())
+        self.assertCuadra()
+
+
+class ApiCatalogoTests(TestCase):
+    """API JSON de solo lectura: proyección de campos, stock disponible y paginación"""
+
+    def setUp(self):
+        self.producto = Producto.objects.create(
+            nombre='Acrílico verde', descripcion='', precio=Decimal('45.00'), stock=4, tipo='acrilico'
+        )
+        reservas.fijar_reserva('u999', self.producto, 3)
+
+    def test_campos_por_defecto_con_stock_disponible(self):
+        datos = self.client.get(reverse('api_producto', args=[self.producto.pk])).json()
+        self.assertEqual(datos['stock'], 4)
+        self.assertEqual(datos['disponible'], 1)
+        self.assertNotIn('descripcion', datos)
+
+    def test_proyeccion_de_campos(self):
+        datos = self.client.get(reverse('api_productos'), {'fields': 'id, disponible'}).json()
+        self.assertEqual(datos['resultados'], [{'id': self.producto.pk, 'disponible': 1}])
+
+    def test_campo_desconocido_devuelve_400(self):
+        for url in (reverse('api_productos'), reverse('api_producto', args=[self.producto.pk])):
+            respuesta = self.client.get(url, {'fields': 'nombre,costo,stock_reservado'})
+            self.assertEqual(respuesta.status_code, 400)
+            self.assertEqual(respuesta.json(), {'error': 'Campos no válidos: costo, stock_reservado'})
+
+    def test_exportacion_completa_en_flujo(self):
+        respuesta = self.client.get(reverse('api_productos'), {'todo': '1', 'fields': 'nombre,disponible'})
+        self.assertTrue(respuesta.streaming)
+        contenido = b''.join(respuesta.streaming_content).decode()
+        self.assertEqual(json.loads(contenido), [{'nombre': 'Acrílico verde', 'disponible': 1}])
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'El índice FTS5 es específico de SQLite')
+class IndiceBusquedaTests(TestCase):
+    """El índice sigue a los productos y a los nombres de su categoría y su artista"""
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.categoria = Categoria.objects.create(nombre='Acuarelas', slug='acuarelas')
+            self.artista = Artista.objects.create(
+                usuario=User.objects.create_user('pintora'), nombre='Frida Ruiz', biografia='', especialidad='Retrato'
+            )
+            self.producto = Producto.objects.create(
+                nombre='Retrato en azul', descripcion='', precio=Decimal('500.00'), stock=1, tipo='original',
+                categoria=self.categoria, artista=self.artista,
+            )
+
+    def test_renombrar_categoria_reindexa_sus_productos(self):
+        self.assertEqual(busqueda.buscar_ids('acuarelas'), [self.producto.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.categoria.nombre = 'Témperas'
+            self.categoria.save()
+        self.assertEqual(busqueda.buscar_ids('acuarelas'), [])
+        self.assertEqual(busqueda.buscar_ids('temperas'), [self.producto.pk])
+
+    def test_borrar_artista_o_categoria_los_quita_del_indice(self):
+        self.assertEqual(busqueda.buscar_ids('frida'), [self.producto.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.artista.delete()
+            self.categoria.delete()
+        self.assertEqual(busqueda.buscar_ids('frida'), [])
+        self.assertEqual(busqueda.buscar_ids('acuarelas'), [])
+        self.assertEqual(busqueda.buscar_ids('retrato'), [self.producto.pk])
+
+    def test_guardado_deshecho_no_toca_el_indice(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                self.producto.nombre = 'Bodegón'
+                self.producto.save()
+                raise RuntimeError
+        self.assertEqual(busqueda.buscar_ids('bodegon'), [])
+        self.assertEqual(busqueda.buscar_ids('retrato'), [self.producto.pk])
+
+
+class AlmacenamientoPorContenidoTests(TestCase):
+    """Blobs por contenido: sin copias repetidas, nombres validados y purga de los que nadie usa"""
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        ajustes = override_settings(MEDIA_ROOT=self.media)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.almacenamiento = almacenamiento_por_contenido()
+
+    def guardar(self, contenido, nombre='productos/cuadro.PNG', **extra):
+        return self.almacenamiento.save(nombre, ContentFile(contenido), **extra)
+
+    def envejecer(self, nombre):
+        hace_dos_dias = time.time() - 48 * 3600
+        os.utime(self.almacenamiento.path(nombre), (hace_dos_dias, hace_dos_dias))
+
+    def test_contenido_repetido_comparte_blob(self):
+        primero = self.guardar(b'lienzo')
+        self.assertTrue(es_inmutable(primero))
+        self.assertRegex(primero, r'^productos/[0-9a-f]{2}/[0-9a-f]{64}\.png$')
+        self.assertEqual(self.guardar(b'lienzo', 'productos/otro.png'), primero)
+        self.assertNotEqual(self.guardar(b'acuarela'), primero)
+
+    def test_blob_escrito_por_otro_proceso_durante_el_guardado(self):
+        nombre = self.guardar(b'lienzo')
+        # exists() llega tarde: el archivo aparece entre la comprobación y la escritura
+        with mock.patch.object(type(self.almacenamiento), 'exists', side_effect=[False, True]):
+            self.assertEqual(self.guardar(b'lienzo'), nombre)
+
+    def test_valida_nombre_y_longitud(self):
+        with self.assertRaises(SuspiciousFileOperation):
+            self.guardar(b'lienzo', '../fuera/cuadro.png')
+        with self.assertRaises(SuspiciousFileOperation):
+            self.guardar(b'lienzo', max_length=40)
+        self.assertEqual(os.listdir(self.media), [])
+
+    def test_purgar_media_borra_solo_blobs_sin_referencias(self):
+        producto = self.guardar(b'producto')
+        resumen = self.guardar(b'pedido')
+        huerfano = self.guardar(b'huerfano')
+        reciente = self.guardar(b'reciente')
+        for nombre in (producto, resumen, huerfano):
+            self.envejecer(nombre)
+
+        Producto.objects.create(nombre='Cuadro', descripcion='', precio=Decimal('10.00'), stock=1, tipo='original', imagen=producto)
+        Pedido.objects.create(
+            usuario=User.objects.create_user('comprador'), metodo_pago='efectivo', subtotal=0, total=0,
+            direccion_envio='Calle 1', resumen_lineas=[{'imagen': resumen}],
+        )
+
+        call_command('purgar_media', '--simular', stdout=StringIO())
+        self.assertTrue(self.almacenamiento.exists(huerfano))
+
+        call_command('purgar_media', stdout=StringIO())
+        self.assertFalse(self.almacenamiento.exists(huerfano))
+        for nombre in (producto, resumen, reciente):
+            self.assertTrue(self.almacenamiento.exists(nombre))
+
+
+class MiniaturasTests(TestCase):
+    """Los derivados los genera el worker de tareas y la web ve su manifiesto al momento"""
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        ajustes = override_settings(MEDIA_ROOT=self.media)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def imagen(self):
+        salida = BytesIO()
+        Image.new('RGB', (400, 200), (200, 30, 30)).save(salida, 'PNG')
+        return ContentFile(salida.getvalue(), 'cuadro.png')
+
+    def test_subida_encola_tarea_y_el_manifiesto_se_ve_al_generarla(self):
+        producto = Producto(nombre='Cuadro', descripcion='', precio=Decimal('10.00'), stock=1, tipo='original')
+        producto.imagen.save('cuadro.png', self.imagen())
+        nombre = producto.imagen.name
+        tarea = Tarea.objects.get(nombre='miniaturas.generar')
+        self.assertEqual(tarea.datos, {'imagen': nombre})
+
+        # Una página pidió la imagen antes que el worker: queda "sin derivados" en caché
+        self.assertIsNone(miniaturas.leer_manifiesto(nombre))
+        (trabajo,) = tareas.reclamar('prueba')
+        self.assertTrue(tareas.ejecutar(trabajo))
+        self.assertEqual(miniaturas.leer_manifiesto(nombre), [160, 320])
+        self.assertEqual(caches['compartida'].get(f'miniaturas:{nombre}'), [160, 320])
+
+
+class EtagDetalleProductoTests(TestCase):
+    """El ETag de detalle cubre lo que muestra la página, no solo la fila del producto"""
+
+    def setUp(self):
+        self.categoria = Categoria.objects.create(nombre='Óleos', slug='oleos')
+        self.producto = Producto.objects.create(
+            nombre='Marina', descripcion='', precio=Decimal('300.00'), stock=2, tipo='original', categoria=self.categoria,
+        )
+        self.relacionados = [
+            Producto.objects.create(nombre=f'Obra {i}', descripcion='', precio=Decimal('100.00'), stock=1, tipo='original')
+            for i in range(6)
+        ]
+        self.url = reverse('detalle_producto', args=[self.producto.pk])
+
+    def etag(self):
+        respuesta = self.client.get(self.url)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertFalse(respuesta.has_header('Last-Modified'))
+        return respuesta['ETag']
+
+    def test_misma_pagina_mismo_etag_y_304(self):
+        primera = self.client.get(self.url)
+        segunda = self.client.get(self.url)
+        self.assertEqual(primera['ETag'], segunda['ETag'])
+        self.assertEqual(primera.context['productos_relacionados'], segunda.context['productos_relacionados'])
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=primera['ETag']).status_code, 304)
+
+    def test_cambia_con_categoria_relacionados_y_miniaturas(self):
+        etag = self.etag()
+        self.categoria.nombre = 'Óleos y acrílicos'
+        self.categoria.save()
+        self.assertNotEqual(self.etag(), etag)
+
+        etag = self.etag()
+        self.relacionados[0].precio = Decimal('90.00')
+        self.relacionados[0].save()
+        self.assertNotEqual(self.etag(), etag)
+
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        with override_settings(MEDIA_ROOT=media):
+            salida = BytesIO()
+            Image.new('RGB', (400, 200)).save(salida, 'PNG')
+            nombre = default_storage.save('productos/obra.png', ContentFile(salida.getvalue()))
+            etag = self.etag()
+            miniaturas.generar_derivados(nombre)
+            self.assertNotEqual(self.etag(), etag)
+
+
+class ListaPedidosAdminTests(TestCase):
+    """Los enlaces del historial y de la paginación conservan los filtros de la lista"""
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'clave'))
+        self.url = reverse('crud_lista', args=['pedidos'])
+
+    def test_enlace_historial_conserva_estado_y_tamano(self):
+        respuesta = self.client.get(self.url, {'estado': 'pendiente', 'page_size': '25'})
+        self.assertContains(respuesta, 'href="?historial=completo&estado=pendiente&page_size=25"')
+
+        respuesta = self.client.get(self.url, {'estado': 'pendiente', 'page_size': '25', 'historial': 'completo'})
+        self.assertContains(respuesta, 'href="?estado=pendiente&page_size=25"')
+
+
+class ColaTareasTests(TestCase):
+    """Cola en la base de datos: una toma por worker, reintentos espaciados y fallo definitivo"""
+
+    def setUp(self):
+        self.hechas = []
+        registro = mock.patch.dict(tareas._registro, {
+            'prueba.anotar': lambda valor: self.hechas.append(valor),
+            'prueba.fallar': mock.Mock(side_effect=RuntimeError('sin conexión con el proveedor')),
+        })
+        registro.start()
+        self.addCleanup(registro.stop)
+
+    def test_una_tarea_la_toma_un_solo_worker(self):
+        tarea = tareas.encolar('prueba.anotar', valor=1)
+        (primero,) = tareas.reclamar('worker-a')
+        self.assertEqual(tareas.reclamar('worker-b'), [])
+
+        # El bloqueo vence (worker-a murió): otro worker la retoma y su resultado manda
+        Tarea.objects.filter(pk=tarea.pk).update(bloqueada_hasta=timezone.now() - timedelta(seconds=1))
+        (segundo,) = tareas.reclamar('worker-b')
+        self.assertEqual(segundo.intentos, 2)
+        self.assertTrue(tareas.ejecutar(segundo))
+        tareas.ejecutar(primero)
+        tarea.refresh_from_db()
+        self.assertEqual((tarea.estado, tarea.trabajador), ('hecha', segundo.trabajador))
+
+    def test_reintenta_con_espera_y_termina_fallida(self):
+        tarea = tareas.encolar('prueba.fallar')
+        Tarea.objects.filter(pk=tarea.pk).update(max_intentos=2)
+
+        (trabajo,) = tareas.reclamar('worker-a')
+        self.assertFalse(tareas.ejecutar(trabajo))
+        tarea.refresh_from_db()
+        self.assertEqual(tarea.estado, 'pendiente')
+        self.assertIn('sin conexión con el proveedor', tarea.ultimo_error)
+        self.assertGreater(tarea.disponible_desde, timezone.now() + timedelta(seconds=25))
+        self.assertEqual(tareas.reclamar('worker-a'), [])
+
+        Tarea.objects.filter(pk=tarea.pk).update(disponible_desde=timezone.now())
+        (trabajo,) = tareas.reclamar('worker-a')
+        self.assertFalse(tareas.ejecutar(trabajo))
+        tarea.refresh_from_db()
+        self.assertEqual((tarea.estado, tarea.intentos), ('fallida', 2))
+        self.assertEqual(tareas.reclamar('worker-a'), [])
+
+    def test_procesar_tareas_una_vez(self):
+        tareas.encolar('prueba.anotar', valor='a')
+        tareas.encolar('prueba.fallar')
+        salida = StringIO()
+        call_command('procesar_tareas', '--una-vez', stdout=salida)
+        self.assertEqual(self.hechas, ['a'])
+        self.assertIn('✓ prueba.anotar', salida.getvalue())
+        self.assertIn('✗ prueba.fallar', salida.getvalue())
+        self.assertEqual(
+            dict(Tarea.objects.values_list('nombre', 'estado')), {'prueba.anotar': 'hecha', 'prueba.fallar': 'pendiente'}
+        )
+
+
+class DifusorEstadisticasTests(TestCase):
+    """Un solo lector reparte a cada suscripción del panel solo los contadores que cambiaron"""
+
+    def setUp(self):
+        self.valores = {'total_pedidos': 3, 'pendientes': 1}
+        # Sin registrar el difusor de la prueba entre los oyentes del módulo
+        for parche in (
+            mock.patch.object(estadisticas, 'al_ajustar'),
+            mock.patch.object(estadisticas, 'obtener_estadisticas', lambda: dict(self.valores)),
+        ):
+            parche.start()
+            self.addCleanup(parche.stop)
+
+    def test_la_difusion_llega_a_las_suscripciones(self):
+        async def recorrido():
+            difusor = tiempo_real.DifusorEstadisticas()
+            primera, segunda = await difusor.suscribir(), await difusor.suscribir()
+            await asyncio.wait_for(primera.hay_cambios.wait(), 1)
+            iniciales = primera.tomar(), segunda.tomar()
+
+            # Un ajuste desde una vista síncrona despierta al lector sin esperar el intervalo
+            self.valores['pendientes'] = 2
+            difusor.avisar()
+            await asyncio.wait_for(segunda.hay_cambios.wait(), 1)
+            cambios = primera.tomar(), segunda.tomar()
+
+            tardia = await difusor.suscribir()
+            al_conectar = tardia.tomar()
+            for suscripcion in (primera, segunda, tardia):
+                difusor.cancelar(suscripcion)
+            return iniciales, cambios, al_conectar
+
+        iniciales, cambios, al_conectar = asyncio.run(recorrido())
+        self.assertEqual(iniciales, ({'total_pedidos': 3, 'pendientes': 1},) * 2)
+        self.assertEqual(cambios, ({'pendientes': 2},) * 2)
+        self.assertEqual(al_conectar, {'total_pedidos': 3, 'pendientes': 2})
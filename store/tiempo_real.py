@@ -0,0 +1,133 @@
+# tiempo_real.py - Contadores del panel por Server-Sent Events (requiere ASGI)
+import asyncio
+import json
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from . import estadisticas
+
+# Comentario SSE periódico para que proxies y navegador no den la conexión por muerta
+LATIDO_SEGUNDOS = 15
+# Espera del navegador antes de reconectar si se corta
+RECONEXION_MS = 5000
+
+
+def intervalo():
+    return getattr(settings, 'ESTADISTICAS_DIFUSION_SEGUNDOS', 2)
+
+
+def evento_sse(datos, evento='estadisticas'):
+    return f'event: {evento}\ndata: {json.dumps(datos)}\n\n'
+
+
+class Suscripcion:
+    """Cambios pendientes de enviar a una conexión; un cliente lento recibe el último valor, no una cola"""
+
+    def __init__(self):
+        self.cambios = {}
+        self.hay_cambios = asyncio.Event()
+
+    def recibir(self, cambios):
+        self.cambios.update(cambios)
+        self.hay_cambios.set()
+
+    def tomar(self):
+        cambios, self.cambios = self.cambios, {}
+        self.hay_cambios.clear()
+        return cambios
+
+
+class DifusorEstadisticas:
+    """
+    Un solo lector por proceso para todas las conexiones del panel. Lee los
+    contadores en caché (estadisticas.py) cada intervalo, o antes si una
+    señal de este proceso los ajustó, y reparte a cada suscripción solo los
+    que cambiaron. Con N administradores conectados se sigue leyendo una
+    vez; la tarea arranca con la primera conexión y termina con la última.
+    """
+
+    def __init__(self):
+        self._suscripciones = set()
+        self._ultimos = {}
+        self._tarea = None
+        self._bucle = None
+        self._despertar = None
+        estadisticas.al_ajustar(self.avisar)
+
+    async def suscribir(self):
+        suscripcion = Suscripcion()
+        self._suscripciones.add(suscripcion)
+        bucle = asyncio.get_running_loop()
+        if self._tarea is None or self._tarea.done() or self._bucle is not bucle:
+            if self._tarea is not None and not self._bucle.is_closed():
+                # Tarea de un bucle anterior (otro hilo del servidor): se detiene
+                self._bucle.call_soon_threadsafe(self._tarea.cancel)
+            self._bucle = bucle
+            self._ultimos = {}
+            self._despertar = asyncio.Event()
+            # La primera lectura es inmediata y, sin valores previos, reparte todos
+            self._despertar.set()
+            self._tarea = asyncio.create_task(self._difundir())
+        elif self._ultimos:
+            suscripcion.recibir(dict(self._ultimos))
+        return suscripcion
+
+    def cancelar(self, suscripcion):
+        self._suscripciones.discard(suscripcion)
+        if not self._suscripciones and self._tarea is not None:
+            self._tarea.cancel()
+            self._tarea = None
+            self._bucle = None
+
+    def avisar(self):
+        """Las señales corren en hilos de las vistas síncronas: se despierta al bucle desde fuera"""
+        bucle, despertar = self._bucle, self._despertar
+        if bucle is not None and despertar is not None and not bucle.is_closed():
+            bucle.call_soon_threadsafe(despertar.set)
+
+    async def _difundir(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._despertar.wait(), intervalo())
+            except asyncio.TimeoutError:
+                pass
+            self._despertar.clear()
+            valores = await sync_to_async(estadisticas.obtener_estadisticas)()
+            cambios = {nombre: valor for nombre, valor in valores.items() if self._ultimos.get(nombre) != valor}
+            self._ultimos = valores
+            if not cambios:
+                continue
+            for suscripcion in list(self._suscripciones):
+                suscripcion.recibir(cambios)
+
+
+_difusor = None
+_lock = threading.Lock()
+
+
+def obtener_difusor():
+    global _difusor
+    with _lock:
+        if _difusor is None:
+            _difusor = DifusorEstadisticas()
+    return _difusor
+
+
+async def flujo_estadisticas():
+    """Cuerpo de la respuesta SSE: todos los contadores al conectar y después solo los cambios"""
+    difusor = obtener_difusor()
+    suscripcion = await difusor.suscribir()
+    try:
+        yield f'retry: {RECONEXION_MS}\n\n'
+        while True:
+            try:
+                await asyncio.wait_for(suscripcion.hay_cambios.wait(), LATIDO_SEGUNDOS)
+            except asyncio.TimeoutError:
+                yield ': latido\n\n'
+                continue
+            yield evento_sse(suscripcion.tomar())
+    finally:
+        # También al cerrarse la conexión: Django cancela el generador
+        difusor.cancelar(suscripcion)
@@ -0,0 +1,51 @@
+# totales_carrito.py - Cantidad y subtotal desnormalizados en Carrito
+from decimal import Decimal
+
+from django.db.models import DecimalField, F, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import Carrito, ItemCarrito
+
+CAMPO_IMPORTE = DecimalField(max_digits=12, decimal_places=2)
+
+
+def ajustar_totales(carrito_id, unidades, importe):
+    """Suma (o resta, con valores negativos) a los totales guardados del carrito"""
+    if unidades or importe:
+        Carrito.objects.filter(pk=carrito_id).update(
+            cantidad_items=F('cantidad_items') + unidades,
+            subtotal=F('subtotal') + importe,
+        )
+
+
+def vaciar_totales(carrito_id):
+    Carrito.objects.filter(pk=carrito_id).update(cantidad_items=0, subtotal=Decimal('0'))
+
+
+def _suma_lineas(expresion, campo_salida, cero):
+    lineas = (
+        ItemCarrito.objects.filter(carrito=OuterRef('pk'))
+        .order_by()
+        .values('carrito')
+        .annotate(total=Sum(expresion, output_field=campo_salida))
+        .values('total')
+    )
+    return Coalesce(Subquery(lineas, output_field=campo_salida), Value(cero), output_field=campo_salida)
+
+
+def recalcular_totales(carritos=None):
+    """
+    Recalcula los totales desde las líneas con un solo UPDATE con subconsultas.
+    `carritos` es un queryset de Carrito; por defecto, todos.
+    """
+    if carritos is None:
+        carritos = Carrito.objects.all()
+    return carritos.update(
+        cantidad_items=_suma_lineas(F('cantidad'), IntegerField(), 0),
+        subtotal=_suma_lineas(F('cantidad') * F('producto__precio'), CAMPO_IMPORTE, Decimal('0')),
+    )
+
+
+def recalcular_carritos_con_producto(producto_id):
+    """Tras un cambio de precio: solo los carritos que tienen ese producto"""
+    return recalcular_totales(Carrito.objects.filter(items__producto_id=producto_id))
@@ -1,10 +1,23 @@
-from django.urls import path
+from django.urls import path, re_path
 from django.conf import settings
 from django.conf.urls.static import static
 from . import views
 
 urlpatterns = [
     path('api/dashboard/stats/', views.api_dashboard_stats, name='api_dashboard_stats'),
+    path('api/dashboard/stream/', views.api_dashboard_stream, name='api_dashboard_stream'),
+    path('api/buscar/', views.api_buscar, name='api_buscar'),
+    
+    # Carrito por AJAX
+    path('api/carrito/agregar/<int:producto_id>/', views.api_carrito_agregar, name='api_carrito_agregar'),
+    path('api/carrito/actualizar/<int:producto_id>/', views.api_carrito_actualizar, name='api_carrito_actualizar'),
+    path('api/carrito/quitar/<int:producto_id>/', views.api_carrito_quitar, name='api_carrito_quitar'),
+    
+    # API del catálogo (solo lectura)
+    path('api/productos/', views.api_productos, name='api_productos'),
+    path('api/productos/<int:producto_id>/', views.api_producto, name='api_producto'),
+    path('api/artistas/<int:artista_id>/productos/', views.api_productos_artista, name='api_productos_artista'),
+    path('api/categorias/<slug:slug>/productos/', views.api_productos_categoria, name='api_productos_categoria'),
     
     # Vistas del cliente
     path('', views.index, name='index'),
@@ -15,6 +28,7 @@ urlpatterns = [
     # Productos por categoría
     path('productos/<str:tipo>/', views.productos_por_categoria, name='productos_por_categoria'),
     path('producto/<int:producto_id>/', views.detalle_producto, name='detalle_producto'),
+    path('buscar/', views.buscar, name='buscar'),
     
     # Carrito y compras
     path('carrito/', views.ver_carrito, name='ver_carrito'),
@@ -41,5 +55,7 @@ urlpatterns = [
 ]
 
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    urlpatterns += [
+        re_path(r'^%s(?P<path>.*)$' % settings.MEDIA_URL.lstrip('/'), views.servir_media),
+    ]
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
\ No newline at end of file
@@ -0,0 +1,38 @@
+# versiones.py - Contadores de versión en caché para invalidar datos derivados
+import time
+
+from .cache_compartida import cache_compartida
+
+PREFIJO = 'artstore:version:'
+
+
+def _inicial():
+    # Si la clave se perdió (caché vaciada o purgada) la nueva versión no
+    # coincide con ninguna anterior, así que no revive datos viejos
+    return int(time.time() * 1000)
+
+
+def obtener_version(nombre):
+    """
+    Versión actual de un conjunto de datos (se crea si no existe). Vive en
+    la caché compartida: un cambio en un proceso invalida en todos.
+    """
+    cache = cache_compartida()
+    clave = PREFIJO + nombre
+    version = cache.get(clave)
+    if version is None:
+        inicial = _inicial()
+        cache.add(clave, inicial, None)
+        version = cache.get(clave, inicial)
+    return version
+
+
+def incrementar_version(nombre):
+    """Invalida todo lo que dependa de `nombre` y devuelve la nueva versión"""
+    cache = cache_compartida()
+    clave = PREFIJO + nombre
+    try:
+        return cache.incr(clave)
+    except ValueError:
+        cache.add(clave, _inicial(), None)
+        return cache.incr(clave)
@@ -1,12 +1,16 @@
 # views.py - VERSION COMPLETA CON USUARIOS
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.models import User
 from django.contrib import messages
 from django.db.models import Q, Sum, Count
-from django.http import HttpResponseRedirect, JsonResponse
-from django.views.decorators.http import require_POST
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET, require_POST, condition
+from django.views.static import serve
+from django.conf import settings
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.db import transaction
 from decimal import Decimal
@@ -17,6 +21,28 @@ from datetime import timedelta
 
 from .models import *
 from .forms import *
+from .paginacion import paginar_por_cursor
+from .api_catalogo import (
+    CampoInvalido, MAXIMO_POR_PAGINA, leer_campos, proyectar, serializar, json_en_flujo,
+)
+from .busqueda import buscar_productos
+from .facetas import indice_facetas, leer_seleccion, filtro_por_ids
+from .muestreo import muestra_aleatoria
+from .resumen_carrito import obtener_resumen, descartar_resumen
+from .carritos import obtener_carrito
+from .pedidos import crear_pedido, StockInsuficiente
+from .resumen_pedido import cargar_lineas
+from .archivo import HistorialCompleto, obtener_pedido, totales_archivo, totales_usuario
+from .estadisticas import obtener_estadisticas
+from .tiempo_real import flujo_estadisticas
+from .reservas import SinDisponibilidad
+from .almacenamiento import CABECERA_CACHE_INMUTABLE, es_inmutable
+from .versiones import obtener_version
+from .condicional import (
+    etag_producto, semilla_relacionados,
+    etag_artista, last_modified_artista,
+    etag_pedido,
+)
 from functools import wraps
 
 # ========== FUNCIONES AUXILIARES ==========
@@ -33,18 +59,39 @@ def solo_cliente(view_func):
         return view_func(request, *args, **kwargs)
     return _wrapped_view
 
+def _validar_cantidades(lineas, datos):
+    """
+    Compara las cantidades enviadas con el stock de las líneas ya cargadas.
+    Devuelve las líneas que cambian como (item, cantidad) y los errores por producto.
+    """
+    cambios, errores = [], {}
+    for item in lineas:
+        valor = datos.get(f'cantidad_{item.producto_id}')
+        if valor is None:
+            continue
+        item.cantidad_enviada = valor = valor.strip()
+        if not valor.isdigit() or int(valor) < 1:
+            errores[item.producto_id] = 'Ingresa una cantidad mayor que cero.'
+        elif int(valor) > item.producto.stock:
+            errores[item.producto_id] = f'Solo hay {item.producto.stock} disponibles.'
+        elif int(valor) != item.cantidad:
+            cambios.append((item, int(valor)))
+    return cambios, errores
+
 # ========== VISTAS DEL CLIENTE ==========
 
 def index(request):
-    productos_destacados = Producto.objects.filter(destacado=True, activo=True)[:6]
+    productos_destacados = Producto.objects.filter(destacado=True, activo=True).select_related('artista')[:6]
     categorias = Categoria.objects.all()
-    artistas_destacados = Artista.objects.filter(activo=True).order_by('?')[:2]
+    artistas_destacados = muestra_aleatoria(Artista.objects.filter(activo=True), 2, 'artistas_activos')
     
     context = {
         'productos_destacados': productos_destacados,
         'categorias': categorias,
         'seccion': 'inicio',
         'artistas_destacados': artistas_destacados,
+        # Clave del fragmento en caché; las señales la incrementan al haber cambios
+        'version_productos': obtener_version('fragmentos:productos'),
     }
     return render(request, 'cliente/index.html', context)
 
@@ -60,15 +107,40 @@ def productos_por_categoria(request, tipo):
     }
     
     tipo_producto = tipo_map.get(tipo, tipo)
-    productos = Producto.objects.filter(tipo=tipo_producto, activo=True)
+    productos = Producto.objects.filter(tipo=tipo_producto, activo=True).select_related('artista', 'categoria')
+    
+    # Facetas: la intersección y los conteos se calculan sobre bitsets en memoria
+    seleccion = leer_seleccion(request.GET)
+    resultado = indice_facetas.filtrar(tipo_producto, seleccion)
+    if seleccion:
+        productos = productos.filter(id__in=filtro_por_ids(resultado.bitset))
+    
+    # Paginación por cursor: cada página cuesta lo mismo sin importar su posición
+    pagina = paginar_por_cursor(productos, request.GET.get('cursor'))
     
     context = {
-        'productos': productos,
+        'productos': pagina.objetos,
+        'pagina': pagina,
+        'facetas': resultado.facetas,
+        'total_productos': resultado.total,
+        'hay_filtros': bool(seleccion),
         'tipo': tipo,
         'seccion': 'suministros' if tipo in ['oleos', 'acrilicos', 'lienzos', 'pinceles', 'suministros'] else tipo,
     }
     return render(request, 'cliente/productos/listar_producto.html', context)
 
+def buscar(request):
+    consulta = request.GET.get('q', '').strip()
+    productos = buscar_productos(consulta) if consulta else []
+    
+    context = {
+        'productos': productos,
+        'consulta': consulta,
+        'seccion': 'buscar',
+    }
+    return render(request, 'cliente/productos/buscar.html', context)
+
+@condition(etag_func=etag_producto)
 def detalle_producto(request, producto_id):
     producto = get_object_or_404(Producto, id=producto_id, activo=True)
     form = AgregarAlCarritoForm()
@@ -78,16 +150,24 @@ def detalle_producto(request, producto_id):
     iva = precio_sin_iva * Decimal('0.16')
     precio_con_iva = precio_sin_iva + iva
     
+    productos_relacionados = muestra_aleatoria(
+        Producto.objects.filter(tipo=producto.tipo, activo=True),
+        4,
+        f'productos_{producto.tipo}',
+        excluir=producto.id,
+        semilla=semilla_relacionados(producto.id),
+    )
+    
     context = {
         'producto': producto,
         'form': form,
         'precio_sin_iva': precio_sin_iva,
         'iva': iva,
         'precio_con_iva': precio_con_iva,
+        'productos_relacionados': productos_relacionados,
     }
     return render(request, 'cliente/productos/detalle_producto.html', context)
 
-@login_required
 def agregar_al_carrito(request, producto_id):
     if request.user.is_staff or request.user.is_superuser:
         messages.warning(request, 'Los administradores no pueden realizar compras.')
@@ -99,67 +179,62 @@ def agregar_al_carrito(request, producto_id):
         
         if form.is_valid():
             cantidad = form.cleaned_data['cantidad']
-            
-            # Obtener o crear carrito del usuario
-            carrito, created = Carrito.objects.get_or_create(usuario=request.user)
-            
-            # Verificar si el producto ya está en el carrito
-            item, item_created = ItemCarrito.objects.get_or_create(
-                carrito=carrito,
-                producto=producto,
-                defaults={'cantidad': cantidad}
-            )
-            
-            if not item_created:
-                item.cantidad += cantidad
-                item.save()
-            
-            messages.success(request, f'¡{producto.nombre} agregado al carrito!')
+            # Invitados incluidos: el backend decide dónde se guarda
+            try:
+                obtener_carrito(request).agregar(producto, cantidad)
+                messages.success(request, f'¡{producto.nombre} agregado al carrito!')
+            except SinDisponibilidad as e:
+                messages.error(request, f'Solo hay {e.disponibles} unidades disponibles de {producto.nombre}.')
         else:
             messages.error(request, 'Cantidad inválida.')
     
     return redirect('detalle_producto', producto_id=producto_id)
 
-@login_required
 def ver_carrito(request):
     if request.user.is_staff or request.user.is_superuser:
         messages.warning(request, 'Los administradores no pueden realizar compras.')
         return redirect('index')
         
-    carrito, created = Carrito.objects.get_or_create(usuario=request.user)
+    resumen = obtener_resumen(request)
     
     if request.method == 'POST':
         action = request.POST.get('action')
         
         if action == 'actualizar':
-            for item in carrito.items.all():
-                nueva_cantidad = request.POST.get(f'cantidad_{item.id}')
-                if nueva_cantidad and nueva_cantidad.isdigit():
-                    nueva_cantidad = int(nueva_cantidad)
-                    if nueva_cantidad <= item.producto.stock and nueva_cantidad > 0:
-                        item.cantidad = nueva_cantidad
-                        item.save()
+            # Una lectura de líneas y stock y una sola escritura en el backend
+            with transaction.atomic():
+                cambios, errores = _validar_cantidades(resumen.lineas, request.POST)
+                if not errores:
+                    try:
+                        resumen.almacen.actualizar(cambios)
+                    except SinDisponibilidad as e:
+                        # Otro carrito tiene reservadas las unidades que faltan
+                        errores[e.producto.pk] = f'Solo hay {e.disponibles} disponibles.'
+            
+            if errores:
+                # No se guarda nada: se vuelve a mostrar el carrito con el error en cada línea
+                for item in resumen.lineas:
+                    item.error = errores.get(item.producto_id)
+                messages.error(request, 'Revisa las cantidades marcadas; no se guardó ningún cambio.')
+                return _render_carrito(request, resumen)
             messages.success(request, 'Carrito actualizado.')
             
         elif action == 'eliminar':
-            item_id = request.POST.get('item_id')
-            if item_id:
-                item = get_object_or_404(ItemCarrito, id=item_id, carrito=carrito)
-                item.delete()
+            producto_id = request.POST.get('producto_id')
+            if producto_id and producto_id.isdigit() and resumen.almacen.quitar(int(producto_id)):
                 messages.success(request, 'Producto eliminado del carrito.')
         
         return HttpResponseRedirect(request.path_info)
     
+    return _render_carrito(request, resumen)
+
+def _render_carrito(request, resumen):
     # Calcular totales con IVA
-    subtotal = carrito.total
-    iva = subtotal * Decimal('0.16')
-    total = subtotal + iva
-    
     context = {
-        'carrito': carrito,
-        'subtotal': subtotal,
-        'iva': iva,
-        'total': total,
+        'items': resumen.lineas,
+        'subtotal': resumen.subtotal,
+        'iva': resumen.iva,
+        'total': resumen.total,
     }
     return render(request, 'cliente/compra/carrito.html', context)
 
@@ -169,9 +244,9 @@ def checkout(request):
         messages.warning(request, 'Los administradores no pueden realizar compras.')
         return redirect('index')
         
-    carrito, created = Carrito.objects.get_or_create(usuario=request.user)
+    resumen = obtener_resumen(request)
     
-    if carrito.cantidad_items == 0:
+    if resumen.esta_vacio:
         messages.warning(request, 'Tu carrito está vacío.')
         return redirect('ver_carrito')
     
@@ -184,51 +259,22 @@ def checkout(request):
             messages.error(request, 'Por favor completa todos los campos requeridos.')
             return redirect('checkout')
         
-        # Calcular totales
-        subtotal = carrito.total
-        iva = subtotal * Decimal('0.16')
-        total = subtotal + iva
-        
-        # Crear pedido
-        pedido = Pedido.objects.create(
-            usuario=request.user,
-            metodo_pago=metodo_pago,
-            subtotal=subtotal,
-            iva=iva,
-            total=total,
-            direccion_envio=direccion,
-            notas=notas,
-        )
-        
-        # Crear items del pedido
-        for item in carrito.items.all():
-            ItemPedido.objects.create(
-                pedido=pedido,
-                producto=item.producto,
-                cantidad=item.cantidad,
-                precio_unitario=item.producto.precio,
-                subtotal=item.subtotal,
-            )
-            # Reducir stock
-            item.producto.stock -= item.cantidad
-            item.producto.save()
-        
-        # Vaciar carrito
-        carrito.items.all().delete()
+        try:
+            pedido = crear_pedido(request.user, resumen, metodo_pago, direccion, notas)
+        except StockInsuficiente as error:
+            nombres = ', '.join(producto.nombre for producto in error.productos)
+            messages.error(request, f'Ya no hay stock suficiente de: {nombres}. Ajusta tu carrito.')
+            return redirect('ver_carrito')
+        descartar_resumen(request)
         
         messages.success(request, f'¡Pedido #{pedido.numero_pedido} realizado con éxito!')
         return redirect('confirmacion_pedido', pedido_id=pedido.id)
     
-    # Calcular totales para el checkout
-    subtotal = carrito.total
-    iva = subtotal * Decimal('0.16')
-    total = subtotal + iva
-    
     context = {
-        'carrito': carrito,
-        'subtotal': subtotal,
-        'iva': iva,
-        'total': total,
+        'items': resumen.lineas,
+        'subtotal': resumen.subtotal,
+        'iva': resumen.iva,
+        'total': resumen.total,
         'metodos_pago': Pedido.METODO_PAGO_CHOICES,
     }
     return render(request, 'cliente/compra/checkout.html', context)
@@ -242,8 +288,13 @@ def artistas(request):
     return render(request, 'cliente/productos/artistas.html', context)
 
 @login_required
+@condition(etag_func=etag_pedido)
 def detalle_pedido(request, pedido_id):
-    pedido = get_object_or_404(Pedido, id=pedido_id, usuario=request.user)
+    # Desde el historial completo también se llega a pedidos archivados
+    pedido = obtener_pedido(id=pedido_id, usuario=request.user)
+    if pedido is None:
+        raise Http404('Pedido no encontrado')
+    cargar_lineas([pedido])
     
     context = {
         'pedido': pedido,
@@ -322,13 +373,8 @@ def logout_view(request):
 @login_required
 @user_passes_test(es_admin)
 def panel_admin(request):
-    estadisticas = {
-        'total_productos': Producto.objects.count(),
-        'total_pedidos': Pedido.objects.count(),
-        'total_usuarios': User.objects.count(),
-        'total_encargos': EncargoPersonalizado.objects.count(),
-        'pedidos_pendientes': Pedido.objects.filter(estado='pendiente').count(),
-    }
+    # Contadores en caché, una consulta por tabla al recalcular (ver estadisticas.py)
+    estadisticas = obtener_estadisticas()
     
     pedidos_recientes = Pedido.objects.all().order_by('-fecha_pedido')[:5]
     productos_bajo_stock = Producto.objects.filter(stock__lt=5)[:5]
@@ -339,7 +385,7 @@ def panel_admin(request):
         'pedidos_recientes': pedidos_recientes,
         'productos_bajo_stock': productos_bajo_stock,
         'pedidos_pendientes': estadisticas['pedidos_pendientes'],
-        'encargos_pendientes': EncargoPersonalizado.objects.filter(estado='pendiente').count(),
+        'encargos_pendientes': estadisticas['encargos_pendientes'],
     }
     return render(request, 'admin/panel/panel.html', context)
 
@@ -381,18 +427,22 @@ def crud_lista(request, modelo):
     elif modelo == 'pedidos':
         # Filtro por estado
         estado = request.GET.get('estado')
+        archivados = PedidoArchivado.objects.select_related('usuario')
         if estado:
             objetos = objetos.filter(estado=estado)
+            archivados = archivados.filter(estado=estado)
+        if request.GET.get('historial') == 'completo':
+            objetos = HistorialCompleto(objetos.select_related('usuario'), archivados, orden='-id')
         
         # Estadísticas
         stats = {
             'pendientes': Pedido.objects.filter(estado='pendiente').count(),
         }
         
-        # Calcular total de ventas
-        total_ventas = Pedido.objects.filter(estado='entregado').aggregate(
+        # Calcular total de ventas (las archivadas salen de sus totales por día)
+        total_ventas = (Pedido.objects.filter(estado='entregado').aggregate(
             total=Sum('total')
-        )['total'] or 0
+        )['total'] or 0) + totales_archivo()['total_entregado']
     elif modelo == 'usuarios':
         # Filtrar por tipo de usuario si se solicita
         user_type = request.GET.get('type')
@@ -437,6 +487,7 @@ def crud_lista(request, modelo):
         'total_ventas': total_ventas if modelo == 'pedidos' else None,
         'stats': stats,
         'estado_choices': estado_choices,
+        'historial_completo': modelo == 'pedidos' and request.GET.get('historial') == 'completo',
         'titulo_formateado': Model._meta.verbose_name_plural.title() if hasattr(Model._meta, 'verbose_name_plural') else modelo.capitalize(),
     }
     
@@ -473,17 +524,13 @@ def crud_detalle(request, modelo, id):
         from django.utils.timezone import now
         from datetime import timedelta
         
-        pedidos_count = Pedido.objects.filter(usuario=objeto).count()
         encargos_count = EncargoPersonalizado.objects.filter(cliente=objeto).count()
         
         # Calcular días registrado
         dias_registro = (now().date() - objeto.date_joined.date()).days
         
-        # Calcular total gastado
-        total_gastado = Pedido.objects.filter(
-            usuario=objeto, 
-            estado='entregado'
-        ).aggregate(total=Sum('total'))['total'] or 0
+        # Pedidos y total gastado, contando los archivados
+        pedidos_count, total_gastado = totales_usuario(objeto)
         
         context.update({
             'pedidos_count': pedidos_count,
@@ -698,7 +745,7 @@ def crud_eliminar(request, modelo, id):
     dependencies = []
     
     if modelo == 'usuarios':
-        pedidos_count = Pedido.objects.filter(usuario=objeto).count()
+        pedidos_count, _ = totales_usuario(objeto)
         if pedidos_count > 0:
             dependencies.append(f'{pedidos_count} pedido(s) asociado(s)')
         
@@ -756,13 +803,9 @@ def crud_eliminar(request, modelo, id):
     
     # Añadir estadísticas para usuarios
     if modelo == 'usuarios':
-        pedidos_count = Pedido.objects.filter(usuario=objeto).count()
+        pedidos_count, total_gastado = totales_usuario(objeto)
         encargos_count = EncargoPersonalizado.objects.filter(cliente=objeto).count()
         dias_registro = (now().date() - objeto.date_joined.date()).days
-        total_gastado = Pedido.objects.filter(
-            usuario=objeto, 
-            estado='entregado'
-        ).aggregate(total=Sum('total'))['total'] or 0
         
         context.update({
             'pedidos_count': pedidos_count,
@@ -783,6 +826,7 @@ def confirmacion_pedido(request, pedido_id):
         return redirect('index')
         
     pedido = get_object_or_404(Pedido, id=pedido_id, usuario=request.user)
+    cargar_lineas([pedido])
     
     context = {
         'pedido': pedido,
@@ -795,6 +839,10 @@ def mis_pedidos(request):
         return redirect('panel_admin')
         
     pedidos = Pedido.objects.filter(usuario=request.user).order_by('-fecha_pedido')
+    # Los archivados solo se leen si se pide el historial completo
+    historial_completo = request.GET.get('historial') == 'completo'
+    if historial_completo:
+        pedidos = HistorialCompleto(pedidos, PedidoArchivado.objects.filter(usuario=request.user))
     
     # Paginación
     page = request.GET.get('page', 1)
@@ -806,13 +854,17 @@ def mis_pedidos(request):
         pedidos_paginados = paginator.page(1)
     except EmptyPage:
         pedidos_paginados = paginator.page(paginator.num_pages)
+    # Las líneas salen del resumen de cada pedido: COUNT + una consulta por página
+    pedidos_paginados.object_list = cargar_lineas(list(pedidos_paginados.object_list))
     
     context = {
         'pedidos': pedidos_paginados,
+        'historial_completo': historial_completo,
         'seccion': 'mis_pedidos',
     }
     return render(request, 'cliente/compra/mis_pedidos.html', context)
 
+@condition(etag_func=etag_artista, last_modified_func=last_modified_artista)
 def detalle_artista(request, artista_id):
     artista = get_object_or_404(Artista, id=artista_id, activo=True)
     
@@ -832,12 +884,199 @@ def detalle_artista(request, artista_id):
 @user_passes_test(es_admin)
 def api_dashboard_stats(request):
     """API para obtener estadísticas del dashboard (AJAX)"""
-    stats = {
-        'total_productos': Producto.objects.count(),
-        'total_pedidos': Pedido.objects.count(),
-        'total_usuarios': User.objects.count(),
-        'total_encargos': EncargoPersonalizado.objects.count(),
-        'pedidos_pendientes': Pedido.objects.filter(estado='pendiente').count(),
-        'stock_bajo': Producto.objects.filter(stock__lt=5).count(),
+    return JsonResponse(obtener_estadisticas())
+
+@login_required
+@user_passes_test(es_admin)
+async def api_dashboard_stream(request):
+    """Contadores del dashboard por Server-Sent Events; solo cambios tras el estado inicial"""
+    if not isinstance(request, ASGIRequest):
+        # Con WSGI la conexión ocuparía un hilo para siempre. Con 204 el
+        # navegador no reintenta y admin.js vuelve a consultar api_dashboard_stats
+        return HttpResponse(status=204)
+    respuesta = StreamingHttpResponse(flujo_estadisticas(), content_type='text/event-stream')
+    respuesta['Cache-Control'] = 'no-cache'
+    # Sin búfer en nginx, o los eventos llegarían en bloque
+    respuesta['X-Accel-Buffering'] = 'no'
+    return respuesta
+
+def api_buscar(request):
+    """API de búsqueda de productos ordenada por relevancia (AJAX)"""
+    consulta = request.GET.get('q', '').strip()
+    try:
+        limite = min(int(request.GET.get('limite', 20)), 100)
+    except ValueError:
+        limite = 20
+    
+    productos = buscar_productos(consulta, limite) if consulta else []
+    resultados = [
+        {
+            'id': producto.id,
+            'nombre': producto.nombre,
+            'precio': str(producto.precio),
+            'tipo': producto.get_tipo_display(),
+            'artista': producto.artista.nombre if producto.artista else None,
+            'categoria': producto.categoria.nombre if producto.categoria else None,
+            'imagen': producto.imagen.url if producto.imagen else None,
+            'url': reverse('detalle_producto', args=[producto.id]),
+        }
+        for producto in productos
+    ]
+    return JsonResponse({'consulta': consulta, 'resultados': resultados})
+
+# ========== API DEL CARRITO (AJAX) ==========
+
+def _json_linea(linea):
+    return {
+        'producto_id': linea.producto_id,
+        'nombre': linea.producto.nombre,
+        'cantidad': linea.cantidad,
+        'precio': str(linea.producto.precio),
+        'subtotal': str(linea.subtotal),
     }
-    return JsonResponse(stats)
\ No newline at end of file
+
+def _respuesta_carrito(request, producto_id, mensaje, status=200):
+    """La línea afectada y los totales nuevos en una sola respuesta"""
+    descartar_resumen(request)
+    resumen = obtener_resumen(request)
+    linea = next((item for item in resumen.lineas if item.producto_id == producto_id), None)
+    return JsonResponse({
+        'ok': status == 200,
+        'mensaje': mensaje,
+        'linea': _json_linea(linea) if linea else None,
+        'carrito': {
+            'cantidad_items': resumen.cantidad_items,
+            'subtotal': str(resumen.subtotal.quantize(Decimal('0.01'))),
+            'iva': str(resumen.iva.quantize(Decimal('0.01'))),
+            'total': str(resumen.total.quantize(Decimal('0.01'))),
+        },
+    }, status=status)
+
+def api_carrito(view_func):
+    """POST con CSRF (lo valida el middleware) y sin administradores"""
+    @wraps(view_func)
+    @require_POST
+    def _wrapped_view(request, producto_id):
+        if request.user.is_staff or request.user.is_superuser:
+            return JsonResponse({'ok': False, 'error': 'Los administradores no pueden realizar compras.'}, status=403)
+        return view_func(request, producto_id)
+    return _wrapped_view
+
+def _leer_cantidad(request):
+    form = AgregarAlCarritoForm(request.POST)
+    return form.cleaned_data['cantidad'] if form.is_valid() else None
+
+@api_carrito
+def api_carrito_agregar(request, producto_id):
+    producto = Producto.objects.filter(id=producto_id, activo=True).first()
+    if producto is None:
+        return JsonResponse({'ok': False, 'error': 'Producto no encontrado.'}, status=404)
+    cantidad = _leer_cantidad(request)
+    if cantidad is None:
+        return JsonResponse({'ok': False, 'error': 'Cantidad inválida.'}, status=400)
+    
+    try:
+        obtener_carrito(request).agregar(producto, cantidad)
+    except SinDisponibilidad as e:
+        return JsonResponse({'ok': False, 'error': f'Solo hay {e.disponibles} unidades disponibles.'}, status=409)
+    return _respuesta_carrito(request, producto_id, f'¡{producto.nombre} agregado al carrito!')
+
+@api_carrito
+def api_carrito_actualizar(request, producto_id):
+    resumen = obtener_resumen(request)
+    linea = next((item for item in resumen.lineas if item.producto_id == producto_id), None)
+    if linea is None:
+        return JsonResponse({'ok': False, 'error': 'El producto no está en el carrito.'}, status=404)
+    
+    cambios, errores = _validar_cantidades([linea], {f'cantidad_{producto_id}': request.POST.get('cantidad', '')})
+    if errores:
+        return JsonResponse({'ok': False, 'error': errores[producto_id]}, status=400)
+    try:
+        resumen.almacen.actualizar(cambios)
+    except SinDisponibilidad as e:
+        return JsonResponse({'ok': False, 'error': f'Solo hay {e.disponibles} disponibles.'}, status=409)
+    return _respuesta_carrito(request, producto_id, 'Carrito actualizado.')
+
+@api_carrito
+def api_carrito_quitar(request, producto_id):
+    if not obtener_carrito(request).quitar(producto_id):
+        return JsonResponse({'ok': False, 'error': 'El producto no está en el carrito.'}, status=404)
+    return _respuesta_carrito(request, producto_id, 'Producto eliminado del carrito.')
+
+# ========== API DEL CATÁLOGO (SOLO LECTURA) ==========
+
+def _respuesta_catalogo(request, productos):
+    """
+    Página por cursor o, con ?todo=1, el listado completo en flujo. Las
+    páginas (MAXIMO_POR_PAGINA filas como mucho) se arman en memoria; solo
+    la exportación completa se envía mientras se lee.
+    """
+    try:
+        campos = leer_campos(request.GET.get('fields'))
+    except CampoInvalido as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    filas = proyectar(productos, campos)
+    
+    if request.GET.get('todo') == '1':
+        filas = filas.order_by('-fecha_creacion', '-id').iterator(chunk_size=1000)
+        return StreamingHttpResponse(json_en_flujo(filas, campos), content_type='application/json')
+    
+    try:
+        limite = max(1, min(int(request.GET.get('limite', 50)), MAXIMO_POR_PAGINA))
+    except ValueError:
+        limite = 50
+    
+    pagina = paginar_por_cursor(filas, request.GET.get('cursor'), limite)
+    return JsonResponse({
+        'resultados': [serializar(fila, campos) for fila in pagina],
+        'siguiente': pagina.cursor_siguiente,
+        'anterior': pagina.cursor_anterior,
+    })
+
+@require_GET
+def api_productos(request):
+    productos = Producto.objects.filter(activo=True)
+    tipo = request.GET.get('tipo')
+    if tipo:
+        productos = productos.filter(tipo=tipo)
+    return _respuesta_catalogo(request, productos)
+
+@require_GET
+def api_producto(request, producto_id):
+    try:
+        campos = leer_campos(request.GET.get('fields'))
+    except CampoInvalido as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    fila = proyectar(Producto.objects.filter(id=producto_id, activo=True), campos).first()
+    if fila is None:
+        return JsonResponse({'error': 'Producto no encontrado'}, status=404)
+    return JsonResponse(serializar(fila, campos))
+
+@require_GET
+def api_productos_artista(request, artista_id):
+    if not Artista.objects.filter(id=artista_id, activo=True).exists():
+        return JsonResponse({'error': 'Artista no encontrado'}, status=404)
+    return _respuesta_catalogo(request, Producto.objects.filter(artista_id=artista_id, activo=True))
+
+@require_GET
+def api_productos_categoria(request, slug):
+    categoria_id = Categoria.objects.filter(slug=slug).values_list('id', flat=True).first()
+    if categoria_id is None:
+        return JsonResponse({'error': 'Categoría no encontrada'}, status=404)
+    return _respuesta_catalogo(request, Producto.objects.filter(categoria_id=categoria_id, activo=True))
+
+
+# ========== ARCHIVOS SUBIDOS (DESARROLLO) ==========
+
+def servir_media(request, path):
+    """
+    Sirve MEDIA_ROOT con DEBUG. Los blobs por contenido y sus miniaturas nunca
+    cambian, así que se marcan como inmutables (en producción el servidor web
+    debe enviar la misma cabecera para esas rutas).
+    """
+    respuesta = serve(request, path, document_root=settings.MEDIA_ROOT)
+    if es_inmutable(path):
+        respuesta['Cache-Control'] = CABECERA_CACHE_INMUTABLE
+    return respuesta